@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import hashlib
+
+from . import intent_router, llm_gateway, sandbox, telemetry
+from .llm_cache import LRUCache
+from .planner import KEY_RE
+
+# Answers questions by having the LLM write a short pandas program that runs over the full data
+# in the sandbox, instead of guessing values from a three-row sample.
+# Literal values in the question (numbers, dates, quoted strings) are lifted out into `params`,
+# so "rows with sales > 100" and "rows with sales > 250" share the template "rows with sales > {0}".
+# A program that ran and produced the requested shape is cached by (question template, schema
+# fingerprint); later questions of the same shape over same-shaped data run it without the LLM.
+# Results are memoized too, per (program, data content keys, params), when every frame has a content key.
+
+# Off by default: programs run in an isolated child (see app/sandbox.py), which needs the app to
+# run as root so the child can enter private namespaces and drop to an unprivileged uid
+CODE_PLANS_ENABLED = os.getenv("CODE_PLANS_ENABLED", "0") == "1"
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", "86400"))
+# Extra LLM rounds to fix a program that failed validation or raised, with the error as feedback
+PLAN_REPAIR_ATTEMPTS = int(os.getenv("PLAN_REPAIR_ATTEMPTS", "1"))
+
+PARAM_RE = re.compile(
+    r"(?P<date>\b\d{4}-\d{2}-\d{2}\b)"
+    r"|'(?P<squote>[^'\n]{1,100})'|\"(?P<dquote>[^\"\n]{1,100})\""
+    r"|(?<![\w.`])(?P<number>-?\d+(?:,\d{3})*(?:\.\d+)?)(?![\w`])"
+)
+
+_plans = LRUCache(PLAN_CACHE_SIZE, PLAN_CACHE_TTL)
+_results = LRUCache(PLAN_CACHE_SIZE, PLAN_CACHE_TTL)
+counters = {"hits": 0, "misses": 0, "generated": 0, "rejected": 0, "stale": 0, "result_hits": 0}
+
+
+class PlanError(Exception):
+    """No program could answer the question; the caller falls back to asking for the values."""
+
+
+def template(question):
+    """(template, params): the question with its literal values replaced by {0}, {1}, ..."""
+    params = []
+
+    def lift(m):
+        if m.group("number") is not None:
+            raw = m.group("number").replace(",", "")
+            value = float(raw) if "." in raw else int(raw)
+        else:
+            value = m.group("date") or m.group("squote") or m.group("dquote")
+        params.append(value)
+        return "{" + str(len(params) - 1) + "}"
+
+    text = PARAM_RE.sub(lift, " ".join(question.split()))
+    return text.lower(), params
+
+
+def schema_fingerprint(frames):
+    """Hash of the column names and dtype kinds of each frame, in order (not the file names or data)."""
+    schema = [[(str(c), df[c].dtype.kind) for c in df.columns] for df in frames]
+    return hashlib.sha256(json.dumps(schema).encode("utf-8")).hexdigest()[:24]
+
+
+def _strip_fences(text):
+    text = text.strip()
+    m = re.search(r"```(?:python|py)?\s*\n(.*?)```", text, re.S)
+    return (m.group(1) if m else text).strip()
+
+
+def _prompt(question, names, description, params, failure=None):
+    prompt = f"""
+You write short Python programs that answer questions about tabular data.
+The program runs with these variables defined:
+- `dfs`: list of pandas DataFrames loaded from {names}, in that order; `df` is dfs[0]
+- `pd`, `np`, `plt` (matplotlib, Agg backend)
+- `params`: the literal values from the question, in order: {json.dumps(params)}
+- `to_data_uri(fig)`: returns a base64 PNG data URI for a matplotlib figure
+
+Data:
+{description}
+
+Question:
+{question}
+
+Compute the answer from the full data and assign it to `result`, as JSON-compatible values matching
+exactly the keys, structure and format requested in the question. Read the question's literal values
+from `params[i]` instead of writing them into the code. Imports are limited to {", ".join(sandbox.ALLOWED_MODULES)};
+no file, network or OS access.
+Return ONLY the Python code.
+"""
+    if failure:
+        prompt += f"\nA previous attempt failed:\n{failure['code']}\nError: {failure['error']}\nReturn a corrected program.\n"
+    return prompt
+
+
+def check_shape(question, result):
+    """Raise PlanError if result is obviously not what the question asked for."""
+    if result is None:
+        raise PlanError("program returned no result")
+    ql = question.lower()
+    if "json array" in ql and not isinstance(result, list):
+        raise PlanError("a JSON array was requested")
+    keys = KEY_RE.findall(question)
+    if "json object" in ql and keys:
+        if not isinstance(result, dict):
+            raise PlanError("a JSON object was requested")
+        missing = [k for k in keys if k not in result]
+        if missing:
+            raise PlanError(f"result is missing keys {missing}")
+
+
+def _result_key(code, frames, params):
+    keys = [df.attrs.get("content_key") for df in frames]
+    if not all(keys) or any(df.attrs.get("sampled") for df in frames):
+        return None
+    return hashlib.sha256(json.dumps([code, keys, params]).encode("utf-8")).hexdigest()
+
+
+def _run(question, code, frames, names, params):
+    key = _result_key(code, frames, params)
+    if key is not None:
+        cached = _results.get(key)
+        if cached is not None:
+            counters["result_hits"] += 1
+            return json.loads(cached)
+    result = sandbox.run(code, frames, names=names, params=params)
+    check_shape(question, result)
+    if key is not None:
+        # Stored as JSON so callers can't mutate the cached value
+        _results.set(key, json.dumps(result))
+    return result
+
+
+@telemetry.traced("code_plan")
+def answer(question, frames, description=""):
+    """
+    Answer question over {name: DataFrame} frames with a cached or newly generated program.
+    Raises PlanError when no program produced a valid result.
+    """
+    if not CODE_PLANS_ENABLED or not frames:
+        raise PlanError("code plans disabled")
+    names = list(frames)
+    data = list(frames.values())
+    text, params = template(question)
+    key = (text, schema_fingerprint(data))
+
+    code = _plans.get(key)
+    if code is not None:
+        counters["hits"] += 1
+        try:
+            result = _run(question, code, data, names, params)
+            intent_router.report("sandbox:cached")
+            return result
+        except sandbox.SandboxUnavailable as e:
+            raise PlanError(str(e)) from e
+        except (sandbox.SandboxError, sandbox.UnsafeCode, PlanError) as e:
+            # The data changed in a way the program did not anticipate; write a new one
+            counters["stale"] += 1
+            print(f"[{telemetry.request_id()}] Cached plan failed, regenerating: {e}")
+    else:
+        counters["misses"] += 1
+
+    failure = None
+    for _ in range(1 + PLAN_REPAIR_ATTEMPTS):
+        prompt = _prompt(question, names, description, params, failure)
+        try:
+            raw = llm_gateway.chat([{"role": "user", "content": prompt}], model="gpt-4o-mini", temperature=0)
+        except llm_gateway.LLMError as e:
+            raise PlanError(f"LLM call failed: {e}") from e
+        code = _strip_fences(raw)
+        counters["generated"] += 1
+        try:
+            result = _run(question, code, data, names, params)
+        except sandbox.SandboxUnavailable as e:
+            raise PlanError(str(e)) from e
+        except (sandbox.SandboxError, sandbox.UnsafeCode, PlanError) as e:
+            counters["rejected"] += 1
+            failure = {"code": code, "error": str(e)}
+            continue
+        if "params" in code or not params:
+            # A program with the question's values written in would give wrong answers for other values
+            _plans.set(key, code)
+        intent_router.report("sandbox:generated")
+        return result
+    raise PlanError(f"no valid program: {failure['error'] if failure else 'unknown'}")
+
+
+def clear():
+    _plans.clear()
+    _results.clear()
+    for k in counters:
+        counters[k] = 0
+
+
+def stats():
+    lookups = counters["hits"] + counters["misses"]
+    return {**counters, "plans": len(_plans), "hit_rate": counters["hits"] / lookups if lookups else 0.0}
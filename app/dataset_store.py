@@ -0,0 +1,242 @@
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from . import deadline, loader, telemetry
+from .ingest import source_of, hash_source
+
+# Parsed-DataFrame cache keyed by upload content hash (computed while the upload is spooled).
+# Hot frames live in a byte-bounded in-memory LRU; frames evicted from memory spill to
+# Feather files on local disk, so a repeat upload of the same bytes never re-parses the CSV.
+# Callers receive shallow copies: adding or replacing columns does not touch the cached frame.
+
+DATASET_CACHE_BYTES = int(os.getenv("DATASET_CACHE_BYTES", str(512 << 20)))
+DATASET_SPILL_DIR = os.getenv("DATASET_SPILL_DIR") or os.path.join(tempfile.gettempdir(), "data-agent-datasets")
+DATASET_SPILL_MAX_BYTES = int(os.getenv("DATASET_SPILL_MAX_BYTES", str(2 << 30)))
+DATASET_CACHE_ENABLED = os.getenv("DATASET_CACHE_ENABLED", "1") != "0"
+
+
+class DatasetStore:
+    """Byte-bounded LRU of parsed frames with a Feather spill tier."""
+
+    def __init__(self, max_bytes=DATASET_CACHE_BYTES, spill_dir=DATASET_SPILL_DIR, spill_max_bytes=DATASET_SPILL_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self._frames = OrderedDict()  # key -> (DataFrame, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # key -> Lock, so concurrent requests for one file parse it once
+        self.counters = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "spilled": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    # --- memory tier ---------------------------------------------------------
+
+    def _get_memory(self, key):
+        with self._lock:
+            item = self._frames.get(key)
+            if item is None:
+                return None
+            self._frames.move_to_end(key)
+            return item[0]
+
+    def _put_memory(self, key, df):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            self._spill(key, df)
+            return
+        evicted = []
+        with self._lock:
+            if key in self._frames:
+                self._bytes -= self._frames.pop(key)[1]
+            self._frames[key] = (df, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and len(self._frames) > 1:
+                old_key, (old_df, old_bytes) = self._frames.popitem(last=False)
+                self._bytes -= old_bytes
+                evicted.append((old_key, old_df))
+        for old_key, old_df in evicted:
+            self._spill(old_key, old_df)
+
+    # --- disk tier -----------------------------------------------------------
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.feather")
+
+    def _spill(self, key, df):
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            df.to_feather(tmp)
+            os.replace(tmp, path)
+            self._count("spilled")
+        except Exception as e:
+            # Non-string column names, mixed-type object columns, pyarrow missing, ...
+            print(f"Could not spill dataset {key[:12]}: {e}")
+            return
+        self._trim_spill()
+
+    def _trim_spill(self):
+        try:
+            entries = []
+            for name in os.listdir(self.spill_dir):
+                if name.endswith(".feather"):
+                    path = os.path.join(self.spill_dir, name)
+                    st = os.stat(path)
+                    entries.append((st.st_mtime, st.st_size, path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.spill_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def feather_path(self, key, df):
+        """Path of the Feather copy of df (written to the spill tier if needed), or None if it can't be written."""
+        self._spill(key, df)
+        path = self._spill_path(key)
+        return path if os.path.exists(path) else None
+
+    def _get_disk(self, key):
+        path = self._spill_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            import pyarrow as pa
+            from pyarrow import feather
+
+            # Keep Arrow-backed strings Arrow-backed on the way back in
+            table = feather.read_table(path)
+            df = table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+            os.utime(path)
+            return df
+        except Exception as e:
+            print(f"Could not read spilled dataset {key[:12]}: {e}")
+            return None
+
+    # --- public API ----------------------------------------------------------
+
+    def get(self, key):
+        """Cached frame for key (memory, then disk) as a shallow copy, or None; never loads."""
+        df = self._get_memory(key)
+        if df is not None:
+            self._count("hits_memory")
+            return df.copy(deep=False)
+        df = self._get_disk(key)
+        if df is not None:
+            self._count("hits_disk")
+            self._put_memory(key, df)
+            return df.copy(deep=False)
+        return None
+
+    def get_or_load(self, key, loader):
+        """Frame for key from memory, then disk, else loader(); returns a shallow copy."""
+        df = self._get_memory(key)
+        if df is not None:
+            self._count("hits_memory")
+            return df.copy(deep=False)
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        with load_lock:
+            try:
+                df = self._get_memory(key)
+                if df is not None:
+                    self._count("hits_memory")
+                else:
+                    df = self._get_disk(key)
+                    if df is not None:
+                        self._count("hits_disk")
+                    else:
+                        self._count("misses")
+                        df = loader()
+                    self._put_memory(key, df)
+            finally:
+                # Dropped before load_lock is released: a caller arriving later finds the frame
+                # in memory instead of creating a fresh lock and parsing the file again.
+                # If loader() raised, the next caller gets a clean slate.
+                with self._lock:
+                    if self._loading.get(key) is load_lock:
+                        del self._loading[key]
+        return df.copy(deep=False)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+            for k in self.counters:
+                self.counters[k] = 0
+
+    def stats(self):
+        with self._lock:
+            c = dict(self.counters)
+        lookups = c["hits_memory"] + c["hits_disk"] + c["misses"]
+        return {
+            **c,
+            "entries_memory": len(self._frames),
+            "bytes_memory": self._bytes,
+            "hit_rate": (c["hits_memory"] + c["hits_disk"]) / lookups if lookups else 0.0,
+        }
+
+
+_store = DatasetStore()
+
+
+def get_store():
+    return _store
+
+
+@telemetry.traced("load_csv")
+def read_csv(f, **read_kwargs):
+    """
+    loader.read_csv (typed, Arrow engine) through the store. f may be an IngestedFile (its upload hash is reused),
+    an UploadFile-like object, a path or a file object.
+    """
+    source = source_of(f) if hasattr(f, "file") else f
+    if not DATASET_CACHE_ENABLED:
+        return _read_sample(source, read_kwargs) if deadline.low() else loader.read_csv(source, **read_kwargs)
+    content_hash = getattr(f, "sha256", None) or hash_source(source)
+    key = content_hash
+    if read_kwargs:
+        # Different parse options give different frames
+        key += "-" + hashlib.sha256(repr(sorted(read_kwargs.items())).encode("utf-8")).hexdigest()[:16]
+    if deadline.low():
+        df = _store.get(key)
+        if df is None:
+            # Not cached and short on time: a sample, never stored under the full file's key
+            return _read_sample(source, read_kwargs)
+        df.attrs["content_key"] = key
+        return df
+
+    def load():
+        return loader.read_csv(source, **read_kwargs)
+
+    df = _store.get_or_load(key, load)
+    # Lets consumers memoize derived structures (e.g. graphs) without re-hashing the frame
+    df.attrs["content_key"] = key
+    return df
+
+
+def _read_sample(source, read_kwargs):
+    deadline.degrade("load_csv")
+    df = loader.read_csv(source, **{**read_kwargs, "nrows": read_kwargs.get("nrows") or deadline.SAMPLE_ROWS})
+    df.attrs["sampled"] = len(df) >= deadline.SAMPLE_ROWS
+    return df
+
+
+def stats():
+    return _store.stats()
@@ -0,0 +1,111 @@
+import os
+import time
+import contextvars
+
+# Per-request time budget. The API opens a Deadline for each request; it travels in a context
+# variable (copied into worker threads by executor.submit and the planner), so every stage
+# can ask how much time is left and degrade instead of overrunning:
+#   fetch  - shorter network timeouts, stale cached pages instead of the network
+#   load   - a sample of the CSV instead of the whole file
+#   LLM    - cached answers only, calls capped at the remaining time
+#   render - lower resolution, no size-search loops
+# Work that finished before the deadline is recorded in a Partial so the API can still answer
+# in the requested shape if the processor itself does not return in time.
+
+REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET", "150"))
+# Seconds kept back for assembling and sending the response
+DEADLINE_MARGIN = float(os.getenv("DEADLINE_MARGIN", "5"))
+# Below this much remaining time a stage switches to its cheaper strategy
+LOW_TIME_SECONDS = float(os.getenv("DEADLINE_LOW_SECONDS", "20"))
+# Below this much remaining time new LLM calls are not started (cached answers still served)
+LLM_MIN_SECONDS = float(os.getenv("DEADLINE_LLM_MIN_SECONDS", "3"))
+SAMPLE_ROWS = int(os.getenv("DEADLINE_SAMPLE_ROWS", "200000"))
+LOW_DPI = int(os.getenv("DEADLINE_LOW_DPI", "60"))
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """A stage could not start or finish inside the request budget."""
+
+
+class Partial:
+    """Answers completed so far, in the shape the question asked for (list or dict)."""
+
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+        self.partial = Partial()
+        self.degraded = []  # stages that switched to a cheaper strategy
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+    def degrade(self, stage):
+        if stage not in self.degraded:
+            self.degraded.append(stage)
+
+
+def start(seconds=None):
+    """Open a deadline `seconds` (default REQUEST_BUDGET - DEADLINE_MARGIN) from now; returns (deadline, token)."""
+    dl = Deadline((REQUEST_BUDGET - DEADLINE_MARGIN) if seconds is None else seconds)
+    return dl, _current.set(dl)
+
+
+def reset(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def remaining():
+    """Seconds left for this request (inf outside a request)."""
+    dl = _current.get()
+    return dl.remaining() if dl is not None else float("inf")
+
+
+def expired():
+    return remaining() <= 0
+
+
+def low(threshold=None):
+    """True when the remaining budget is below threshold (LOW_TIME_SECONDS by default)."""
+    return remaining() < (LOW_TIME_SECONDS if threshold is None else threshold)
+
+
+def clamp(timeout):
+    """timeout capped at the remaining budget (never below 0.1 s so calls can still fail fast)."""
+    left = remaining()
+    if timeout is None:
+        return None if left == float("inf") else max(left, 0.1)
+    return max(min(timeout, left), 0.1)
+
+
+def check(stage):
+    """Raise DeadlineExceeded if the budget is gone."""
+    if expired():
+        raise DeadlineExceeded(f"no time left for {stage}")
+
+
+def degrade(stage):
+    """Record that `stage` used its cheaper strategy (reported with the response)."""
+    dl = _current.get()
+    if dl is not None:
+        dl.degrade(stage)
+
+
+def record(value):
+    """Remember the answers completed so far (list or dict) for a deadline fallback response."""
+    dl = _current.get()
+    if dl is not None:
+        dl.partial.set(value)
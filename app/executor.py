@@ -0,0 +1,114 @@
+import os
+import asyncio
+import functools
+import threading
+import contextvars
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Worker pools used by the API so blocking work never runs on the event loop.
+# - "io"  : thread pool for LLM calls, scraping and anything waiting on the network
+# - "cpu" : process pool for CPU-bound parsing and plotting (arguments must be picklable)
+IO_WORKERS = int(os.getenv("IO_WORKERS", "16"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+# Maximum number of jobs admitted (running + queued) before we answer 503.
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "64"))
+# "spawn" avoids forking a process that already runs the LLM gateway / pool threads.
+CPU_START_METHOD = os.getenv("CPU_START_METHOD", "spawn")
+# Per-request timeout in seconds (0 disables).
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "170"))
+
+_lock = threading.Lock()
+_io_pool = None
+_cpu_pool = None
+_in_flight = 0
+
+
+class Saturated(Exception):
+    """Raised when the worker pools already hold MAX_QUEUE_DEPTH jobs."""
+
+
+def get_io_pool():
+    global _io_pool
+    with _lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io-worker")
+        return _io_pool
+
+
+def get_cpu_pool():
+    global _cpu_pool
+    with _lock:
+        if _cpu_pool is None:
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS,
+                mp_context=multiprocessing.get_context(CPU_START_METHOD),
+            )
+        return _cpu_pool
+
+
+def in_flight():
+    return _in_flight
+
+
+def _acquire_slot():
+    global _in_flight
+    with _lock:
+        if _in_flight >= MAX_QUEUE_DEPTH:
+            raise Saturated(f"{_in_flight} jobs already queued (limit {MAX_QUEUE_DEPTH})")
+        _in_flight += 1
+
+
+def _release_slot(_future=None):
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+
+
+async def run_in_pool(func, *args, kind="io", timeout=None, **kwargs):
+    """
+    Run func(*args, **kwargs) in the "io" thread pool or the "cpu" process pool and await it.
+
+    Raises Saturated when the queue is full and asyncio.TimeoutError when the job
+    takes longer than `timeout` (defaults to REQUEST_TIMEOUT). The queue slot is only
+    released once the job really finishes, so timed-out work still counts against the limit.
+    """
+    return await wait(submit(func, *args, kind=kind, **kwargs), timeout)
+
+
+async def wait(future, timeout=None):
+    """
+    Await a job started with submit() for at most `timeout` seconds (defaults to REQUEST_TIMEOUT).
+    On asyncio.TimeoutError the job is cancelled if it has not started; a running job carries on.
+    """
+    if timeout is None:
+        timeout = REQUEST_TIMEOUT
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout or None)
+
+
+def submit(func, *args, kind="io", **kwargs):
+    """
+    Start func(*args, **kwargs) in the io (or cpu) pool from synchronous code and return the Future
+    (e.g. a chart the response writer can wait for). Counts against MAX_QUEUE_DEPTH like run_in_pool.
+    """
+    _acquire_slot()
+    try:
+        if kind == "cpu":
+            future = get_cpu_pool().submit(func, *args, **kwargs)
+        else:
+            ctx = contextvars.copy_context()
+            future = get_io_pool().submit(ctx.run, functools.partial(func, *args, **kwargs))
+    except BaseException:
+        _release_slot()
+        raise
+    future.add_done_callback(_release_slot)
+    return future
+
+
+def shutdown(wait=False):
+    global _io_pool, _cpu_pool
+    with _lock:
+        pools = [p for p in (_io_pool, _cpu_pool) if p is not None]
+        _io_pool = _cpu_pool = None
+    for pool in pools:
+        pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import deadline, telemetry
+
+# Scraping client: one pooled keep-alive session plus an on-disk response cache.
+# Fresh entries (younger than FETCH_CACHE_TTL) are served locally; stale ones are revalidated
+# with If-None-Match / If-Modified-Since so an unchanged page costs a 304, not a download.
+# The cache is bounded by FETCH_CACHE_MAX_BYTES (least recently used entries go first).
+
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "data-agent-http-cache")
+FETCH_CACHE_TTL = float(os.getenv("FETCH_CACHE_TTL", "3600"))
+FETCH_CACHE_MAX_BYTES = int(os.getenv("FETCH_CACHE_MAX_BYTES", str(256 << 20)))
+FETCH_CACHE_ENABLED = os.getenv("FETCH_CACHE_ENABLED", "1") != "0"
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "30"))
+FETCH_POOL_SIZE = int(os.getenv("FETCH_POOL_SIZE", "16"))
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+USER_AGENT = os.getenv("FETCH_USER_AGENT", "data-analyst-agent/1.0")
+
+counters = {"fresh": 0, "revalidated": 0, "downloaded": 0, "stale": 0}
+
+
+class FetchResult:
+    """A fetched (or cached) response body with the metadata needed to decode and revalidate it."""
+
+    def __init__(self, url, content, encoding=None, headers=None, source="network"):
+        self.url = url
+        self.content = content
+        self.encoding = encoding
+        self.headers = headers or {}
+        self.source = source  # network | fresh | revalidated | stale
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    @property
+    def from_cache(self):
+        return self.source != "network"
+
+    def __repr__(self):
+        return f"FetchResult({self.url!r}, {len(self.content)} bytes, {self.source})"
+
+
+class DiskCache:
+    """One body file plus one JSON metadata file per URL; evicts by last use once over max_bytes."""
+
+    def __init__(self, directory, max_bytes):
+        self.dir = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.dir, key)
+        return base + ".body", base + ".json"
+
+    def get(self, url):
+        """(meta, body) or None."""
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        os.utime(meta_path)  # last use, for eviction
+        return meta, body
+
+    def put(self, url, meta, body=None):
+        """Store metadata (and the body when given); body=None only refreshes the metadata."""
+        body_path, meta_path = self._paths(url)
+        with self._lock:
+            if body is not None:
+                self._write(body_path, body)
+            self._write(meta_path, json.dumps({**meta, "url": url}).encode("utf-8"))
+        if body is not None:
+            self.evict()
+
+    def _write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.dir):
+                if not name.endswith(".json"):
+                    continue
+                meta_path = os.path.join(self.dir, name)
+                body_path = meta_path[:-5] + ".body"
+                try:
+                    size = os.path.getsize(body_path) + os.path.getsize(meta_path)
+                    used = os.path.getmtime(meta_path)
+                except OSError:
+                    continue
+                entries.append((used, size, meta_path, body_path))
+                total += size
+            for used, size, meta_path, body_path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                for path in (meta_path, body_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.dir):
+                try:
+                    os.remove(os.path.join(self.dir, name))
+                except OSError:
+                    pass
+
+
+_session = None
+_cache = None
+_pool = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """Shared requests.Session with a sized connection pool and retries on transient errors."""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=frozenset(["GET", "HEAD"]))
+            adapter = HTTPAdapter(pool_connections=FETCH_POOL_SIZE, pool_maxsize=FETCH_POOL_SIZE, max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+def get_cache():
+    global _cache
+    if not FETCH_CACHE_ENABLED:
+        return None
+    with _lock:
+        if _cache is None:
+            _cache = DiskCache(FETCH_CACHE_DIR, FETCH_CACHE_MAX_BYTES)
+        return _cache
+
+
+def _pool_executor():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY, thread_name_prefix="fetch")
+        return _pool
+
+
+@telemetry.traced("fetch")
+def fetch(url, timeout=None, ttl=None, force=False):
+    """
+    GET url through the cache. force=True skips the freshness check (still revalidates).
+    On a network error a stale cached copy is returned if there is one.
+    """
+    ttl = FETCH_CACHE_TTL if ttl is None else ttl
+    cache = get_cache()
+    cached = cache.get(url) if cache is not None else None
+    headers = {}
+    if cached is not None:
+        meta, body = cached
+        if not force and time.time() - meta.get("fetched_at", 0) < ttl:
+            counters["fresh"] += 1
+            return FetchResult(url, body, meta.get("encoding"), meta.get("headers"), "fresh")
+        if deadline.low():
+            # Short on time: an old copy beats a revalidation round trip
+            deadline.degrade("fetch")
+            counters["stale"] += 1
+            return FetchResult(url, body, meta.get("encoding"), meta.get("headers"), "stale")
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    deadline.check("fetch")
+    try:
+        r = get_session().get(url, timeout=deadline.clamp(timeout or FETCH_TIMEOUT), headers=headers)
+        if r.status_code == 304 and cached is not None:
+            meta["fetched_at"] = time.time()
+            cache.put(url, meta)
+            counters["revalidated"] += 1
+            return FetchResult(url, body, meta.get("encoding"), meta.get("headers"), "revalidated")
+        r.raise_for_status()
+    except requests.RequestException as e:
+        if cached is not None:
+            print(f"Fetch of {url} failed ({e}); serving stale cached copy")
+            counters["stale"] += 1
+            return FetchResult(url, body, meta.get("encoding"), meta.get("headers"), "stale")
+        raise
+
+    counters["downloaded"] += 1
+    keep = {k: r.headers[k] for k in ("Content-Type", "ETag", "Last-Modified") if k in r.headers}
+    result = FetchResult(url, r.content, r.encoding or r.apparent_encoding, keep)
+    if cache is not None and "no-store" not in r.headers.get("Cache-Control", ""):
+        cache.put(url, {
+            "fetched_at": time.time(),
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "encoding": result.encoding,
+            "headers": keep,
+        }, r.content)
+    return result
+
+
+def fetch_text(url, timeout=None):
+    return fetch(url, timeout=timeout).text
+
+
+def fetch_all(urls, timeout=None):
+    """
+    Fetch several URLs concurrently (duplicates fetched once).
+    Returns {url: FetchResult or the exception raised}, in input order. Each fetch runs in a copy
+    of the caller's context, so it keeps the request deadline and trace.
+    """
+    unique = list(dict.fromkeys(urls))
+    futures = {u: _pool_executor().submit(contextvars.copy_context().run, fetch, u, timeout) for u in unique}
+    results = {}
+    for u, fut in futures.items():
+        try:
+            results[u] = fut.result()
+        except Exception as e:
+            results[u] = e
+    return results
+
+
+def clear():
+    cache = get_cache()
+    if cache is not None:
+        cache.clear()
+    for k in counters:
+        counters[k] = 0
+
+
+def stats():
+    lookups = sum(counters.values())
+    local = counters["fresh"] + counters["revalidated"]
+    return {**counters, "cache_enabled": FETCH_CACHE_ENABLED, "local_rate": local / lookups if lookups else 0.0}
+
+
+def close():
+    global _session, _pool
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
@@ -0,0 +1,205 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import lazy_imports, render
+
+nx = lazy_imports.module("networkx")
+sparse = lazy_imports.module("scipy.sparse")
+csgraph = lazy_imports.module("scipy.sparse.csgraph")
+
+# Graph analytics on CSR adjacency arrays. Edge lists are factorized into integer node ids
+# and stored once as a symmetric scipy.sparse matrix; degree, density and BFS shortest paths
+# are array operations. Semantics follow networkx.Graph (undirected, duplicate edges collapse,
+# a self-loop adds 2 to the degree). Drawing uses networkx only for small (sub)graphs: large
+# graphs are drawn as the induced subgraph of their highest-degree nodes. Layouts and rendered
+# images are kept on the Graph instance, so a cached Graph never lays out or renders twice.
+
+GRAPH_DRAW_MAX_NODES = int(os.getenv("GRAPH_DRAW_MAX_NODES", "300"))
+GRAPH_LABEL_MAX_NODES = int(os.getenv("GRAPH_LABEL_MAX_NODES", "50"))
+DEGREE_HIST_MAX_BINS = 200
+
+
+def _py(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+class Graph:
+    """Undirected simple graph as CSR adjacency plus a node-label array."""
+
+    def __init__(self, labels, adjacency):
+        self.labels = labels              # node id -> label, in first-appearance order
+        self.adj = adjacency              # symmetric CSR, 1 per edge (diagonal = self-loop)
+        self._index = None
+        self._layouts = {}                # max_nodes -> (drawn graph, positions, sampled)
+        self._images = {}                 # (kind, max_bytes, ...) -> render.EncodedImage
+        self._lock = threading.RLock()    # one layout/render per key when deferred renders overlap
+
+    @classmethod
+    def from_edges(cls, src, dst):
+        src = np.asarray(src, dtype=object)
+        dst = np.asarray(dst, dtype=object)
+        keep = ~(pd.isna(src) | pd.isna(dst))
+        src, dst = src[keep], dst[keep]
+        # Interleave u, v so node ids follow the order networkx would add them in
+        codes, labels = pd.factorize(np.column_stack([src, dst]).ravel(), sort=False)
+        u, v = codes[0::2], codes[1::2]
+        n = len(labels)
+        rows = np.concatenate([u, v])
+        cols = np.concatenate([v, u])
+        adj = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+        adj.sum_duplicates()
+        adj.data[:] = 1
+        return cls(np.asarray(labels, dtype=object), adj)
+
+    @classmethod
+    def from_frame(cls, df, source=None, target=None):
+        """Edges from two DataFrame columns (default: the first two)."""
+        source = source if source is not None else df.columns[0]
+        target = target if target is not None else df.columns[1]
+        return cls.from_edges(df[source].to_numpy(), df[target].to_numpy())
+
+    # --- metrics -------------------------------------------------------------
+
+    @property
+    def node_count(self):
+        return len(self.labels)
+
+    def _self_loops(self):
+        return np.asarray(self.adj.diagonal() > 0, dtype=np.int64)
+
+    def degrees(self):
+        """Degree per node id (a self-loop counts twice, like networkx)."""
+        return np.diff(self.adj.indptr).astype(np.int64) + self._self_loops()
+
+    def edge_count(self):
+        loops = int(self._self_loops().sum())
+        return (self.adj.nnz - loops) // 2 + loops
+
+    def density(self):
+        n = self.node_count
+        if n <= 1:
+            return 0.0
+        return 2 * self.edge_count() / (n * (n - 1))
+
+    def average_degree(self):
+        n = self.node_count
+        return float(self.degrees().sum() / n) if n else 0.0
+
+    def highest_degree_node(self):
+        if not self.node_count:
+            return None
+        return _py(self.labels[int(np.argmax(self.degrees()))])
+
+    def node_id(self, label):
+        if self._index is None:
+            self._index = {lab: i for i, lab in enumerate(self.labels)}
+        return self._index.get(label)
+
+    def shortest_paths(self, source, targets):
+        """{target: node labels on one shortest path, or []} from a single BFS out of source."""
+        s = self.node_id(source)
+        if s is None:
+            return {t: [] for t in targets}
+        _, pred = csgraph.breadth_first_order(self.adj, s, directed=False, return_predecessors=True)
+        paths = {}
+        for target in targets:
+            t = self.node_id(target)
+            if t is None or (t != s and pred[t] < 0):
+                paths[target] = []
+                continue
+            path = [t]
+            while path[-1] != s:
+                path.append(pred[path[-1]])
+            paths[target] = [_py(self.labels[i]) for i in reversed(path)]
+        return paths
+
+    def shortest_path(self, source, target):
+        """Node labels on one shortest (fewest edges) path, or [] if none."""
+        return self.shortest_paths(source, [target])[target]
+
+    # --- drawing -------------------------------------------------------------
+
+    def _draw_subgraph(self, max_nodes):
+        """(networkx graph to draw, True if sampled) - top nodes by degree when too large."""
+        if self.node_count <= max_nodes:
+            ids = np.arange(self.node_count)
+            sampled = False
+        else:
+            ids = np.sort(np.argsort(-self.degrees(), kind="stable")[:max_nodes])
+            sampled = True
+        sub = sparse.triu(self.adj[ids][:, ids]).tocoo()
+        g = nx.Graph()
+        g.add_nodes_from(_py(self.labels[i]) for i in ids)
+        g.add_edges_from(zip((_py(self.labels[ids[i]]) for i in sub.row), (_py(self.labels[ids[j]]) for j in sub.col)))
+        return g, sampled
+
+    def layout(self, max_nodes=None):
+        """(networkx graph to draw, spring positions, sampled), computed once per instance."""
+        max_nodes = max_nodes or GRAPH_DRAW_MAX_NODES
+        with self._lock:
+            if max_nodes not in self._layouts:
+                g, sampled = self._draw_subgraph(max_nodes)
+                iterations = 50 if g.number_of_nodes() <= GRAPH_LABEL_MAX_NODES else 30
+                self._layouts[max_nodes] = (g, nx.spring_layout(g, seed=42, iterations=iterations), sampled)
+            return self._layouts[max_nodes]
+
+    def draw_uri(self, max_bytes=render.MAX_IMAGE_BYTES, max_nodes=None):
+        """Network drawing as a data URI."""
+        return str(self.draw_image(max_bytes, max_nodes))
+
+    def degree_histogram_uri(self, max_bytes=render.MAX_IMAGE_BYTES):
+        """Degree histogram as a data URI."""
+        return str(self.degree_histogram_image(max_bytes))
+
+    def _image_key(self, kind, max_bytes=render.MAX_IMAGE_BYTES, max_nodes=None):
+        if kind == "network":
+            return (kind, max_bytes, max_nodes or GRAPH_DRAW_MAX_NODES)
+        return (kind, max_bytes)
+
+    def has_image(self, kind, max_bytes=render.MAX_IMAGE_BYTES, max_nodes=None):
+        """True if the "network" or "degree_histogram" image is already rendered."""
+        return self._image_key(kind, max_bytes, max_nodes) in self._images
+
+    def draw_image(self, max_bytes=render.MAX_IMAGE_BYTES, max_nodes=None):
+        """Network drawing as an EncodedImage (the highest-degree nodes only for large graphs)."""
+        key = self._image_key("network", max_bytes, max_nodes)
+        if key in self._images:
+            return self._images[key]
+        with self._lock:
+            if key in self._images:
+                return self._images[key]
+            g, pos, sampled = self.layout(max_nodes)
+            small = g.number_of_nodes() <= GRAPH_LABEL_MAX_NODES
+            with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+                nx.draw_networkx(g, pos=pos, ax=ax, with_labels=small, node_color="skyblue", edge_color="gray",
+                                 node_size=300 if small else 20, width=1.0 if small else 0.3)
+                if sampled:
+                    ax.set_title(f"Top {g.number_of_nodes()} of {self.node_count} nodes by degree")
+                self._images[key] = render.figure_to_image(fig, max_bytes=max_bytes, formats=("png",))
+            return self._images[key]
+
+    def degree_histogram_image(self, max_bytes=render.MAX_IMAGE_BYTES):
+        """Degree histogram from bincount (one bar per degree up to DEGREE_HIST_MAX_BINS)."""
+        key = self._image_key("degree_histogram", max_bytes)
+        if key in self._images:
+            return self._images[key]
+        with self._lock:
+            if key in self._images:
+                return self._images[key]
+            degrees = self.degrees()
+            with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+                if len(degrees):
+                    top = int(degrees.max())
+                    if top + 1 <= DEGREE_HIST_MAX_BINS:
+                        counts = np.bincount(degrees, minlength=top + 1)
+                        edges = np.arange(0, top + 2)
+                        ax.hist(edges[1:-1], bins=edges[1:], weights=counts[1:])
+                    else:
+                        ax.hist(degrees, bins=DEGREE_HIST_MAX_BINS)
+                ax.set_xlabel("Degree")
+                ax.set_ylabel("Frequency")
+                self._images[key] = render.figure_to_image(fig, max_bytes=max_bytes, formats=("png",))
+            return self._images[key]
@@ -0,0 +1,203 @@
+import os
+import re
+import hashlib
+
+import pandas as pd
+
+from . import executor, telemetry
+from .graph_engine import Graph
+from .llm_cache import LRUCache
+
+# Graph questions over an edge list. The question text is parsed into the metrics and the
+# source/target pairs it asks for (JSON-style keys such as `shortest_path_alice_eve` or
+# phrases such as "shortest path from Alice to Eve"); all of them are answered from one Graph,
+# with one BFS per distinct source. Graphs are memoized per edge-list hash together with their
+# layouts and rendered images, so repeated questions over the same network skip the CSR build,
+# the spring layout and the PNG encoding.
+# With deferred=True the images are rendered in the io pool and returned as futures, so a
+# streaming response (app/streaming.py) can send the scalar answers while the charts render.
+
+GRAPH_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", "32"))
+GRAPH_CACHE_TTL = float(os.getenv("GRAPH_CACHE_TTL", "3600"))
+
+# Schema answered when the question names no metric it recognises
+DEFAULT_METRICS = ["edge_count", "highest_degree_node", "average_degree", "density", "network_graph", "degree_histogram"]
+DEFAULT_PAIR = ("Alice", "Eve")
+
+METRIC_PATTERNS = {
+    "edge_count": r"edge_count|number of edges|how many edges|edge count",
+    "node_count": r"node_count|number of nodes|how many nodes|node count",
+    "highest_degree_node": r"highest_degree_node|highest degree|most connected",
+    "average_degree": r"average_degree|average degree|mean degree",
+    "density": r"\bdensity\b",
+    "network_graph": r"network_graph|draw the network|network graph|plot the network",
+    "degree_histogram": r"degree_histogram|degree histogram|degree distribution",
+}
+PATH_KEY_RE = re.compile(r"\bshortest_path_(\w+)", re.IGNORECASE)
+EDGE_FILE_RE = re.compile(r"edge|graph|network|link|connection", re.IGNORECASE)
+EDGE_COLUMN_RE = re.compile(r"^(source|target|src|dst|from|to|node\w*|u|v)$", re.IGNORECASE)
+PATH_PHRASE_RE = re.compile(r"shortest path (?:between|from) ['\"]?([\w.-]+)['\"]? (?:and|to) ['\"]?([\w.-]+)", re.IGNORECASE)
+
+_graphs = LRUCache(GRAPH_CACHE_SIZE, GRAPH_CACHE_TTL)  # edge-list hash -> Graph
+
+
+def _slug(label):
+    return re.sub(r"\W+", "_", str(label).strip()).strip("_").lower()
+
+
+def edge_list_hash(df, source, target):
+    """
+    Content hash of the two edge columns. Frames from dataset_store carry their upload hash
+    in attrs, which is reused; other frames are hashed by value (the index is ignored).
+    pandas propagates attrs to derived frames, so the shape is part of the key as well.
+    """
+    h = hashlib.sha256(repr((str(source), str(target), df.shape)).encode("utf-8"))
+    content_key = df.attrs.get("content_key")
+    if content_key:
+        h.update(content_key.encode("utf-8"))
+    else:
+        h.update(pd.util.hash_pandas_object(df[[source, target]], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+@telemetry.traced("graph")
+def get_graph(df, source=None, target=None):
+    """Graph for the edge list in df (first two columns by default), memoized by content hash."""
+    source = source if source is not None else df.columns[0]
+    target = target if target is not None else df.columns[1]
+    key = edge_list_hash(df, source, target)
+    graph = _graphs.get(key)
+    if graph is None:
+        graph = Graph.from_frame(df, source, target)
+        _graphs.set(key, graph)
+    return graph
+
+
+def pick_edge_list(question, frames):
+    """
+    (name, DataFrame) of the attachment holding the edge list among {name: DataFrame} frames:
+    the file named in the question, else the best edge-list lookalike (file name, source/target
+    column names, label or id columns rather than measurements). Ties keep the upload order.
+    """
+    ql = question.lower()
+
+    def score(item):
+        name, df = item
+        if df.shape[1] < 2:
+            return -1
+        stem = os.path.splitext(name)[0].lower()
+        points = 4 if name.lower() in ql or re.search(r"(?<!\w)" + re.escape(stem) + r"(?!\w)", ql) else 0
+        points += 2 if EDGE_FILE_RE.search(name) else 0
+        points += sum(1 for c in df.columns[:2] if EDGE_COLUMN_RE.match(str(c)))
+        points += 1 if all(df[c].dtype.kind in "OSUiu" for c in df.columns[:2]) else 0
+        return points
+
+    return max(frames.items(), key=score)
+
+
+def parse_question(question, graph):
+    """
+    (metrics, pairs) requested by the question. pairs is a list of (result key, source, target)
+    with node labels resolved against the graph (case-insensitive; underscores match spaces).
+    """
+    metrics = [m for m, pattern in METRIC_PATTERNS.items() if re.search(pattern, question, re.IGNORECASE)]
+    by_slug = {}
+    for label in graph.labels:
+        by_slug.setdefault(_slug(label), label)
+
+    pairs = []
+    for match in PATH_KEY_RE.finditer(question):
+        key = match.group(0)
+        parts = match.group(1).split("_")
+        # Node names may contain underscores: try every split into two known nodes
+        for i in range(1, len(parts)):
+            a, b = by_slug.get("_".join(parts[:i]).lower()), by_slug.get("_".join(parts[i:]).lower())
+            if a is not None and b is not None:
+                pairs.append((key, a, b))
+                break
+        else:
+            if len(parts) == 2:
+                pairs.append((key, parts[0], parts[1]))  # unknown nodes: answered as []
+    for match in PATH_PHRASE_RE.finditer(question):
+        a, b = by_slug.get(_slug(match.group(1))), by_slug.get(_slug(match.group(2)))
+        if a is not None and b is not None:
+            pairs.append((f"shortest_path_{_slug(a)}_{_slug(b)}", a, b))
+
+    seen = set()
+    pairs = [p for p in pairs if not (p[0].lower() in seen or seen.add(p[0].lower()))]
+    if not metrics and not pairs:
+        metrics = list(DEFAULT_METRICS)
+    if not pairs and metrics == DEFAULT_METRICS:
+        a, b = DEFAULT_PAIR
+        pairs = [(f"shortest_path_{a.lower()}_{b.lower()}", by_slug.get(a.lower(), a), by_slug.get(b.lower(), b))]
+    return metrics, pairs
+
+
+def _render(metric, func):
+    """func() timed as graph_render, wherever it runs (the span follows the copied request context)."""
+    with telemetry.span("graph_render"):
+        return func()
+
+
+def _image(metric, func, deferred):
+    if deferred:
+        try:
+            return executor.submit(_render, metric, func)
+        except executor.Saturated:
+            pass  # render inline rather than refuse
+    try:
+        return _render(metric, func)
+    except Exception as e:
+        print(f"Graph metric {metric} failed: {e}")
+        return None
+
+
+def answer(question, df, deferred=False):
+    """
+    (result dict, required keys) for a graph question over the edge list in df.
+    Images are render.EncodedImage values, or futures of them when deferred.
+    """
+    graph = get_graph(df)
+    metrics, pairs = parse_question(question, graph)
+
+    compute = {
+        "edge_count": graph.edge_count,
+        "node_count": lambda: graph.node_count,
+        "highest_degree_node": graph.highest_degree_node,
+        "average_degree": graph.average_degree,
+        "density": graph.density,
+        "network_graph": graph.draw_image,
+        "degree_histogram": graph.degree_histogram_image,
+    }
+    images = [m for m in metrics if m in ("network_graph", "degree_histogram")]
+    result = {}
+    for metric in images:
+        # Memoized images are returned directly; only real rendering goes to the pool
+        kind = "network" if metric == "network_graph" else metric
+        result[metric] = _image(metric, compute[metric], deferred and not graph.has_image(kind))
+    for metric in metrics:
+        if metric in images:
+            continue
+        try:
+            result[metric] = compute[metric]()
+        except Exception as e:
+            print(f"Graph metric {metric} failed: {e}")
+            result[metric] = None
+
+    targets = {}
+    for _, a, b in pairs:
+        targets.setdefault(a, []).append(b)
+    paths = {a: graph.shortest_paths(a, bs) for a, bs in targets.items()}
+    for key, a, b in pairs:
+        result[key] = paths[a][b]
+    # Scalars, then paths, then images (the order the original schema used)
+    keys = [m for m in metrics if m not in images] + [key for key, _, _ in pairs] + images
+    return {k: result[k] for k in keys}, keys
+
+
+def clear():
+    _graphs.clear()
+
+
+def stats():
+    return {"graphs": len(_graphs)}
@@ -0,0 +1,168 @@
+import os
+import mmap
+import shutil
+import base64
+import hashlib
+import tempfile
+
+# Upload ingestion: every attachment is spooled to a per-request directory in fixed-size
+# chunks (never fully in memory) and handed to processors as a file path, which pandas,
+# DuckDB and Arrow can all read directly or memory-map.
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR") or None  # defaults to the system temp dir
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(1 << 30)))
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1 << 20)))
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+
+class IngestedFile:
+    """
+    An upload spooled to disk. `path` is the preferred source for readers;
+    `file` lazily opens a binary handle for code that expects a file object.
+    """
+
+    def __init__(self, filename, path, size, sha256):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self._file = None
+
+    @property
+    def file(self):
+        if self._file is None or self._file.closed:
+            self._file = open(self.path, "rb")
+        return self._file
+
+    def mmap(self):
+        """Read-only memory map of the upload (no copy into Python memory)."""
+        with open(self.path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def arrow_source(self):
+        """pyarrow memory-mapped input for zero-copy Arrow/Parquet readers."""
+        import pyarrow as pa
+
+        return pa.memory_map(self.path, "r")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __repr__(self):
+        return f"IngestedFile({self.filename!r}, size={self.size})"
+
+
+class Workspace:
+    """Per-request directory of spooled uploads; remove it with cleanup() when the request ends."""
+
+    def __init__(self, prefix="data-agent-", max_bytes=MAX_UPLOAD_BYTES):
+        self.dir = tempfile.mkdtemp(prefix=prefix, dir=UPLOAD_DIR)
+        self.max_bytes = max_bytes
+        self.files = []
+
+    def _target(self, filename):
+        name = os.path.basename(filename or "") or "upload"
+        path = os.path.join(self.dir, name)
+        n = 1
+        while os.path.exists(path):
+            root, ext = os.path.splitext(name)
+            path = os.path.join(self.dir, f"{root}_{n}{ext}")
+            n += 1
+        return name, path
+
+    def _spool(self, filename, chunks):
+        name, path = self._target(filename)
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "wb") as out:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise UploadTooLarge(f"{name} exceeds {self.max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+        ingested = IngestedFile(name, path, size, digest.hexdigest())
+        self.files.append(ingested)
+        return ingested
+
+    def add_stream(self, filename, fileobj):
+        """Spool a (sync) file-like object."""
+        return self._spool(filename, iter(lambda: fileobj.read(CHUNK_SIZE), b""))
+
+    async def add_upload(self, upload):
+        """Spool a FastAPI/Starlette UploadFile without reading it whole."""
+        name, path = self._target(upload.filename)
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise UploadTooLarge(f"{name} exceeds {self.max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+        ingested = IngestedFile(name, path, size, digest.hexdigest())
+        self.files.append(ingested)
+        return ingested
+
+    def add_base64(self, filename, data):
+        """Decode a base64 string (optionally a data: URI) to disk chunk by chunk."""
+        if data.startswith("data:") and "," in data[:200]:
+            data = data[data.index(",") + 1:]
+        return self._spool(filename, _iter_b64decode(data))
+
+    def cleanup(self):
+        for f in self.files:
+            f.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+def _iter_b64decode(data, chunk_chars=4 * CHUNK_SIZE // 3):
+    """Yield decoded bytes from a base64 string without materialising the whole payload."""
+    carry = ""
+    for start in range(0, len(data), chunk_chars):
+        piece = carry + "".join(data[start:start + chunk_chars].split())
+        usable = len(piece) - len(piece) % 4
+        carry = piece[usable:]
+        if usable:
+            yield base64.b64decode(piece[:usable], validate=True)
+    if carry:
+        # Tolerate missing padding on the final block
+        yield base64.b64decode(carry + "=" * (-len(carry) % 4))
+
+
+def source_of(f):
+    """Best readable source for an attachment: its spooled path, else its file object."""
+    return getattr(f, "path", None) or f.file
+
+
+def hash_source(source):
+    """SHA-256 of a path or seekable file object, read in chunks (position is restored)."""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    pos = source.tell()
+    while True:
+        block = source.read(CHUNK_SIZE)
+        if not block:
+            break
+        digest.update(block if isinstance(block, bytes) else block.encode("utf-8"))
+    source.seek(pos)
+    return digest.hexdigest()
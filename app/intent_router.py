@@ -0,0 +1,399 @@
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import deadline, executor, render, telemetry
+from .query_engine import AGGREGATES, COMPARISONS, LOW_WORDS, WHICH_RE, NotHandled as SQLNotHandled, to_python
+from .utils import make_scatter_with_regression
+
+# Deterministic question router. A compiled intent table (aggregates, counts, correlations,
+# top-N, arg-max/min, plots) is matched against the question, and column names are matched
+# against the loaded frames; filters ("sales > 100", "in the north region", "other than north")
+# are applied first. Each match carries a confidence: at ROUTER_MIN_CONFIDENCE or above the answer
+# comes straight from pandas (or DuckDB for out-of-core files), below it the caller falls back to
+# the LLM. Phrases the router cannot represent (a negation or comparison it did not turn into a
+# filter, arithmetic between aggregates) lower the confidence rather than being ignored.
+# Every routed question reports its answer path ("pandas:aggregate", "duckdb:template", "llm").
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") != "0"
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.75"))
+# Text columns with at most this many distinct values are scanned for values named in the question
+VALUE_FILTER_MAX_UNIQUE = 1000
+# Confidence left to a route when part of the question was not turned into a filter
+UNRESOLVED_CONFIDENCE = 0.5
+
+AGGREGATES = AGGREGATES + [(re.compile(r"\b(standard deviation|std|stdev)\b"), "std")]
+PANDAS_AGG = {"avg": "mean", "median": "median", "sum": "sum", "min": "min", "max": "max",
+              "count_distinct": "nunique", "std": "std"}
+
+PLOT_RE = re.compile(r"\b(plot|chart|draw|scatter\s*plot|scatterplot|histogram|graph of|visuali[sz]e)\b|base-?64")
+HISTOGRAM_RE = re.compile(r"\b(histogram|distribution)\b")
+BAR_RE = re.compile(r"\bbar\s*(chart|plot|graph)?\b")
+CORRELATION_RE = re.compile(r"\bcorrelat(ion|ed|e)\b")
+COUNT_RE = re.compile(r"\bhow many\b|\bcount\b|\bnumber of\b")
+ROWS_RE = re.compile(r"\b(rows|records|entries|observations|lines)\b")
+TOP_N_RE = re.compile(r"\btop\s+(\d+)\b|\b(\d+)\s+(?:highest|largest|biggest|most|best)\b")
+BOTTOM_N_RE = re.compile(r"\bbottom\s+(\d+)\b|\b(\d+)\s+(?:lowest|smallest|least|worst)\b")
+GROUP_RE = re.compile(r"\b(?:(?<!divided )(?<!multiplied )by|per|for each|in each|across)\s+")
+# More than one question in one sentence ("... and what is ...") is left to the LLM
+COMPOUND_RE = re.compile(r"\b(and|also|then)\s+(what|which|how|who|when|where|plot|draw)\b|\?.*\?", re.S)
+# Arithmetic between values ("sum of sales divided by sum of profit") is left to the LLM too
+ARITHMETIC_RE = re.compile(r"\b(divided by|multiplied by|(?<!many )times|plus|minus|ratio|difference between|"
+                           r"percentage of|proportion of|share of)\b|\s[/*]\s")
+NEGATION_RE = re.compile(r"\b(not|other than|except|excluding|exclude|besides|apart from|aside from|without|"
+                         r"isn't|aren't|doesn't|don't|never|non)\b|!=")
+# "<column> is not 10"; "is not equal to" and "!=" are ordinary COMPARISONS
+NOT_VALUE_RE = r"\s*(?:is\s+not|isn't|not)\s+['\"]?(-?\d+(?:\.\d+)?)['\"]?(?![\w.])"
+# Negation right before a category value ("regions other than north", "excluding the west")
+NEGATED_VALUE_RE = re.compile(r"\b(?:not|other than|except(?: for)?|excluding|besides|apart from|aside from|outside(?: of)?)"
+                              r"\s+(?:in\s+)?(?:the\s+)?$")
+# A comparison followed by a number; if any is left once filters are parsed, one was not understood
+COMPARISON_RE = re.compile(r"(?<!\w)(?:" + "|".join(p for p, _ in COMPARISONS) + r"|between|is not|isn't|not)"
+                           r"\s*['\"]?\$?-?\d")
+
+_plot_lock = threading.Lock()
+
+
+class Route:
+    """Outcome of routing one question."""
+
+    def __init__(self, intent, answer=None, confidence=0.0, engine="pandas"):
+        self.intent = intent
+        self.answer = answer
+        self.confidence = confidence
+        self.engine = engine
+
+    @property
+    def confident(self):
+        return self.confidence >= ROUTER_MIN_CONFIDENCE
+
+    @property
+    def path(self):
+        return f"{self.engine}:{self.intent}"
+
+
+# --- column matching ---------------------------------------------------------
+
+def match_columns(question, df):
+    """[(position, column)] for columns of df named in the question (underscores match spaces)."""
+    ql = question.lower()
+    found = []
+    for col in df.columns:
+        name = str(col).lower()
+        for variant in {name, name.replace("_", " ")}:
+            m = re.search(r"(?<!\w)" + re.escape(variant) + r"(?!\w)", ql)
+            if m:
+                found.append((m.start(), col))
+                break
+    return sorted(found, key=lambda pc: pc[0])
+
+
+def pick_frame(question, frames):
+    """(name, df, [(position, column)]) for the frame with most columns named in the question."""
+    best = (None, None, [])
+    for name, df in frames.items():
+        cols = match_columns(question, df)
+        if best[1] is None or len(cols) > len(best[2]):
+            best = (name, df, cols)
+    return best
+
+
+def _numeric(df, col):
+    return pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])
+
+
+def _parse_value(raw):
+    try:
+        return float(raw) if "." in raw else int(raw)
+    except ValueError:
+        return raw
+
+
+def _comparison(name, ql):
+    """(match, op) for the first '<column> <comparison> <value>' phrase about column name, or (None, None)."""
+    m = re.search(name + NOT_VALUE_RE, ql)
+    if m:
+        return m, "!="
+    for pattern, op in COMPARISONS:
+        m = re.search(name + r"\s*(?:is\s+)?(?:" + pattern + r")\s*['\"]?([\w.\-]+)['\"]?", ql)
+        if m:
+            return m, op
+    return None, None
+
+
+def apply_filters(question, df, cols):
+    """
+    (filtered df, [filter columns], [(start, end)] of the question text each filter came from) for
+    '<column> <comparison> <value>' phrases and named category values, negated or not.
+    """
+    ql = question.lower()
+    mask = pd.Series(True, index=df.index)
+    used = []
+    spans = []
+    for _, col in cols:
+        name = re.escape(str(col).lower()).replace("_", "[_ ]")
+        m, op = _comparison(name, ql)
+        if m is not None:
+            value = _parse_value(m.group(1))
+            s = df[col]
+            if _numeric(df, col) and isinstance(value, (int, float)):
+                cond = {">=": s >= value, "<=": s <= value, ">": s > value, "<": s < value,
+                        "!=": s != value, "=": s == value}[op]
+            else:
+                text = s.astype(str).str.lower()
+                cond = text != str(value).lower() if op == "!=" else text == str(value).lower()
+            mask &= cond.fillna(False)
+            used.append(col)
+            spans.append(m.span())
+    # Category values named in the question ("... in the north region", "other than north")
+    for col in df.columns:
+        if col in used or _numeric(df, col):
+            continue
+        s = df[col]
+        if s.nunique(dropna=True) > VALUE_FILTER_MAX_UNIQUE:
+            continue
+        values = [v for v in s.dropna().unique() if isinstance(v, str) and len(v) >= 3]
+        hits = []
+        for v in values:
+            m = re.search(r"(?<!\w)" + re.escape(v.lower()) + r"(?!\w)", ql)
+            if m:
+                hits.append((v, m))
+        if len(hits) == 1:
+            value, m = hits[0]
+            negated = NEGATED_VALUE_RE.search(ql, 0, m.start())
+            mask &= (s != value if negated else s == value).fillna(False)
+            used.append(col)
+            spans.append((negated.start() if negated else m.start(), m.end()))
+    return (df[mask] if used else df), used, spans
+
+
+def unresolved(question, spans=()):
+    """True when the question negates or compares something outside the parsed filter spans."""
+    ql = question.lower()
+    for start, end in spans:
+        ql = ql[:start] + " " * (end - start) + ql[end:]
+    return bool(NEGATION_RE.search(ql) or COMPARISON_RE.search(ql))
+
+
+def _group_column(question, df, cols, exclude=()):
+    m = GROUP_RE.search(question.lower())
+    if not m:
+        return None
+    for pos, col in cols:
+        if pos >= m.end() and col not in exclude:
+            return col
+    return None
+
+
+def _aggregates(question):
+    """Distinct aggregate functions named in the question, in AGGREGATES order."""
+    ql = question.lower()
+    found = []
+    for pattern, func in AGGREGATES:
+        if pattern.search(ql) and func not in found:
+            found.append(func)
+    return found
+
+
+def _clean(value):
+    if isinstance(value, float) and (np.isnan(value) or np.isinf(value)):
+        return None
+    return to_python(value)
+
+
+# --- intents -----------------------------------------------------------------
+
+def render_scatter(data, x, y, **kwargs):
+    """
+    Scatter + regression data URI, rendered in the CPU pool when it is available. The job is
+    admitted like any other (executor.Saturated when the queue is full) and waited for at most
+    REQUEST_TIMEOUT, capped by the request deadline (TimeoutError).
+    """
+    try:
+        future = executor.submit(make_scatter_with_regression, data, x, y, kind="cpu", **kwargs)
+    except executor.Saturated:
+        raise
+    except Exception:
+        future = None
+    if future is not None:
+        try:
+            uri, _ = future.result(timeout=deadline.clamp(executor.REQUEST_TIMEOUT or None))
+            return uri
+        except TimeoutError:
+            future.cancel()
+            raise
+        except Exception:
+            pass
+    # The process pool is broken or the data cannot be pickled: render here instead
+    with _plot_lock:
+        uri, _ = make_scatter_with_regression(data, x, y, **kwargs)
+    return uri
+
+
+def _plot(question, df, cols):
+    ql = question.lower()
+    numeric = [c for _, c in cols if _numeric(df, c)]
+    text = [c for _, c in cols if not _numeric(df, c)]
+    if HISTOGRAM_RE.search(ql) and numeric:
+        col = numeric[0]
+        with render.figure(figsize=(6, 4)) as (fig, ax):
+            ax.hist(pd.to_numeric(df[col], errors="coerce").dropna(), bins=30, color="steelblue")
+            ax.set_xlabel(str(col))
+            ax.set_ylabel("Frequency")
+            return Route("histogram", render.figure_to_data_uri(fig), 0.9)
+    if BAR_RE.search(ql) and text and numeric:
+        grouped = df.groupby(text[0], sort=False, observed=True)[numeric[0]].sum()
+        with render.figure(figsize=(6, 4)) as (fig, ax):
+            render.bar(ax, [str(c) for c in grouped.index], grouped.to_numpy(), color="steelblue")
+            ax.set_xlabel(str(text[0]))
+            ax.set_ylabel(str(numeric[0]))
+            ax.tick_params(axis="x", rotation=45)
+            return Route("bar", render.figure_to_data_uri(fig), 0.9)
+    if len(numeric) >= 2:
+        color = next((c for c in ("red", "blue", "green", "black", "orange") if c in ql), "red")
+        kwargs = {"dotted_line": "dotted" in ql or "dashed" in ql, "color_line": color}
+        return Route("scatter", render_scatter(df[numeric[:2]].copy(), numeric[0], numeric[1], **kwargs), 0.9)
+    return Route("plot", None, 0.3)
+
+
+def _correlation(question, df, cols):
+    numeric = [c for _, c in cols if _numeric(df, c)]
+    if len(numeric) < 2:
+        return Route("correlation", None, 0.4)
+    value = df[numeric[0]].astype(float).corr(df[numeric[1]].astype(float))
+    return Route("correlation", _clean(float(value)), 1.0)
+
+
+def _top_n(question, df, cols, filtered, n, ascending):
+    numeric = [c for _, c in cols if _numeric(df, c)]
+    if not numeric:
+        return Route("top_n", None, 0.4)
+    value_col = numeric[0]
+    group = _group_column(question, df, cols, exclude=(value_col,))
+    if group is not None:
+        totals = filtered.groupby(group, observed=True)[value_col].sum()
+        picked = totals.nsmallest(n) if ascending else totals.nlargest(n)
+        return Route("top_n", [_clean(v) for v in picked.index], 0.9)
+    labels = [c for _, c in cols if not _numeric(df, c)]
+    if not labels:
+        labels = [c for c in df.columns if not _numeric(df, c)][:1]
+    rows = filtered.nsmallest(n, value_col) if ascending else filtered.nlargest(n, value_col)
+    if labels:
+        return Route("top_n", [_clean(v) for v in rows[labels[0]]], 0.85)
+    return Route("top_n", [_clean(v) for v in rows[value_col]], 0.8)
+
+
+def _which(question, df, cols, filtered):
+    """'Which <group> has the highest <value>' -> group label (sum, or mean when averages are asked for)."""
+    ql = question.lower()
+    numeric = [c for _, c in cols if _numeric(df, c)]
+    text = [c for _, c in cols if not _numeric(df, c)]
+    if not numeric or not text:
+        return Route("argmax", None, 0.4)
+    func = "mean" if re.search(r"\b(average|mean|avg)\b", ql) else "sum"
+    totals = filtered.groupby(text[0], observed=True)[numeric[0]].agg(func)
+    if totals.empty:
+        return Route("argmax", None, 0.4)
+    low = any(re.search(rf"\b{w}\b", ql) for w in LOW_WORDS)
+    return Route("argmax", _clean(totals.idxmin() if low else totals.idxmax()), 0.85)
+
+
+def _count(question, df, cols, filtered, used):
+    ql = question.lower()
+    distinct = re.search(r"\b(distinct|unique|different)\b", ql)
+    if distinct:
+        targets = [c for _, c in cols if c not in used] or [c for _, c in cols]
+        if targets:
+            return Route("count", int(filtered[targets[0]].nunique()), 0.9)
+        return Route("count", None, 0.4)
+    if used or ROWS_RE.search(ql):
+        return Route("count", int(len(filtered)), 0.9)
+    return Route("count", None, 0.5)
+
+
+def _aggregate_value(question, df, cols, filtered, used, func):
+    candidates = [c for _, c in cols if c not in used]
+    value_cols = [c for c in candidates if _numeric(df, c)] if func != "count_distinct" else candidates
+    if not value_cols:
+        return Route("aggregate", None, 0.4)
+    value_col = value_cols[0]
+    group = _group_column(question, df, cols, exclude=(value_col,))
+    series = filtered[value_col]
+    if group is not None:
+        result = filtered.groupby(group, observed=True)[value_col].agg(PANDAS_AGG[func])
+        return Route("aggregate", {str(k): _clean(v) for k, v in result.items()}, 0.9)
+    return Route("aggregate", _clean(series.agg(PANDAS_AGG[func])), 0.95)
+
+
+def route_frame(question, df, cols=None):
+    """Route one question against one DataFrame. Raises nothing; low confidence means 'ask the LLM'."""
+    ql = question.lower()
+    cols = match_columns(question, df) if cols is None else cols
+    if COMPOUND_RE.search(ql) or ARITHMETIC_RE.search(ql):
+        return Route("compound", None, 0.0)
+    if PLOT_RE.search(ql):
+        return _plot(question, df, cols)
+    if CORRELATION_RE.search(ql):
+        return _correlation(question, df, cols)
+    if not cols:
+        return Route("unknown", None, 0.0)
+    filtered, used, spans = apply_filters(question, df, cols)
+    result = _route_filtered(question, df, cols, filtered, used)
+    if unresolved(question, spans):
+        result.confidence = min(result.confidence, UNRESOLVED_CONFIDENCE)
+    return result
+
+
+def _route_filtered(question, df, cols, filtered, used):
+    ql = question.lower()
+    for regex, ascending in ((TOP_N_RE, False), (BOTTOM_N_RE, True)):
+        m = regex.search(ql)
+        if m:
+            return _top_n(question, df, cols, filtered, int(m.group(1) or m.group(2)), ascending)
+    if WHICH_RE.search(ql):
+        return _which(question, df, cols, filtered)
+    funcs = _aggregates(question)
+    if len(funcs) > 1:
+        # "max and min of sales", "lowest average price": more than one aggregate
+        return Route("compound", None, 0.0)
+    func = funcs[0] if funcs else None
+    if COUNT_RE.search(ql) and func in (None, "count_distinct"):
+        return _count(question, df, cols, filtered, used)
+    if func is not None:
+        return _aggregate_value(question, df, cols, filtered, used, func)
+    return Route("unknown", None, 0.0)
+
+
+def route(question, frames=None, engine=None):
+    """
+    Route for a question over {name: DataFrame} frames (pandas) or a QueryEngine (DuckDB templates).
+    Errors inside a handler give a zero-confidence route, never an exception.
+    """
+    if not ROUTER_ENABLED:
+        return Route("disabled")
+    try:
+        if frames:
+            _, df, cols = pick_frame(question, frames)
+            return route_frame(question, df, cols)
+        ql = question.lower()
+        if engine is not None and (COMPOUND_RE.search(ql) or ARITHMETIC_RE.search(ql) or NEGATION_RE.search(ql)):
+            # The DuckDB templates take one positive filter and one aggregate
+            return Route("compound", None, 0.0, engine="duckdb")
+        if engine is not None and not PLOT_RE.search(ql):
+            try:
+                return Route("template", engine.run_template(question), 0.9, engine="duckdb")
+            except SQLNotHandled:
+                return Route("unknown", None, 0.0, engine="duckdb")
+    except Exception as e:
+        print(f"Intent router failed on {question[:60]!r}: {e}")
+    return Route("unknown")
+
+
+def report(route_or_path, label=None):
+    """Record which path answered a question (trace note + metrics counter)."""
+    path = route_or_path.path if isinstance(route_or_path, Route) else route_or_path
+    telemetry.ANSWER_PATHS.inc(path=path)
+    telemetry.note("answer_path", f"{label}={path}" if label is not None else path)
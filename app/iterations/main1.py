@@ -2,9 +2,9 @@ from fastapi import FastAPI, File, UploadFile, Request
 from fastapi.responses import JSONResponse
 import uvicorn
 import os
-import tempfile
 from typing import List
 from .processor import process_request
+from ..ingest import Workspace, UploadTooLarge
 from pathlib import Path
 
 app = FastAPI(title="Data Analyst Agent")
@@ -15,28 +15,34 @@ async def analyze(request: Request, files: List[UploadFile] = File(...)):
     Accepts a multipart form with at least one file `questions.txt` and optional other files.
     Returns JSON payload(s) as required by the input questions.
     """
-    # save uploaded files to a temp dir
-    tmpdir = Path(tempfile.mkdtemp(prefix="data-agent-"))
+    # spool uploaded files to a temp dir in chunks (never whole in memory)
+    workspace = Workspace()
+    tmpdir = Path(workspace.dir)
     saved_files = {}
-    for upload in files:
-        dest = tmpdir / upload.filename
-        content = await upload.read()
-        dest.write_bytes(content)
-        saved_files[upload.filename] = str(dest)
+    try:
+        try:
+            for upload in files:
+                saved = await workspace.add_upload(upload)
+                saved_files[upload.filename] = saved.path
+        except UploadTooLarge as e:
+            return JSONResponse(status_code=413, content={"error": str(e)})
 
-    if 'questions.txt' not in saved_files:
-        return JSONResponse(status_code=400, content={"error": "questions.txt is required and must be uploaded as the filename questions.txt"})
+        if 'questions.txt' not in saved_files:
+            return JSONResponse(status_code=400, content={"error": "questions.txt is required and must be uploaded as the filename questions.txt"})
 
-    # Read in the questions
-    qtext = open(saved_files['questions.txt'], 'r', encoding='utf-8').read()
+        # Read in the questions
+        with open(saved_files['questions.txt'], 'r', encoding='utf-8') as f:
+            qtext = f.read()
 
-    try:
-        result = process_request(qtext=qtext, files=saved_files, workdir=str(tmpdir))
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        try:
+            result = process_request(qtext=qtext, files=saved_files, workdir=str(tmpdir))
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": str(e)})
 
-    # Return the result as JSON. This assumes the result is JSON-serializable.
-    return JSONResponse(content=result)
+        # Return the result as JSON. This assumes the result is JSON-serializable.
+        return JSONResponse(content=result)
+    finally:
+        workspace.cleanup()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', '8000'))
@@ -0,0 +1,67 @@
+import time
+import importlib
+import threading
+
+# Deferred imports for the heavy libraries (matplotlib, networkx, scipy, duckdb, lxml): modules
+# bind a proxy with `nx = lazy_imports.module("networkx")` and the real module is imported on
+# the first attribute access, so importing the app (and starting a container) does not pay for
+# libraries the configured processor never touches. The wall time of each first import is kept
+# for /stats and /metrics; it excludes anything an earlier import already loaded.
+
+_times = {}
+_lock = threading.RLock()
+
+
+def load(name):
+    """importlib.import_module(name), recording how long it took if this was its first import."""
+    with _lock:
+        if name in _times:
+            return importlib.import_module(name)
+        start = time.perf_counter()
+        mod = importlib.import_module(name)
+        _times[name] = time.perf_counter() - start
+        return mod
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is used."""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        mod = self.__dict__["_module"]
+        if mod is None:
+            mod = load(self._name)
+            self.__dict__["_module"] = mod
+        return mod
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def module(name):
+    return LazyModule(name)
+
+
+def prewarm(names):
+    """Import names now (e.g. in a startup hook); failures are logged, not raised."""
+    for name in names:
+        try:
+            load(name)
+        except Exception as e:
+            print(f"Prewarm of {name} failed: {e}")
+
+
+def import_times():
+    """{module: seconds} for the modules imported through this module so far."""
+    with _lock:
+        return dict(_times)
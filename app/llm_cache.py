@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict
+
+# Content-addressed cache for LLM responses.
+# Tier 1: in-memory LRU with TTL. Tier 2 (optional): SQLite file that survives restarts.
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")  # path to SQLite file; empty disables the disk tier
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+# Set per request (X-Cache-Bypass header) to skip cache reads; fresh answers are still stored.
+bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+def make_key(model, messages, temperature, max_tokens=None):
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with per-entry expiry."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Persistent tier: one row per key, expired rows ignored on read and pruned on write."""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+            )
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, now + self.ttl),
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE expires < ?", (now,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_cache")
+
+
+_memory = LRUCache(LLM_CACHE_SIZE, LLM_CACHE_TTL)
+_disk = None
+_disk_lock = threading.Lock()
+counters = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "bypassed": 0}
+
+
+def _get_disk():
+    global _disk
+    if not LLM_CACHE_DB:
+        return None
+    with _disk_lock:
+        if _disk is None:
+            _disk = SQLiteCache(LLM_CACHE_DB, LLM_CACHE_TTL)
+        return _disk
+
+
+def get(key):
+    """Return the cached reply for key or None; honours the per-request bypass flag."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    if bypass.get():
+        counters["bypassed"] += 1
+        return None
+    value = _memory.get(key)
+    if value is not None:
+        counters["hits_memory"] += 1
+        return value
+    disk = _get_disk()
+    if disk is not None:
+        value = disk.get(key)
+        if value is not None:
+            counters["hits_disk"] += 1
+            _memory.set(key, value)
+            return value
+    counters["misses"] += 1
+    return None
+
+
+def put(key, value):
+    if not LLM_CACHE_ENABLED or value is None:
+        return
+    _memory.set(key, value)
+    disk = _get_disk()
+    if disk is not None:
+        disk.set(key, value)
+
+
+def clear():
+    _memory.clear()
+    disk = _get_disk()
+    if disk is not None:
+        disk.clear()
+    for k in counters:
+        counters[k] = 0
+
+
+def stats():
+    lookups = counters["hits_memory"] + counters["hits_disk"] + counters["misses"]
+    hits = counters["hits_memory"] + counters["hits_disk"]
+    return {
+        **counters,
+        "entries_memory": len(_memory),
+        "disk_enabled": bool(LLM_CACHE_DB),
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+
+from . import llm_cache, telemetry
+from . import deadline as request_deadline
+
+# Single gateway for every LLM call in the app.
+# All requests run on one background event loop that owns a shared keep-alive
+# HTTP pool, a global in-flight semaphore and a token-bucket rate limiter.
+# Sync callers (processors running in worker threads) use chat(); async callers use achat().
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")  # "openai" or "fake"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", "5"))
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "30"))
+# Total budget for one call including all retries and rate-limit waits.
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "90"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+
+
+class LLMError(Exception):
+    """Raised when an LLM call fails permanently or runs out of its retry budget."""
+
+
+class TransientLLMError(LLMError):
+    """Retriable failure (timeouts, rate limits, 5xx). Backends raise this to request a retry."""
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, at most `capacity` stored."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self, deadline):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise LLMError("Rate limit wait exceeds LLM deadline")
+            await asyncio.sleep(wait)
+
+
+class OpenAIBackend:
+    """AsyncOpenAI backend sharing one pooled keep-alive HTTP client."""
+
+    def __init__(self):
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise LLMError("OPENAI_API_KEY not set; OpenAI access not available")
+            http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE),
+            )
+            # Retries are handled by the gateway so they share one deadline
+            self._client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+        return self._client
+
+    async def complete(self, messages, model, max_tokens, temperature, timeout):
+        import openai
+
+        client = self._get_client()
+        kwargs = {"model": model, "messages": messages, "temperature": temperature, "timeout": timeout}
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+        try:
+            resp = await client.chat.completions.create(**kwargs)
+        except (openai.APITimeoutError, openai.APIConnectionError,
+                openai.RateLimitError, openai.InternalServerError) as e:
+            raise TransientLLMError(str(e)) from e
+        except openai.OpenAIError as e:
+            raise LLMError(str(e)) from e
+        usage = None
+        if getattr(resp, "usage", None) is not None:
+            usage = {"prompt_tokens": resp.usage.prompt_tokens, "completion_tokens": resp.usage.completion_tokens}
+        return resp.choices[0].message.content, usage
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+def _default_fake_reply(messages):
+    prompt = messages[-1]["content"] if messages else ""
+    if "json array" in prompt.lower():
+        return json.dumps(["fake answer"])
+    return json.dumps({"answer": "fake answer"})
+
+
+class FakeBackend:
+    """
+    Local backend for tests and benchmarks; never touches the network.
+    `responder(messages) -> str` builds the reply; it may raise TransientLLMError to exercise retries.
+    """
+
+    def __init__(self, responder=None, latency=0.0):
+        self.responder = responder or _default_fake_reply
+        self.latency = latency
+        self.calls = 0
+
+    async def complete(self, messages, model, max_tokens, temperature, timeout):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self.responder(messages)
+        return text, {"prompt_tokens": sum(len(m["content"]) // 4 for m in messages), "completion_tokens": len(text) // 4}
+
+    async def aclose(self):
+        pass
+
+
+_lock = threading.Lock()
+_loop = None
+_thread = None
+_backend = None
+_semaphore = None
+_bucket = None
+usage_totals = {"requests": 0, "retries": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def _make_backend(name):
+    if name == "fake":
+        return FakeBackend()
+    return OpenAIBackend()
+
+
+def get_backend():
+    global _backend
+    with _lock:
+        if _backend is None:
+            _backend = _make_backend(LLM_BACKEND)
+        return _backend
+
+
+def set_backend(backend):
+    """Swap the backend (e.g. FakeBackend() in tests). Returns the previous one."""
+    global _backend
+    with _lock:
+        previous, _backend = _backend, backend
+    return previous
+
+
+def _get_loop():
+    global _loop, _thread, _semaphore, _bucket
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+            _bucket = TokenBucket(LLM_RATE_PER_SEC, LLM_BURST)
+            _thread = threading.Thread(target=_loop.run_forever, name="llm-gateway", daemon=True)
+            _thread.start()
+        return _loop
+
+
+async def _complete(messages, model, max_tokens, temperature, deadline, trace=None):
+    backend = get_backend()
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMError("LLM deadline exceeded")
+        await _bucket.acquire(deadline)
+        try:
+            async with _semaphore:
+                text, usage = await asyncio.wait_for(
+                    backend.complete(messages, model, max_tokens, temperature,
+                                     timeout=min(LLM_REQUEST_TIMEOUT, remaining)),
+                    timeout=remaining,
+                )
+        except (TransientLLMError, asyncio.TimeoutError) as e:
+            attempt += 1
+            if attempt > LLM_MAX_RETRIES:
+                raise LLMError(f"LLM call failed after {attempt} attempts: {e}") from e
+            # Full jitter exponential backoff, never sleeping past the deadline
+            backoff = random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+            if time.monotonic() + backoff >= deadline:
+                raise LLMError(f"LLM deadline exceeded while retrying: {e}") from e
+            usage_totals["retries"] += 1
+            await asyncio.sleep(backoff)
+            continue
+        usage_totals["requests"] += 1
+        if usage:
+            usage_totals["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            usage_totals["completion_tokens"] += usage.get("completion_tokens") or 0
+            if trace is not None:
+                # Runs on the gateway loop, outside the request's context: count on its trace
+                trace.count("llm_tokens", (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0))
+        return text
+
+
+def _budget(deadline):
+    """Seconds this call may take: its own deadline capped by what is left of the request."""
+    if request_deadline.low(request_deadline.LLM_MIN_SECONDS):
+        raise LLMError("No time left in the request for an LLM call")
+    return request_deadline.clamp(deadline if deadline is not None else LLM_DEADLINE)
+
+
+def _submit(messages, model, max_tokens, temperature, deadline):
+    loop = _get_loop()
+    deadline_at = time.monotonic() + _budget(deadline)
+    return asyncio.run_coroutine_threadsafe(
+        _complete(messages, model or LLM_MODEL, max_tokens, temperature, deadline_at, telemetry.current_trace()), loop
+    )
+
+
+@telemetry.traced("llm")
+def chat(messages, model=None, max_tokens=None, temperature=0.0, deadline=None):
+    """Blocking chat completion; returns the reply text or raises LLMError."""
+    key = llm_cache.make_key(model or LLM_MODEL, messages, temperature, max_tokens)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    future = _submit(messages, model, max_tokens, temperature, deadline)
+    try:
+        text = future.result()
+    except LLMError:
+        usage_totals["errors"] += 1
+        raise
+    llm_cache.put(key, text)
+    return text
+
+
+@telemetry.traced("llm")
+async def achat(messages, model=None, max_tokens=None, temperature=0.0, deadline=None):
+    """Awaitable chat completion usable from any event loop."""
+    key = llm_cache.make_key(model or LLM_MODEL, messages, temperature, max_tokens)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    future = _submit(messages, model, max_tokens, temperature, deadline)
+    try:
+        text = await asyncio.wrap_future(future)
+    except LLMError:
+        usage_totals["errors"] += 1
+        raise
+    llm_cache.put(key, text)
+    return text
+
+
+def close():
+    """Close the backend's HTTP pool and stop the gateway loop."""
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop = _thread = None
+    if loop is None:
+        return
+    backend = get_backend()
+    asyncio.run_coroutine_threadsafe(backend.aclose(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
@@ -0,0 +1,134 @@
+import os
+import re
+import warnings
+import importlib.util
+
+import pandas as pd
+
+from . import telemetry
+
+# Typed CSV loading. The head of the file is sampled to choose compact dtypes
+# (Arrow-backed strings, categoricals for low-cardinality text, parsed ISO dates), the file is
+# then read with pandas' multi-threaded pyarrow engine. Numeric columns keep the parser's int64 and
+# float64: narrower types overflow (int32 products) or lose precision in aggregates (float32 sums).
+# Malformed files fall back to the C parser, then to skipping bad lines.
+
+LOADER_ENGINE = os.getenv("LOADER_ENGINE", "pyarrow")  # "c" disables the Arrow engine
+LOADER_SAMPLE_ROWS = int(os.getenv("LOADER_SAMPLE_ROWS", "10000"))
+LOADER_PARSE_DATES = os.getenv("LOADER_PARSE_DATES", "1") != "0"
+CATEGORY_MAX_UNIQUE = int(os.getenv("CATEGORY_MAX_UNIQUE", "1000"))
+CATEGORY_MAX_RATIO = float(os.getenv("CATEGORY_MAX_RATIO", "0.5"))
+# Files at least this big are analysed in streaming mode instead of being loaded whole
+STREAMING_MIN_BYTES = int(os.getenv("STREAMING_MIN_BYTES", str(512 << 20)))
+
+STRING_DTYPE = "string[pyarrow]"
+DATE_LIKE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$")
+
+# read_csv options the pyarrow engine does not support
+_C_ONLY = {"nrows", "chunksize", "iterator", "skipfooter", "low_memory", "on_bad_lines", "converters", "thousands"}
+
+
+def _rewind(source):
+    if not isinstance(source, (str, os.PathLike)) and hasattr(source, "seek"):
+        source.seek(0)
+
+
+def _arrow_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def should_stream(source):
+    """True when a path/attachment is too large to load as one DataFrame."""
+    path = getattr(source, "path", source)
+    if not isinstance(path, (str, os.PathLike)):
+        return False
+    try:
+        return os.path.getsize(path) >= STREAMING_MIN_BYTES
+    except OSError:
+        return False
+
+
+def infer_dtypes(sample, parse_dates=True):
+    """
+    ({column: dtype}, [date-like columns]) for the text columns of a sampled head.
+    Date-like columns get a dtype only when parse_dates is off (they stay text).
+    Numeric columns are left to the parser (int64 / float64).
+    """
+    dtypes = {}
+    dates = []
+    for col in sample.columns:
+        s = sample[col]
+        if s.dtype != object:
+            continue
+        present = s.dropna()
+        if len(present) and present.map(lambda v: isinstance(v, str) and bool(DATE_LIKE_RE.match(v.strip()))).all():
+            dates.append(col)
+            if parse_dates:
+                continue
+        unique = present.nunique()
+        if len(present) and unique <= CATEGORY_MAX_UNIQUE and unique <= CATEGORY_MAX_RATIO * len(present):
+            dtypes[col] = "category"
+        else:
+            dtypes[col] = STRING_DTYPE
+    return dtypes, dates
+
+
+@telemetry.traced("csv_parse")
+def read_csv(source, parse_dates=None, **kwargs):
+    """
+    Drop-in pd.read_csv with compact dtypes. Caller kwargs win over inferred ones;
+    options the Arrow engine cannot handle route the read through the C parser.
+    parse_dates: None (LOADER_PARSE_DATES), a bool, or pandas' explicit column list.
+    """
+    explicit_dates = parse_dates if isinstance(parse_dates, (list, tuple, dict)) else None
+    parse_dates = LOADER_PARSE_DATES if parse_dates is None else bool(parse_dates) and explicit_dates is None
+    try:
+        _rewind(source)
+        head_kwargs = {k: v for k, v in kwargs.items() if k not in ("nrows", "chunksize", "iterator")}
+        sample = pd.read_csv(source, nrows=LOADER_SAMPLE_ROWS, **head_kwargs)
+        dtypes, dates = infer_dtypes(sample, parse_dates)
+    except Exception as e:
+        print(f"dtype inference failed, loading with defaults: {e}")
+        dtypes, dates = {}, []
+
+    if not _arrow_available():
+        dtypes = {c: ("object" if t == STRING_DTYPE else t) for c, t in dtypes.items()}
+    options = dict(kwargs)
+    user_dtype = kwargs.get("dtype")
+    if user_dtype is None:
+        options["dtype"] = dtypes
+    elif isinstance(user_dtype, dict):
+        options["dtype"] = {**dtypes, **user_dtype}
+    if explicit_dates is not None:
+        options["parse_dates"] = explicit_dates
+        if isinstance(options.get("dtype"), dict) and isinstance(explicit_dates, (list, tuple)):
+            options["dtype"] = {c: t for c, t in options["dtype"].items() if c not in explicit_dates}
+            dates = [c for c in dates if c not in explicit_dates]
+    elif dates and parse_dates:
+        options["parse_dates"] = dates
+    # Arrow infers timestamps itself and would reformat date text that should stay as written
+    keep_text = bool(dates) and not parse_dates
+
+    attempts = []
+    if (LOADER_ENGINE == "pyarrow" and _arrow_available() and not keep_text
+            and not (set(kwargs) & _C_ONLY) and "engine" not in kwargs):
+        arrow = dict(options, engine="pyarrow")
+        if dates and parse_dates and isinstance(arrow.get("dtype"), dict):
+            # Arrow parses ISO timestamps natively; pandas' parse_dates would re-parse them
+            arrow.pop("parse_dates")
+            arrow["dtype"] = {**{c: "datetime64[ns]" for c in dates}, **arrow["dtype"]}
+        attempts.append(arrow)
+    attempts.append(options)
+    attempts.append(dict(kwargs, on_bad_lines="skip"))
+    error = None
+    for attempt in attempts:
+        try:
+            _rewind(source)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                df = pd.read_csv(source, **attempt)
+            return df
+        except Exception as e:
+            error = e
+            print(f"CSV load with {attempt.get('engine', 'c')} engine failed ({e}); retrying")
+    raise error
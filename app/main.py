@@ -1,32 +1,256 @@
-from fastapi import FastAPI, UploadFile, File
-import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
 import os
 import sys
+import asyncio
 
-# --- Import processor safely ---
-try:
-    # Case 1: Running as package
-    from .processor import process_question
-except ImportError:
-    # Case 2: Running as plain script
-    from .processor import process_question
+from . import executor, ingest, llm_gateway, llm_cache, fetcher, streaming, telemetry, deadline
+from . import lazy_imports, processors
+
+# The API entry point (uvicorn app.main:app). The processor that answers /api/ is chosen with
+# PROCESSOR (app/processors.py) and imported on first use; PREWARM moves that work to startup.
+# Older clients keep working: the question can also come as `qtext` or a questions.txt upload.
+# Nothing here imports pandas, numpy or the plotting stack; the processors pull them in when used.
 
 app = FastAPI()
 
 
-@app.post("/api/")
-async def analyze(
-    questions_txt: UploadFile = File(..., alias="questions.txt"),
-    data_csv: UploadFile = File(..., alias="data.csv"),
-):
-    # Read uploaded files
-    questions_text = (await questions_txt.read()).decode("utf-8")
-    file_contents = (await data_csv.read()).decode("utf-8")
-
-    result = process(questions_text, file_contents)
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Request ID, latency metrics and (optionally) a Server-Timing breakdown per request. Latency is
+    recorded once the body has been sent, so streamed answers include the charts rendered meanwhile.
+    """
+    trace, token = telemetry.start_trace(request.headers.get("x-request-id"))
+    route = request.url.path if request.url.path in _routes() else "other"
+    telemetry.request_started()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        telemetry.request_finished(route, request.method, 500, trace.elapsed())
+        raise
+    finally:
+        telemetry.end_trace(token)
+    response.body_iterator = _observed_body(response.body_iterator, trace, route, request.method, response.status_code)
+    response.headers["X-Request-ID"] = trace.request_id
+    if trace.notes.get("answer_path"):
+        # Which path answered each question: deterministic engine or LLM
+        response.headers["X-Answer-Path"] = ",".join(trace.notes["answer_path"])
+    if telemetry.TIMING_HEADERS or request.headers.get("x-debug-timing", "").lower() in ("1", "true", "yes"):
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+async def _observed_body(body, trace, route, method, status):
+    """The response body, recording the request's latency when it has been sent (or abandoned)."""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        telemetry.request_finished(route, method, status, trace.elapsed())
+
+
+def _routes():
+    return {getattr(r, "path", None) for r in app.routes}
+
+
+def _loaded(name):
+    """The app module `name` if a processor has imported it, else None (importing it for stats would load pandas)."""
+    return sys.modules.get(f"{__package__}.{name}")
+
+
+@telemetry.add_collector
+def _collect_metrics():
+    """Pool, LLM and cache counters for /metrics."""
+    yield "executor_in_flight", "gauge", "Jobs admitted to the worker pools", {}, executor.in_flight()
+    for kind in ("prompt_tokens", "completion_tokens"):
+        yield "llm_tokens_total", "counter", "LLM tokens used", {"kind": kind}, llm_gateway.usage_totals[kind]
+    for kind in ("requests", "retries", "errors"):
+        yield f"llm_{kind}_total", "counter", f"LLM gateway {kind}", {}, llm_gateway.usage_totals[kind]
+    dataset_store, graph_questions, code_plans = _loaded("dataset_store"), _loaded("graph_questions"), _loaded("code_plans")
+    rates = {"llm": llm_cache.stats()["hit_rate"], "fetch": fetcher.stats()["local_rate"],
+             "datasets": dataset_store.stats()["hit_rate"] if dataset_store else 0.0,
+             "code_plans": code_plans.stats()["hit_rate"] if code_plans else 0.0}
+    for cache, rate in rates.items():
+        yield "cache_hit_rate", "gauge", "Hit rate per cache since start", {"cache": cache}, rate
+    yield ("graph_cache_entries", "gauge", "Graphs memoized by edge-list hash", {},
+           graph_questions.stats()["graphs"] if graph_questions else 0)
+    yield ("code_plan_entries", "gauge", "Validated programs cached by question template and schema", {},
+           code_plans.stats()["plans"] if code_plans else 0)
+    for module, seconds in lazy_imports.import_times().items():
+        yield "import_seconds", "gauge", "Time taken by the first import of lazily loaded modules", {"module": module}, seconds
+    for backend in processors.backends():
+        if backend.import_seconds() is not None:
+            yield ("processor_import_seconds", "gauge", "Import cost of each loaded processor backend, first-call libraries included",
+                   {"backend": backend.name}, backend.import_seconds())
+
+async def parse_files(files_data, workspace) -> list:
+    """
+    Spool uploaded files in request to disk and return them as ingest.IngestedFile (what processors take).
+    Handles both base64 files from JSON and standard UploadFile.
+    """
+    result = []
+    if files_data:
+        for f in files_data:
+            # JSON base64 files (decoded to disk chunk by chunk)
+            if isinstance(f, dict) and "filename" in f and "content" in f:
+                try:
+                    result.append(workspace.add_base64(f["filename"], f["content"]))
+                    f["content"] = None  # release the encoded payload early
+                except ingest.UploadTooLarge:
+                    raise
+                except Exception as e:
+                    print(f"Error decoding base64 file {f.get('filename','unknown')}: {e}")
+            # FastAPI UploadFile
+            elif isinstance(f, StarletteUploadFile):
+                result.append(await workspace.add_upload(f))
+            # Already a file-like object as fallback
+            elif hasattr(f, "filename") and hasattr(f, "file"):
+                result.append(workspace.add_stream(f.filename, f.file))
     return result
 
+@app.post("/api/")
+async def analyze(request: Request):
+    """
+    POST endpoint that accepts a question about uploaded files (JSON or multipart).
+    """
+    files = []
+    question = None
+    job = None
+    workspace = ingest.Workspace()
+    # The budget starts when the request arrives, so upload time counts against it
+    dl, dl_token = deadline.start()
+
+    try:
+        content_type = request.headers.get("content-type", "")
+        # Clients can force fresh LLM answers for this request
+        llm_cache.bypass.set(request.headers.get("x-cache-bypass", "").lower() in ("1", "true", "yes"))
+
+        # Handle application/json uploads (API/test/automation)
+        if "application/json" in content_type:
+            data = await request.json()
+            question = data.get("question")
+            # Try test frameworks
+            if not question and isinstance(data.get("vars"), dict):
+                question = data["vars"].get("question")
+            file_objs = data.get("files", [])
+            with telemetry.span("upload"):
+                files = await parse_files(file_objs, workspace)
+
+        # Handle multipart/form-data uploads
+        elif "multipart/form-data" in content_type:
+            with telemetry.span("upload"):
+                form = await request.form()
+                question = form.get("question") or form.get("qtext")
+                # Uploads under any field name ("files", "data.csv", ...)
+                form_files = [v for _, v in form.multi_items() if isinstance(v, StarletteUploadFile)]
+                files = await parse_files(form_files, workspace)
+
+        if not isinstance(question, str):
+            question = None
+        if not question:
+            question, files = _questions_upload(files)
+
+        # Fallback: query param or empty-body requests
+        if not question:
+            question = request.query_params.get("question")
+
+        if not question or not question.strip():
+            return JSONResponse({"error": "Missing required field: question"}, status_code=400)
+
+        # Heavy lifting (pandas, plotting, OpenAI) runs in the worker pool, not on the event loop.
+        # Every stage sees the request deadline and degrades before it; the pool timeout is the backstop.
+        job = executor.submit(processors.run, question, files, workspace)
+        try:
+            result = await executor.wait(
+                job, timeout=min(executor.REQUEST_TIMEOUT or float("inf"), max(dl.remaining(), 0) + deadline.DEADLINE_MARGIN / 2),
+            )
+        except (asyncio.TimeoutError, deadline.DeadlineExceeded):
+            return _partial_response(question, dl)
+        if isinstance(result, (dict, list)):
+            # Written incrementally: ready keys first, charts base64-encoded as they finish rendering
+            return streaming.json_response(result, headers=_degraded_headers(dl),
+                                           timeout=max(dl.remaining(), 0) + deadline.DEADLINE_MARGIN)
+        else:
+            return JSONResponse(content={"error": "Invalid JSON response from processor"}, status_code=500)
+
+    except ingest.UploadTooLarge as e:
+        return JSONResponse(content={"error": str(e)}, status_code=413)
+    except executor.Saturated as e:
+        return JSONResponse(
+            content={"error": f"Server busy, retry later: {str(e)}"},
+            status_code=503,
+            headers={"Retry-After": "5"}
+        )
+    except Exception as e:
+        print(f"[{telemetry.request_id()}] API Error: {str(e)}")
+        return JSONResponse(
+            content={"error": f"An unexpected error occurred: {str(e)}"},
+            status_code=500
+        )
+    finally:
+        deadline.reset(dl_token)
+        if job is not None and not job.done():
+            # A timed-out job may still be reading the uploads: remove them once it finishes
+            job.add_done_callback(lambda _: workspace.cleanup())
+        else:
+            workspace.cleanup()
+
+
+def _questions_upload(files):
+    """(question, other files) from a questions.txt upload, as older clients send it."""
+    for f in files:
+        if f.filename.lower() == "questions.txt":
+            with open(f.path, "r", encoding="utf-8", errors="ignore") as fh:
+                return fh.read(), [other for other in files if other is not f]
+    return None, files
+
+
+def _degraded_headers(dl):
+    return {"X-Degraded": ",".join(dl.degraded)} if dl.degraded else {}
+
+
+def _partial_response(question, dl):
+    """Answers completed before the deadline, in the requested JSON shape (200, marked partial)."""
+    result = dl.partial.value
+    if result is None:
+        result = [] if "json array" in question.lower() else {}
+    headers = {**_degraded_headers(dl), "X-Partial-Result": "deadline"}
+    print(f"[{telemetry.request_id()}] Deadline reached; returning partial result")
+    return streaming.json_response(result, headers=headers, timeout=deadline.DEADLINE_MARGIN)
+
+@app.on_event("startup")
+def prewarm():
+    # Fail fast on a misconfigured PROCESSOR rather than on the first request
+    backend = processors.get()
+    print(f"Processor: {backend.name} ({backend.description})")
+    processors.prewarm()
+
+
+@app.on_event("shutdown")
+def shutdown_pools():
+    executor.shutdown()
+    llm_gateway.close()
+    fetcher.close()
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy"}
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(telemetry.render_metrics(), media_type="text/plain; version=0.0.4")
 
+@app.get("/stats")
+async def stats():
+    """Cache and import statistics; caches of modules no request has loaded yet are null."""
+    loaded = {key: _loaded(name) for key, name in
+              (("datasets", "dataset_store"), ("graphs", "graph_questions"), ("code_plans", "code_plans"))}
+    return {"llm_cache": llm_cache.stats(), "fetch_cache": fetcher.stats(),
+            **{key: module.stats() if module else None for key, module in loaded.items()},
+            "processors": processors.stats()}
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
+    import uvicorn
+    uvicorn.run("app.main:app", host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
@@ -1,30 +1,3 @@
-from fastapi import FastAPI, File, UploadFile, Form
-from typing import List, Optional
-from .processor import process_request
-import json
-
-app = FastAPI()
-
-@app.post("/api/")
-async def process_api(
-    files: List[UploadFile] = File(...),
-    qtext: Optional[str] = Form(None)
-):
-    """
-    API endpoint for data analysis.
-    - files: list of uploaded files (questions.txt always present, others optional)
-    - qtext: optional inline questions (not used by uni tests, for your own testing)
-    """
-    try:
-        answers = process_request(files=files, qtext=qtext)
-        return json.loads(json.dumps(answers))  # Force valid JSON
-    except Exception:
-        try:
-            q_count = 0
-            if files:
-                first_file = files[0]
-                content = first_file.file.read().decode("utf-8", errors="ignore")
-                q_count = len([line for line in content.split("\n") if line.strip()])
-            return ["" for _ in range(q_count)]
-        except:
-            return []
+# The API lives in app/main.py; this module is kept so deployments that start
+# `uvicorn app.main3:app` keep working. main accepts the same files + qtext form.
+from .main import app  # noqa: F401
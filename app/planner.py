@@ -0,0 +1,269 @@
+import os
+import re
+import json
+import threading
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from . import deadline, intent_router, llm_gateway, telemetry
+
+# Fans numbered sub-questions out to independent solver tasks and reassembles the answers in order.
+PLANNER_WORKERS = int(os.getenv("PLANNER_WORKERS", "8"))
+
+NUM_PREFIX_RE = re.compile(r"^\s*\d+\.")
+KEY_RE = re.compile(r"`([A-Za-z_][A-Za-z0-9_]*)`")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Marks sub-questions still running at the deadline
+_PENDING = object()
+
+
+class NotHandled(Exception):
+    """A solver could not answer the question; the planner falls back to the LLM."""
+
+
+class RequestContext:
+    """Data shared by every solver task of one request (frames are read-only)."""
+
+    def __init__(self, qtext, frames=None, tables=None, engine=None):
+        self.qtext = qtext
+        self.preamble, self.questions = split_preamble(qtext)
+        # False when the whole text is one question (no "1.", "2." sub-questions)
+        self.numbered = any(NUM_PREFIX_RE.match(ln) for ln in qtext.splitlines())
+        self.frames = dict(frames or {})
+        self.tables = list(tables or [])
+        self.engine = engine  # optional QueryEngine over the attachments
+        self._description = None
+        self._lock = threading.Lock()
+
+    def named_frames(self):
+        """{name: DataFrame} over the attached files and scraped tables."""
+        frames = dict(self.frames)
+        frames.update((f"table{i + 1}", df) for i, df in enumerate(self.tables))
+        return frames
+
+    def primary_frame(self):
+        if self.frames:
+            return next(iter(self.frames.values()))
+        if self.tables:
+            return self.tables[0]
+        return None
+
+    def describe(self):
+        """Short schema + sample text for LLM prompts, built once per request."""
+        with self._lock:
+            if self._description is None:
+                parts = [
+                    f"File: {name}\nColumns: {list(df.columns)}\nSample:\n{df.head(3).to_dict()}"
+                    for name, df in self.frames.items()
+                ]
+                parts += [
+                    f"Table {i + 1}: Columns: {list(df.columns)}\nSample:\n{df.head(3).to_dict()}"
+                    for i, df in enumerate(self.tables)
+                ]
+                if self.engine is not None:
+                    parts.append(self.engine.schema_text())
+                self._description = "\n".join(parts)
+            return self._description
+
+
+def split_preamble(qtext):
+    """Split questions text into (preamble, [numbered questions])."""
+    lines = [ln.rstrip() for ln in qtext.strip().splitlines() if ln.strip()]
+    preamble = []
+    questions = []
+    current = None
+    for ln in lines:
+        if re.match(NUM_PREFIX_RE, ln):
+            if current:
+                questions.append(" ".join(current).strip())
+            current = [re.sub(NUM_PREFIX_RE, "", ln).strip()]
+        elif current is None:
+            preamble.append(ln)
+        else:
+            current.append(ln)
+    if current:
+        questions.append(" ".join(current).strip())
+    if not questions:
+        return "", [qtext.strip()]
+    return "\n".join(preamble), questions
+
+
+def classify(question, ctx=None):
+    ql = question.lower()
+    if "plot" in ql or "chart" in ql or "draw" in ql or "base64" in ql or "base-64" in ql:
+        return "plot"
+    if ctx is not None and ctx.engine is not None:
+        return "sql"
+    if "correlation" in ql:
+        return "pandas"
+    return "llm"
+
+
+def _find_columns(question, df, count=2):
+    """Columns of df named in the question (whole words only), in order of appearance."""
+    return [c for _, c in intent_router.match_columns(question, df)][:count]
+
+
+def solve_pandas(question, ctx):
+    df = ctx.primary_frame()
+    if df is None:
+        raise NotHandled("no data")
+    ql = question.lower()
+    if "correlation" in ql:
+        cols = _find_columns(question, df)
+        if len(cols) < 2:
+            cols = df.select_dtypes(include=["number"]).columns.tolist()[:2]
+        if len(cols) < 2:
+            raise NotHandled("need two columns for correlation")
+        return float(df[cols[0]].astype(float).corr(df[cols[1]].astype(float)))
+    raise NotHandled(question)
+
+
+def solve_sql(question, ctx):
+    return ctx.engine.answer(question)
+
+
+def solve_plot(question, ctx):
+    df = ctx.primary_frame()
+    if df is None and ctx.engine is not None:
+        # Pull only the mentioned columns out of DuckDB
+        view, cols = ctx.engine.find_columns(question)
+        if view is not None and len(cols) >= 2:
+            df = ctx.engine.fetch_columns(view, cols[:2])
+    if df is None:
+        raise NotHandled("no data")
+    cols = _find_columns(question, df)
+    if len(cols) < 2:
+        cols = df.select_dtypes(include=["number"]).columns.tolist()[:2]
+    if len(cols) < 2:
+        raise NotHandled("need two columns to plot")
+    ql = question.lower()
+    kwargs = {"dotted_line": "dotted" in ql or "dashed" in ql or "regression" in ql, "color_line": "red"}
+    return intent_router.render_scatter(df[cols].copy(), cols[0], cols[1], **kwargs)
+
+
+def solve_llm(question, ctx):
+    prompt = f"""
+You are a data analyst. You have the following data:
+{ctx.describe()}
+
+Context:
+{ctx.preamble}
+
+Question:
+{question}
+
+Return ONLY the answer as a single JSON value (number, string, array or object), no explanations.
+"""
+    raw = llm_gateway.chat([{"role": "user", "content": prompt}], model="gpt-4o-mini", temperature=0).strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`")
+        if raw.lower().startswith("json"):
+            raw = raw[4:]
+        raw = raw.strip()
+    try:
+        return json.loads(raw)
+    except Exception:
+        return raw
+
+
+SOLVERS = {"pandas": solve_pandas, "sql": solve_sql, "plot": solve_plot, "llm": solve_llm}
+
+
+def _solve(question, ctx, index=None):
+    with telemetry.span("route"):
+        route = intent_router.route(question, ctx.named_frames(), ctx.engine)
+    if route.confident:
+        intent_router.report(route, index)
+        return route.answer
+    kind = classify(question, ctx)
+    if kind != "llm":
+        try:
+            with telemetry.span(f"solve_{kind}"):
+                answer = SOLVERS[kind](question, ctx)
+            intent_router.report(f"solver:{kind}", index)
+            return answer
+        except Exception:
+            pass  # deterministic solver couldn't answer; ask the LLM
+    intent_router.report("llm", index)
+    return solve_llm(question, ctx)
+
+
+def _safe_solve(question, ctx, index=None):
+    try:
+        return _solve(question, ctx, index)
+    except Exception as e:
+        print(f"[{telemetry.request_id()}] Question {index} failed: {type(e).__name__}: {e}")
+        return ""
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=PLANNER_WORKERS, thread_name_prefix="solver")
+        return _pool
+
+
+@telemetry.traced("planner")
+def answer_questions(qtext, frames=None, tables=None, engine=None, as_object=None, as_strings=False):
+    """
+    Answer every numbered question in qtext concurrently and return the answers in order,
+    as a list, or as a dict keyed by the `backticked` names when a JSON object is requested.
+    Questions still running when the request deadline passes are answered with "" (strings) or None.
+    With as_strings and no numbered sub-questions, a single answer that is itself an array is the
+    array of strings, not one JSON-encoded string.
+    """
+    ctx = RequestContext(qtext, frames, tables, engine)
+    if as_object is None:
+        as_object = "json object" in qtext.lower()
+    answers = [_PENDING] * len(ctx.questions)
+    dl = deadline.current()
+
+    def assemble():
+        out = []
+        parts = answers
+        if as_strings and not as_object and not ctx.numbered and len(answers) == 1 and isinstance(answers[0], list):
+            parts = answers[0]
+        for a in parts:
+            if a is _PENDING:
+                a = "" if as_strings else None
+            elif as_strings and not isinstance(a, str):
+                a = json.dumps(a)
+            out.append(a)
+        if as_object:
+            result = {}
+            for q, a in zip(ctx.questions, out):
+                m = KEY_RE.search(q)
+                result[m.group(1) if m else q] = a
+            return result
+        return out
+
+    def finished(i, future):
+        if not future.cancelled():
+            answers[i] = future.result()
+        if dl is not None:
+            # Keep the completed answers available in case the request runs out of time
+            dl.partial.set(assemble())
+
+    pool = _get_pool()
+    futures = []
+    for i, q in enumerate(ctx.questions):
+        future = pool.submit(contextvars.copy_context().run, _safe_solve, q, ctx, i + 1)
+        future.add_done_callback(functools.partial(finished, i))
+        futures.append(future)
+    done, not_done = wait(futures, timeout=deadline.clamp(None))
+    if not_done:
+        deadline.degrade("planner")
+        for f in not_done:
+            f.cancel()
+    for i, f in enumerate(futures):
+        # Done callbacks may still be running; read finished results directly
+        if f in done:
+            answers[i] = f.result()
+    return assemble()
@@ -1,135 +1,163 @@
-import os
 import json
-import base64
-import io
-import pandas as pd
-import matplotlib.pyplot as plt
-import networkx as nx
-import requests
-from bs4 import BeautifulSoup
-import duckdb
-
-# OpenAI client
-try:
-    from openai import OpenAI
-    NEW_OPENAI = True
-except ImportError:
-    import openai
-    NEW_OPENAI = False
-
-if NEW_OPENAI:
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-else:
-    openai.api_key = os.getenv("OPENAI_API_KEY")
 
+from . import code_plans, llm_gateway, tables, dataset_store, graph_questions, intent_router, lazy_imports, telemetry
+from .planner import KEY_RE, answer_questions, split_preamble
+from .query_engine import QueryEngine, is_tabular
+from .profiler import profile_csv
+from .render import figure_to_data_uri
 
-def encode_plot(fig, format="png", max_size=100_000, min_dpi=50):
-    """Encode matplotlib figure to base64 under max_size bytes."""
-    dpi = 150
-    while dpi >= min_dpi:
-        buf = io.BytesIO()
-        fig.savefig(buf, format=format, bbox_inches="tight", dpi=dpi)
-        buf.seek(0)
-        b64 = base64.b64encode(buf.read()).decode("utf-8")
-        if len(b64.encode("utf-8")) <= max_size * 1.37:
-            plt.close(fig)
-            return f"data:image/{format};base64,{b64}"
-        dpi -= 10
-    plt.close(fig)
-    return f"data:image/{format};base64,{b64}"
+plt = lazy_imports.module("matplotlib.pyplot")
 
 
-def process_question(question: str, files: list):
-    """Main dispatcher for handling different question types."""
+@telemetry.traced("encode_plot")
+def encode_plot(fig, format="png", max_size=100_000, min_dpi=50):
+    """Encode matplotlib figure to a base64 data URI under max_size bytes (rendered once)."""
+    try:
+        return figure_to_data_uri(fig, max_bytes=max_size, formats=(format,))
+    finally:
+        plt.close(fig)
 
-    # Load all attached CSVs
+
+def load_frames(files):
+    """Load all attached CSVs into pandas."""
     dfs = {}
     for f in files:
         try:
-            df = pd.read_csv(f.file)
+            df = dataset_store.read_csv(f)
             dfs[f.filename] = df
         except Exception:
             pass
+    return dfs
+
+
+@telemetry.traced("process_question")
+def process_question(question: str, files: list):
+    """Main dispatcher for handling different question types."""
 
     q_lower = question.lower()
 
+    # === 0. DuckDB queries: scan the attachments in place, never load them into pandas ===
+    if "duckdb" in q_lower or "parquet" in q_lower:
+        with QueryEngine(files) as engine:
+            if engine.errors:
+                # Answering without the table would silently give a wrong answer
+                return {"error": engine.error_text()}
+            if engine.views:
+                return answer_questions(question, engine=engine)
+        return call_llm_for_answer("", question)
+
+    is_graph = "shortest_path" in q_lower or "edge_count" in q_lower or "degree" in q_lower
+
+    # === 0b. Several related tables: a question spanning them is joined in DuckDB, not in pandas ===
+    if not is_graph and sum(1 for f in files if is_tabular(f.filename)) > 1:
+        joined = answer_across_files(question, [f for f in files if is_tabular(f.filename)])
+        if joined is not None:
+            return joined
+
+    # Load all attached CSVs
+    dfs = load_frames(files)
+
     # === 1. Multi-question prompt → must return JSON array of strings ===
     if "json array of strings" in q_lower:
-        result = call_llm_for_answer("", question, force_array=True)
+        # Each numbered sub-question is solved concurrently and reassembled in order
+        result = answer_questions(question, frames=dfs, as_object=False, as_strings=True)
         return validate_array_of_strings(result)
 
     # === 2. Graph/network tasks (based on question, not file name) ===
-    if "shortest_path" in q_lower or "edge_count" in q_lower or "degree" in q_lower:
+    if is_graph:
         if not dfs:
             return {"error": "No CSV provided for graph analysis"}
-        # Just take the first CSV provided
-        df = list(dfs.values())[0]
-        G = nx.from_pandas_edgelist(df, df.columns[0], df.columns[1])
-
-        edge_count = G.number_of_edges()
-        degree_dict = dict(G.degree())
-        highest_degree_node = max(degree_dict, key=degree_dict.get)
-        avg_degree = sum(degree_dict.values()) / len(degree_dict)
-        density = nx.density(G)
-        try:
-            shortest_path = nx.shortest_path(G, source="Alice", target="Eve")
-        except Exception:
-            shortest_path = []
-
-        fig1, ax1 = plt.subplots()
-        nx.draw_networkx(G, ax=ax1, with_labels=True, node_color="skyblue", edge_color="gray")
-        network_graph = encode_plot(fig1)
-
-        fig2, ax2 = plt.subplots()
-        degrees = list(degree_dict.values())
-        ax2.hist(degrees, bins=range(1, max(degrees) + 2))
-        ax2.set_xlabel("Degree")
-        ax2.set_ylabel("Frequency")
-        degree_histogram = encode_plot(fig2)
-
-        result = {
-            "edge_count": edge_count,
-            "highest_degree_node": highest_degree_node,
-            "average_degree": avg_degree,
-            "density": density,
-            "shortest_path_alice_eve": shortest_path,
-            "network_graph": network_graph,
-            "degree_histogram": degree_histogram
-        }
-        return validate_required_keys(result, [
-            "edge_count", "highest_degree_node", "average_degree",
-            "density", "shortest_path_alice_eve",
-            "network_graph", "degree_histogram"
-        ])
+        # The edge list is the file the question names, else the attachment that looks like one
+        _, df = graph_questions.pick_edge_list(question, dfs)
+        # Metrics and source/target pairs come from the question; graph, layout and images
+        # are memoized per edge-list hash. Charts render in the background and are streamed.
+        result, required = graph_questions.answer(question, df, deferred=True)
+        return validate_required_keys(result, required)
 
     # === 3. Wikipedia scraping ===
     if "wikipedia" in q_lower:
         url = next((t for t in question.split() if t.startswith("http")), None)
         if not url:
             return {"error": "No URL found in question"}
-        html = requests.get(url).text
-        soup = BeautifulSoup(html, "html.parser")
-        table = soup.find("table", {"class": "wikitable"})
-        df = pd.read_html(str(table))[0]
+        # Parsed once with lxml and cached as typed Parquet per page version
+        found = tables.get_tables(url, css_class="wikitable") or tables.get_tables(url)
+        if not found:
+            return {"error": "No table found at URL"}
+        df = found[0]
         description = f"Data columns: {df.columns.tolist()} sample: {df.head(3).to_dict()}"
-        return call_llm_for_answer(description, question)
-
-    # === 4. DuckDB queries ===
-    if "duckdb" in q_lower or "parquet" in q_lower:
-        return call_llm_for_answer("", question)
+        return answer_with_code(question, {"table": df}, description)
 
     # === 5. Generic CSV analysis ===
     if dfs:
+        # Aggregates, counts, correlations, top-N and plots are answered straight from the frames
+        direct = answer_directly(question, dfs)
+        if direct is not None:
+            return direct
+        # Compact profiles, cached per upload hash
         description_parts = [
-            f"File: {name}\nColumns: {list(df.columns)}\nSample:\n{df.head(3).to_dict()}"
-            for name, df in dfs.items()
+            profile_csv(f)
+            for f in files if f.filename in dfs
         ]
-        return call_llm_for_answer("\n".join(description_parts), question)
+        return answer_with_code(question, dfs, "\n".join(description_parts))
 
     # === 6. Fallback ===
     return call_llm_for_answer("", question)
 
 
+def answer_across_files(question, files):
+    """
+    Answers when the question's columns span several related attachments, over a DuckDB join
+    view of them (keys and relationships are inferred per request); None otherwise, or when an
+    attachment could not be registered (the per-file pandas path answers instead).
+    """
+    with QueryEngine(files) as engine:
+        if engine.errors:
+            # A join without one of the tables could be wrong; pandas answers per file instead
+            return None
+        view, _ = engine.find_columns(question)
+        if not engine.is_join(view):
+            return None
+        if "json array of strings" in question.lower():
+            result = answer_questions(question, engine=engine, as_object=False, as_strings=True)
+            return validate_array_of_strings(result)
+        result = answer_questions(question, engine=engine)
+        if isinstance(result, list) and len(result) == 1:
+            return {"answer": result[0]}
+        return result
+
+
+def answer_directly(question, dfs):
+    """
+    Answer every (sub-)question with the intent router, or return None if any of them is not
+    routed confidently (the whole question then goes to the LLM in one call).
+    Shape: dict keyed by `backticked` names, list for numbered questions, else {"answer": value}.
+    """
+    _, questions = split_preamble(question)
+    with telemetry.span("route"):
+        routes = [intent_router.route(q, dfs) for q in questions]
+    if not all(r.confident for r in routes):
+        return None
+    for i, r in enumerate(routes):
+        intent_router.report(r, i + 1 if len(routes) > 1 else None)
+    keys = [KEY_RE.search(q) for q in questions]
+    if "json object" in question.lower() and all(keys):
+        return {m.group(1): r.answer for m, r in zip(keys, routes)}
+    if len(routes) > 1:
+        return [r.answer for r in routes]
+    return {"answer": routes[0].answer}
+
+
+def answer_with_code(question, dfs, description):
+    """Run a cached or LLM-written program over the full frames; ask the LLM for the values if that fails."""
+    if code_plans.CODE_PLANS_ENABLED:
+        try:
+            return code_plans.answer(question, dfs, description)
+        except code_plans.PlanError as e:
+            print(f"[{telemetry.request_id()}] Code plan not used: {e}")
+    intent_router.report("llm")
+    return call_llm_for_answer(description, question)
+
+
 def call_llm_for_answer(data_description, question, force_array=False):
     """Call OpenAI LLM and parse JSON result safely."""
     if force_array:
@@ -155,18 +183,14 @@ Return ONLY valid JSON matching exactly the keys, structure, and format requeste
 Do not include explanations or extra fields.
 """
 
-    if NEW_OPENAI:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        raw_output = response.choices[0].message.content
-    else:
-        response = openai.ChatCompletion.create(
+    try:
+        raw_output = llm_gateway.chat(
+            [{"role": "user", "content": prompt}],
             model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}]
+            temperature=0
         )
-        raw_output = response.choices[0].message["content"]
+    except llm_gateway.LLMError as e:
+        return {"error": "LLM call failed", "details": str(e)}
 
     # --- CLEANUP: strip Markdown fences ---
     cleaned = raw_output.strip()
@@ -1,10 +1,14 @@
 import json
 import re
-from .utils import find_urls, fetch_url_text, read_html_tables, make_scatter_with_regression
+from .utils import find_urls, make_scatter_with_regression
+from . import deadline, fetcher, dataset_store, loader, telemetry
+from .query_engine import QueryEngine, is_tabular
+from .tables import get_tables
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from .openai_client import chat
+from .planner import answer_questions
 
 NUM_PREFIX_RE = re.compile(r"^\s*\d+\.")
 
@@ -33,46 +37,54 @@ def load_csv_if_any(files):
     for name, path in files.items():
         if name.lower().endswith('.csv'):
             try:
-                df = pd.read_csv(path)
+                df = dataset_store.read_csv(path)
                 return df, name
             except Exception:
                 continue
     return None, None
 
+@telemetry.traced("process_request")
 def process_request(qtext, files, workdir):
     """
     Main orchestration. Attempt to answer questions in qtext using available files, web scraping (if URLs present), and pandas.
 
     Returns either a JSON array of strings (list) or a JSON object, depending on the detected question format.
     """
-    questions = split_questions(qtext)
-
-    # Detect if the user expects an array or object by scanning for "respond with a JSON array of strings" or "respond with a JSON object"
-    expects_array = 'json array' in qtext.lower() or 'json array of strings' in qtext.lower()
+    # Detect if the user expects an object ("respond with a JSON object"); otherwise answers form an array
     expects_object = 'json object' in qtext.lower()
 
     # Try to load CSV if provided
-    df_csv, csv_name = load_csv_if_any(files)
+    # Several tables (CSV, Parquet, JSON, Excel) are registered together in DuckDB with their
+    # inferred keys, so questions spanning them are joined there instead of in pandas
+    tabular = [str(path) for name, path in files.items() if is_tabular(name)]
+    # CSVs too big for one DataFrame are queried out-of-core through DuckDB instead
+    big_csv = next((path for name, path in files.items()
+                    if name.lower().endswith('.csv') and loader.should_stream(path)), None)
+    engine_files = tabular if len(tabular) > 1 else [str(big_csv)] if big_csv else None
+    df_csv, csv_name = (None, None) if engine_files else load_csv_if_any(files)
 
     # Search for URLs in the text
     urls = find_urls(qtext)
 
     # Simple heuristic: if there's a Wikipedia URL, attempt to read its tables
     scraped_tables = None
-    if urls:
-        for u in urls:
+    if urls and not deadline.expired():
+        # Only tables with these columns matter for the highest-grossing questions
+        hints = ['world', 'gross', 'peak'] if 'highest' in qtext.lower() else None
+        # Fetch every URL concurrently; keep the first (in question order) that has tables
+        for u, page in fetcher.fetch_all(urls).items():
+            if isinstance(page, Exception):
+                continue
             try:
-                html = fetch_url_text(u)
-                tables = read_html_tables(html)
+                tables = get_tables(u, hints=hints, page=page)
+                if not tables and hints:
+                    tables = get_tables(u, page=page)
                 if tables:
                     scraped_tables = tables
                     break
             except Exception:
                 continue
 
-    answers = []
-    answer_obj = {}
-
     # Provide two processing modes: specific heuristics for well-known examples, and a generic fallback.
 
     # Special case: if the text mentions 'highest grossing films' and we scraped tables, try to find table with 'Worldwide' or 'Peak'
@@ -100,14 +112,19 @@ def process_request(qtext, files, workdir):
             if 'peak' in lc or 'world' in lc or 'gross' in lc:
                 peak_col = c
         # Try to extract numeric values from peak column
-        if peak_col:
+        if peak_col and pd.api.types.is_numeric_dtype(table[peak_col]):
+            # Money columns arrive already typed from the table cache
+            table['_peak_num'] = table[peak_col].astype(float)
+        elif peak_col:
             # Remove non-digit except dot and comma, convert to numeric
             s = table[peak_col].astype(str).str.replace(r'[^0-9\.,]','', regex=True).str.replace(',','').replace('', '0')
             try:
                 table['_peak_num'] = pd.to_numeric(s, errors='coerce')
             except Exception:
                 table['_peak_num'] = pd.to_numeric(s.str.replace(',',''), errors='coerce')
-        if rank_col:
+        if rank_col and pd.api.types.is_numeric_dtype(table[rank_col]):
+            table['_rank_num'] = table[rank_col]
+        elif rank_col:
             try:
                 table['_rank_num'] = pd.to_numeric(table[rank_col], errors='coerce')
             except Exception:
@@ -177,11 +194,15 @@ def process_request(qtext, files, workdir):
         except Exception:
             corr = None
 
+        # The three numeric answers stand even if the plot does not make the deadline
+        partial = [before2000, str(earliest_over_15) if earliest_over_15 is not None else "", round(float(corr) if corr is not None else 0.0, 6), ""]
+        deadline.record(partial)
+
         # 4) Create scatterplot and return as base64 data URI
         plot_uri = None
         slope = None
         try:
-            if '_rank_num' in table.columns and '_peak_num' in table.columns:
+            if '_rank_num' in table.columns and '_peak_num' in table.columns and not deadline.expired():
                 plot_uri, slope = make_scatter_with_regression(table, '_rank_num', '_peak_num', dotted_line=True, color_line='red', max_size_bytes=100000)
         except Exception:
             plot_uri = None
@@ -190,44 +211,15 @@ def process_request(qtext, files, workdir):
         arr = [before2000, str(earliest_over_15) if earliest_over_15 is not None else "", round(float(corr) if corr is not None else 0.0, 6), plot_uri or ""]
         return arr
 
-    # Generic fallback: If CSV provided and qtext asks straightforward questions, attempt the following
+    # Generic fallback: If CSV provided, answer the numbered questions concurrently
+    # (deterministic pandas / plotting solvers first, LLM otherwise) and return them in order
     if df_csv is not None:
-        # Very generic: if user asked for correlation between two columns named in the questions, try to parse
-        # We will attempt to answer numbered questions in order and return as array
-        answers = []
-        for q in questions:
-            ql = q.lower()
-            if 'correlation' in ql and 'and' in ql:
-                # parse two column names heuristically
-                parts = ql.split('correlation')[-1]
-                cols = re.findall(r"'([A-Za-z0-9_ ]+)'|\b([A-Za-z0-9_]+)\b", parts)
-                # flatten
-                cols = [c for tup in cols for c in tup if c]
-                if len(cols) >= 2:
-                    c1, c2 = cols[0].strip(), cols[1].strip()
-                    if c1 in df_csv.columns and c2 in df_csv.columns:
-                        val = float(df_csv[c1].astype(float).corr(df_csv[c2].astype(float)))
-                        answers.append(val)
-                        continue
-                # fallback: compute a correlation between numeric cols
-                numeric = df_csv.select_dtypes(include=["number"]).columns.tolist()
-                if len(numeric) >= 2:
-                    val = float(df_csv[numeric[0]].corr(df_csv[numeric[1]]))
-                    answers.append(val)
-                    continue
-                answers.append(None)
-            elif 'plot' in ql and ('scatter' in ql or 'plot' in ql):
-                # attempt to plot first two numeric columns
-                numeric = df_csv.select_dtypes(include=["number"]).columns.tolist()
-                if len(numeric) >= 2:
-                    uri, slope = make_scatter_with_regression(df_csv, numeric[0], numeric[1], dotted_line=True, color_line='red')
-                    answers.append(uri)
-                else:
-                    answers.append("")
-            else:
-                # fallback: echo the question
-                answers.append("")
-        return answers
+        return answer_questions(qtext, frames={csv_name: df_csv}, as_object=expects_object)
+    if engine_files:
+        with QueryEngine(engine_files) as engine:
+            if engine.errors:
+                return {"error": engine.error_text()}
+            return answer_questions(qtext, engine=engine, as_object=expects_object)
 
     # Final fallback: try to ask OpenAI to help interpret the questions and propose an answer.
     # This will only run if OPENAI_API_KEY is set; if not, we return a simple placeholder.
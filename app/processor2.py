@@ -1,28 +1,26 @@
-import os
-import io
 import json
-import pandas as pd
-import openai
 from fastapi import UploadFile
 from typing import List
+from . import llm_gateway, telemetry
+from .profiler import profile_csv, PROFILE_TOKEN_BUDGET
 
+@telemetry.traced("process_request")
 def process_request(files: List[UploadFile]):
     # Prepare CSV and question text
     csv_texts = []
     questions_text = ""
 
     for file in files:
-        content = file.file.read()
-        file.file.seek(0)
-
         if file.filename.lower().endswith(".csv"):
+            # Bounded schema + stats + sample instead of the whole CSV text
             try:
-                df = pd.read_csv(io.BytesIO(content))
-                csv_texts.append(df.to_csv(index=False))
+                csv_texts.append(profile_csv(file))
             except Exception as e:
-                csv_texts.append(content.decode("utf-8"))
+                file.file.seek(0)
+                csv_texts.append(file.file.read(PROFILE_TOKEN_BUDGET * 4).decode("utf-8", errors="ignore"))
         else:
-            questions_text += content.decode("utf-8") + "\n"
+            questions_text += file.file.read().decode("utf-8") + "\n"
+        file.file.seek(0)
 
     # Build prompt
     prompt_parts = []
@@ -39,21 +37,16 @@ def process_request(files: List[UploadFile]):
     full_prompt = "\n\n".join(prompt_parts)
 
     # Call OpenAI
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    if not openai.api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set.")
-
-    response = openai.ChatCompletion.create(
+    answer_text = llm_gateway.chat(
         model="gpt-4o-mini",  # you can change to another available model
         messages=[
             {"role": "system", "content": "You are a data analyst. Be concise and accurate. Always respond in JSON array format."},
             {"role": "user", "content": full_prompt}
         ],
         temperature=0
-    )
+    ).strip()
 
     # Parse output
-    answer_text = response.choices[0].message["content"].strip()
     try:
         answers = json.loads(answer_text)
     except json.JSONDecodeError:
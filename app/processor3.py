@@ -1,14 +1,27 @@
-import pandas as pd
-import io
-import openai
-import os
 from typing import List, Optional
 from fastapi import UploadFile
+from . import llm_gateway, telemetry
+from .profiler import profile_csv
+from .query_engine import QueryEngine, is_tabular
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+def relationship_text(files):
+    """How the attached tables join (inferred keys), or "" for fewer than two tables on disk."""
+    tabular = [f for f in files if is_tabular(f.filename) and getattr(f, "path", None)]
+    if len(tabular) < 2:
+        return ""
+    try:
+        with QueryEngine(tabular) as engine:
+            if engine.errors:
+                # Relationships inferred without every table would mislead the LLM
+                return ""
+            return engine.relationship_text()
+    except Exception as e:
+        print(f"[{telemetry.request_id()}] Relationship inference failed: {e}")
+        return ""
 
+@telemetry.traced("process_request")
 def process_request(files: List[UploadFile], qtext: Optional[str] = None):
-    csv_dataframes = []
+    csv_profiles = []
     questions_text = ""
 
     # If qtext is provided directly, include it
@@ -17,21 +30,20 @@ def process_request(files: List[UploadFile], qtext: Optional[str] = None):
 
     # Process uploaded files
     for file in files:
-        content = file.file.read()
         try:
             if file.filename.endswith(".csv"):
-                df = pd.read_csv(io.BytesIO(content))
-                csv_dataframes.append(df)
+                csv_profiles.append(profile_csv(file))
             else:
-                questions_text += content.decode("utf-8") + "\n"
+                questions_text += file.file.read().decode("utf-8") + "\n"
         except Exception:
-            questions_text += content.decode("utf-8", errors="ignore") + "\n"
+            file.file.seek(0)
+            questions_text += file.file.read().decode("utf-8", errors="ignore") + "\n"
 
-    # Merge all CSVs into a single CSV text
-    csv_text = ""
-    if csv_dataframes:
-        merged_df = pd.concat(csv_dataframes, ignore_index=True)
-        csv_text = merged_df.to_csv(index=False)
+    # Compact per-file profiles (schema, stats, sample) instead of the full concatenated CSV text
+    csv_text = "\n\n".join(csv_profiles)
+    relations = relationship_text(files)
+    if relations:
+        csv_text += "\n\n" + relations
 
     # Build LLM prompt
     prompt = f"""
@@ -47,14 +59,12 @@ If a question cannot be answered from the data, still answer it to the best of y
 """
 
     # Call OpenAI API
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
-
     try:
-        answer = response.choices[0].message["content"].strip()
+        answer = llm_gateway.chat(
+            [{"role": "user", "content": prompt}],
+            model="gpt-4o-mini",
+            temperature=0
+        ).strip()
         return answer
     except Exception as e:
         return {"error": str(e)}
@@ -1,25 +1,14 @@
-import os
 import json
-import pandas as pd
-import matplotlib.pyplot as plt
 import base64
-import io
 from typing import List, Optional
 from fastapi import UploadFile
 from dotenv import load_dotenv
-import openai  # old API style
+from . import llm_gateway, dataset_store, telemetry
 
 # Load environment variables for local testing
 load_dotenv()
 
-# Get OpenAI API key from environment
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError("OPENAI_API_KEY not set in environment")
-
-# Configure API key for old-style openai
-openai.api_key = api_key
-
+@telemetry.traced("process_request")
 def process_request(files: List[UploadFile], qtext: Optional[str] = None):
     """
     Processes uploaded files and optional qtext.
@@ -32,15 +21,14 @@ def process_request(files: List[UploadFile], qtext: Optional[str] = None):
 
     # Read uploaded files
     for file in files:
-        content = file.file.read()
         if file.filename.lower().endswith(".txt"):
-            questions = content.decode("utf-8").strip()
+            questions = file.file.read().decode("utf-8").strip()
         elif file.filename.lower().endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(content))
+            df = dataset_store.read_csv(file)
             csv_dataframes.append(df)
         else:
             try:
-                other_files_content[file.filename] = content.decode("utf-8")
+                other_files_content[file.filename] = file.file.read().decode("utf-8")
             except:
                 pass
 
@@ -75,14 +63,12 @@ If plotting is requested, return the plot as base64-encoded string in place of t
 """
 
     try:
-        # Call OpenAI API using old-style ChatCompletion
-        response = openai.ChatCompletion.create(
+        # Call OpenAI API through the shared gateway
+        raw_output = llm_gateway.chat(
+            [{"role": "user", "content": prompt}],
             model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
             temperature=0
-        )
-
-        raw_output = response["choices"][0]["message"]["content"].strip()
+        ).strip()
 
         try:
             return json.loads(raw_output)
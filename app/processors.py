@@ -0,0 +1,165 @@
+import os
+import io
+import time
+import threading
+
+from . import lazy_imports
+
+# Processor registry. app.main is the only API entry point; PROCESSOR picks which processor
+# module answers /api/ requests. Every backend is called the same way, run(question, files, workspace)
+# with files as ingest.IngestedFile uploads, and an adapter maps that onto the module's own
+# signature (a name -> path dict, a questions.txt upload, the first CSV's path, ...).
+# Backend modules are imported on first use, or at startup when PREWARM asks for it. Each backend's
+# import cost (its module plus the heavy libraries its first request pulled in) is reported in
+# /stats and /metrics.
+
+PROCESSOR = os.getenv("PROCESSOR", "processor")
+# Work done in the startup hook, comma separated: "processor" imports the configured backend,
+# "deps" the heavy libraries it may use, "sandbox" starts the program sandbox server.
+# "1"/"all" means all three; empty (the default) keeps startup minimal.
+PREWARM = os.getenv("PREWARM", "")
+
+PREWARM_STEPS = ("processor", "deps", "sandbox")
+HEAVY_MODULES = ("matplotlib.pyplot", "matplotlib.figure", "matplotlib.backends.backend_agg", "networkx",
+                 "scipy.sparse.csgraph", "duckdb", "lxml.html")
+
+_backends = {}
+_lock = threading.Lock()
+
+
+class UnknownProcessor(Exception):
+    """PROCESSOR names a backend that is not registered."""
+
+
+class Backend:
+    def __init__(self, name, module, call, description=""):
+        self.name = name
+        self.module = module
+        self.call = call
+        self.description = description
+        # Lazily loaded libraries first imported during this backend's first call, {module: seconds}
+        self.first_call_imports = None
+
+    @property
+    def qualified(self):
+        return f"{__package__}.{self.module}"
+
+    def load(self):
+        return lazy_imports.load(self.qualified)
+
+    def run(self, question, files, workspace):
+        module = self.load()
+        if self.first_call_imports is not None:
+            return self.call(module, question, files, workspace)
+        before = set(lazy_imports.import_times())
+        try:
+            return self.call(module, question, files, workspace)
+        finally:
+            self.first_call_imports = {k: v for k, v in lazy_imports.import_times().items() if k not in before}
+
+    def import_seconds(self):
+        """Module import plus first-call library imports, or None if the backend was never loaded."""
+        own = lazy_imports.import_times().get(self.qualified)
+        if own is None:
+            return None
+        return own + sum((self.first_call_imports or {}).values())
+
+
+def register(name, module, call, description=""):
+    """Add a backend: module is the app module name, call(module, question, files, workspace)."""
+    with _lock:
+        _backends[name] = Backend(name, module, call, description)
+
+
+def get(name=None):
+    name = name or PROCESSOR
+    try:
+        return _backends[name]
+    except KeyError:
+        raise UnknownProcessor(f"unknown processor {name!r} (registered: {', '.join(sorted(_backends))})") from None
+
+
+def names():
+    return sorted(_backends)
+
+
+def backends():
+    return [_backends[name] for name in sorted(_backends)]
+
+
+def run(question, files, workspace, name=None):
+    """Answer question over files with the configured (or named) backend."""
+    return get(name).run(question, files, workspace)
+
+
+# --- Adapters -----------------------------------------------------------------
+
+def _questions_file(question, workspace):
+    """The question as an uploaded questions.txt, for processors that read questions from a file."""
+    return workspace.add_stream("questions.txt", io.BytesIO(question.encode("utf-8")))
+
+
+def _first_csv(files):
+    csv = next((f for f in files if f.filename.lower().endswith(".csv")), None)
+    if csv is None:
+        raise ValueError("This processor needs a CSV upload")
+    return csv
+
+
+register("processor", "processor", lambda m, q, files, ws: m.process_question(q, files),
+         "Deterministic solvers, DuckDB, graph and table answers with an LLM fallback")
+register("processor1", "processor1",
+         lambda m, q, files, ws: m.process_request(q, {f.filename: f.path for f in files}, ws.dir),
+         "Scraping (URLs in the question), out-of-core CSV queries and scatter plots")
+register("processor2", "processor2", lambda m, q, files, ws: m.process_request(list(files) + [_questions_file(q, ws)]),
+         "CSV profiles sent to the LLM; answers as a JSON array of strings")
+register("processor3", "processor3", lambda m, q, files, ws: m.process_request(files, qtext=q),
+         "CSV profiles sent to the LLM with the inline question")
+register("processor4", "processor4", lambda m, q, files, ws: m.process_request(files, qtext=q),
+         "Full CSV sample and other text attachments sent to the LLM")
+register("processortoday", "processortoday", lambda m, q, files, ws: m.process_question(_first_csv(files).path, q),
+         "Summary statistics and charts for one CSV, plus LLM answers")
+register("processortoday2", "processortoday2",
+         lambda m, q, files, ws: m.process_question(_first_csv(files).path, _questions_file(q, ws).path),
+         "Summary statistics and charts for one CSV (no streaming summaries)")
+
+
+# --- Startup and reporting ----------------------------------------------------
+
+def prewarm_steps(value=None):
+    value = (PREWARM if value is None else value).strip().lower()
+    if value in ("1", "true", "yes", "all"):
+        return PREWARM_STEPS
+    return tuple(s.strip() for s in value.split(",") if s.strip() in PREWARM_STEPS)
+
+
+def prewarm(steps=None):
+    """Do the PREWARM work now (called from the startup hook); returns {step: seconds}."""
+    timings = {}
+    for step in prewarm_steps(steps):
+        start = time.perf_counter()
+        try:
+            if step == "processor":
+                get().load()
+            elif step == "deps":
+                lazy_imports.prewarm(HEAVY_MODULES)
+            elif step == "sandbox":
+                from . import sandbox
+
+                sandbox.prewarm()
+        except Exception as e:
+            print(f"Prewarm step {step} failed: {e}")
+        timings[step] = time.perf_counter() - start
+    if timings:
+        print("Prewarmed " + ", ".join(f"{k} in {v:.2f}s" for k, v in timings.items()))
+    return timings
+
+
+def stats():
+    times = lazy_imports.import_times()
+    backends = {}
+    for name, backend in sorted(_backends.items()):
+        backends[name] = {"module": backend.qualified, "description": backend.description,
+                          "import_seconds": backend.import_seconds(), "first_call_imports": backend.first_call_imports}
+    deps = {k: v for k, v in times.items() if not k.startswith(f"{__package__}.")}
+    return {"active": PROCESSOR, "backends": backends, "dependency_import_seconds": deps}
@@ -1,31 +1,25 @@
-import os
-import io
-import base64
 import json
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from openai import OpenAI
+from . import llm_gateway
+from . import render, dataset_store, loader, telemetry
+from .profiler import profile_csv
+from .stats_engine import (numeric_block, numeric_summary, correlation_matrix, categorical_summary,
+                           ChunkedSummary, STATS_CHUNK_ROWS)
 
-# Initialize OpenAI client (new SDK)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-
-def encode_chart():
-    """Helper to capture current matplotlib figure as base64 PNG."""
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png", dpi=100, bbox_inches="tight")
-    plt.close()
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
-
-
-def analyze_csv_generic(csv_file: str, questions: str):
+def encode_chart(fig):
     """
-    Generic CSV analyzer that:
-    1. Computes numeric + categorical summaries.
-    2. Builds automatic visualizations.
-    3. Uses OpenAI to answer custom questions.
+    Capture a rendered figure as base64 PNG (rendered once, re-encoded to fit the size budget).
+    The bytes are base64-encoded only when the response is written.
     """
-    df = pd.read_csv(csv_file)
+    return render.figure_to_image(fig, render.MAX_IMAGE_BYTES, formats=("png",), bare=True)
+
+
+def summarize_in_memory(csv_file):
+    """Stats and charts for a CSV that fits in memory."""
+    # Dates stay text here: the frequency tables report them as written in the file
+    df = dataset_store.read_csv(csv_file, parse_dates=False)
     results = {}
 
     # --- Basic stats ---
@@ -33,37 +27,33 @@ def analyze_csv_generic(csv_file: str, questions: str):
     cat_cols = df.select_dtypes(exclude="number").columns.tolist()
 
     if numeric_cols:
-        for col in numeric_cols:
-            results[f"{col}_sum"] = float(df[col].sum())
-            results[f"{col}_mean"] = float(df[col].mean())
-            results[f"{col}_median"] = float(df[col].median())
-            results[f"{col}_min"] = float(df[col].min())
-            results[f"{col}_max"] = float(df[col].max())
+        # All numeric aggregates in one vectorized pass over a single float block
+        block = numeric_block(df, numeric_cols)
+        for col, agg in numeric_summary(df, numeric_cols, block).items():
+            for name, value in agg.items():
+                results[f"{col}_{name}"] = value
 
         # Correlations (floats only, JSON-safe)
-        corr = df[numeric_cols].corr().to_dict()
-        results["correlations"] = {
-            c1: {c2: float(v) for c2, v in sub.items()} for c1, sub in corr.items()
-        }
+        results["correlations"] = correlation_matrix(df, numeric_cols, block)
 
         # Histogram of first numeric col
-        plt.hist(df[numeric_cols[0]], bins=10, color="blue")
-        plt.title(f"Histogram of {numeric_cols[0]}")
-        results["histogram_chart"] = encode_chart()
+        with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+            ax.hist(df[numeric_cols[0]], bins=10, color="blue")
+            ax.set_title(f"Histogram of {numeric_cols[0]}")
+            results["histogram_chart"] = encode_chart(fig)
 
     if cat_cols:
-        for col in cat_cols:
-            top_val = df[col].mode()[0] if not df[col].mode().empty else None
+        for col, (top_val, freq) in categorical_summary(df, cat_cols).items():
             results[f"{col}_mode"] = str(top_val)
-            freq = df[col].value_counts().to_dict()
-            results[f"{col}_frequencies"] = {str(k): int(v) for k, v in freq.items()}
+            results[f"{col}_frequencies"] = freq
 
         # Bar chart for cat + numeric
         if numeric_cols:
-            plt.bar(df[cat_cols[0]], df[numeric_cols[0]], color="green")
-            plt.xticks(rotation=45)
-            plt.title(f"{numeric_cols[0]} by {cat_cols[0]}")
-            results["bar_chart"] = encode_chart()
+            with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+                render.bar(ax, df[cat_cols[0]], df[numeric_cols[0]], color="green")
+                ax.tick_params(axis="x", labelrotation=45)
+                ax.set_title(f"{numeric_cols[0]} by {cat_cols[0]}")
+                results["bar_chart"] = encode_chart(fig)
 
     # --- Date/time chart ---
     date_cols = [c for c in df.columns if "date" in c.lower() or "time" in c.lower()]
@@ -71,13 +61,111 @@ def analyze_csv_generic(csv_file: str, questions: str):
         df[date_cols[0]] = pd.to_datetime(df[date_cols[0]], errors="coerce")
         df_sorted = df.dropna(subset=[date_cols[0]]).sort_values(by=date_cols[0])
         if not df_sorted.empty:
-            plt.plot(df_sorted[date_cols[0]], df_sorted[numeric_cols[0]], color="red")
-            plt.title(f"{numeric_cols[0]} over {date_cols[0]}")
-            results["line_chart"] = encode_chart()
+            with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+                render.line(ax, df_sorted[date_cols[0]], df_sorted[numeric_cols[0]], color="red")
+                ax.set_title(f"{numeric_cols[0]} over {date_cols[0]}")
+                results["line_chart"] = encode_chart(fig)
+
+    return results
+
+
+def summarize_streaming(csv_file, chunksize=STATS_CHUNK_ROWS):
+    """
+    Same result keys as summarize_in_memory from one chunked pass with bounded memory:
+    sketches for the statistics, a t-digest histogram, a pruned per-category envelope for the
+    bar chart and a random sample of rows for the line chart.
+    """
+    summary = ChunkedSummary()
+    rng = np.random.default_rng(0)
+    bar_top, bar_bottom = {}, {}
+    line_sample = None
+    cat_col = num_col = date_col = None
+
+    for chunk in loader.read_csv(csv_file, chunksize=chunksize, parse_dates=False):
+        first = summary.numeric_cols is None
+        summary.update(chunk)
+        if first:
+            num_col = summary.numeric_cols[0] if summary.numeric_cols else None
+            cat_col = summary.cat_cols[0] if summary.cat_cols else None
+            date_col = next((c for c in chunk.columns if "date" in c.lower() or "time" in c.lower()), None)
+        if num_col is None:
+            continue
+        values = pd.to_numeric(chunk[num_col], errors="coerce")
+        if cat_col is not None:
+            grouped = values.groupby(chunk[cat_col].astype(str), sort=False)
+            for key, v in grouped.max().dropna().items():
+                bar_top[key] = max(bar_top.get(key, v), v)
+            for key, v in grouped.min().dropna().items():
+                bar_bottom[key] = min(bar_bottom.get(key, v), v)
+            if len(bar_top) > 10 * render.BAR_MAX_CATEGORIES:
+                # Only the tallest bars are ever drawn; a category dropped here cannot come back taller
+                heights = {k: max(bar_top[k], 0) - min(bar_bottom.get(k, 0), 0) for k in bar_top}
+                keep = set(sorted(heights, key=heights.get, reverse=True)[: 2 * render.BAR_MAX_CATEGORIES])
+                bar_top = {k: v for k, v in bar_top.items() if k in keep}
+                bar_bottom = {k: v for k, v in bar_bottom.items() if k in keep}
+        if date_col is not None:
+            part = pd.DataFrame({"t": pd.to_datetime(chunk[date_col], errors="coerce"), "v": values}).dropna()
+            part["p"] = rng.random(len(part))
+            line_sample = part if line_sample is None else pd.concat([line_sample, part])
+            line_sample = line_sample.nsmallest(render.LINE_MAX_POINTS, "p")
+
+    results = {}
+    if summary.numeric_cols:
+        for col, agg in summary.numeric().items():
+            for name, value in agg.items():
+                results[f"{col}_{name}"] = value
+        results["correlations"] = summary.correlations()
+
+        digest = summary.digests[0]
+        if len(digest.weights):
+            hi = digest.max if digest.max > digest.min else digest.min + 1
+            edges = np.linspace(digest.min, hi, 11)
+            counts = np.diff(digest.cdf(edges)) * digest.count
+            with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+                ax.hist(edges[:-1], bins=edges, weights=counts, color="blue")
+                ax.set_title(f"Histogram of {num_col}")
+                results["histogram_chart"] = encode_chart(fig)
+
+    if summary.cat_cols:
+        for col, (top_val, freq) in summary.categorical().items():
+            results[f"{col}_mode"] = str(top_val)
+            results[f"{col}_frequencies"] = freq
+
+        if num_col is not None and bar_top:
+            keys = list(bar_top)
+            with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+                render.bar(ax, keys + keys, [bar_top[k] for k in keys] + [bar_bottom.get(k, 0) for k in keys],
+                           threshold=1, color="green")
+                ax.tick_params(axis="x", labelrotation=45)
+                ax.set_title(f"{num_col} by {cat_col}")
+                results["bar_chart"] = encode_chart(fig)
+
+    if line_sample is not None and not line_sample.empty:
+        line_sample = line_sample.sort_values("t")
+        with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+            ax.plot(line_sample["t"], line_sample["v"], color="red")
+            ax.set_title(f"{num_col} over {date_col}")
+            results["line_chart"] = encode_chart(fig)
+
+    return results
+
+
+def analyze_csv_generic(csv_file: str, questions: str):
+    """
+    Generic CSV analyzer that:
+    1. Computes numeric + categorical summaries.
+    2. Builds automatic visualizations.
+    3. Uses OpenAI to answer custom questions.
+    """
+    if loader.should_stream(csv_file):
+        # Too big to load whole: one chunked pass over mergeable sketches, same result keys
+        results = summarize_streaming(csv_file)
+    else:
+        results = summarize_in_memory(csv_file)
 
     # --- LLM reasoning ---
     try:
-        summary = df.describe(include="all").to_string()
+        summary = profile_csv(csv_file)
         prompt = f"""
 You are a data analyst.
 Dataset summary:
@@ -88,16 +176,14 @@ Questions:
 
 Answer clearly in JSON format.
 """
-        resp = client.chat.completions.create(
+        llm_ans = llm_gateway.chat(
             model="gpt-4.1-mini",
             messages=[
                 {"role": "system", "content": "You are a data analyst."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0
-        )
-
-        llm_ans = resp.choices[0].message.content.strip()
+            temperature=0,
+        ).strip()
 
         # Try to parse into JSON
         try:
@@ -112,5 +198,6 @@ Answer clearly in JSON format.
 
 
 # ✅ Compatibility wrapper so main.py can call it
+@telemetry.traced("process_question")
 def process_question(csv_file: str, questions: str):
     return analyze_csv_generic(csv_file, questions)
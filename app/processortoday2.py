@@ -1,22 +1,19 @@
-import os
-import io
 import base64
 import json
 import pandas as pd
-import matplotlib.pyplot as plt
-from openai import OpenAI
+from . import llm_gateway
+from . import render, dataset_store, telemetry
+from .profiler import profile_csv
+from .stats_engine import numeric_block, numeric_summary, correlation_matrix, categorical_summary
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-
-def encode_chart():
-    """Helper to capture current matplotlib figure as base64 PNG."""
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png", dpi=100, bbox_inches="tight")
-    plt.close()
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
+def encode_chart(fig):
+    """Helper to capture a rendered figure as base64 PNG (rendered once, re-encoded to fit the size budget)."""
+    _, data = render.encode_image(render.rasterize(fig), render.MAX_IMAGE_BYTES, formats=("png",))
+    return base64.b64encode(data).decode("utf-8")
 
 
+@telemetry.traced("process_question")
 def process_question(csv_file: str, questions_file: str):
     """
     Generic CSV analyzer:
@@ -24,7 +21,8 @@ def process_question(csv_file: str, questions_file: str):
     - Builds charts
     - Uses OpenAI for custom Q&A
     """
-    df = pd.read_csv(csv_file)
+    # Dates stay text here: the frequency tables report them as written in the file
+    df = dataset_store.read_csv(csv_file, parse_dates=False)
 
     with open(questions_file, "r") as f:
         questions = f.read().strip()
@@ -36,38 +34,34 @@ def process_question(csv_file: str, questions_file: str):
     cat_cols = df.select_dtypes(exclude="number").columns.tolist()
 
     if len(numeric_cols) > 0:
-        for col in numeric_cols:
-            results[f"{col}_sum"] = float(df[col].sum())
-            results[f"{col}_mean"] = float(df[col].mean())
-            results[f"{col}_median"] = float(df[col].median())
-            results[f"{col}_min"] = float(df[col].min())
-            results[f"{col}_max"] = float(df[col].max())
+        # All numeric aggregates in one vectorized pass over a single float block
+        block = numeric_block(df, numeric_cols)
+        for col, agg in numeric_summary(df, numeric_cols, block).items():
+            for name, value in agg.items():
+                results[f"{col}_{name}"] = value
 
         # Correlation matrix
-        corr = df[numeric_cols].corr().to_dict()
-        results["correlations"] = {
-            k: {kk: float(vv) for kk, vv in v.items()} for k, v in corr.items()
-        }
+        results["correlations"] = correlation_matrix(df, numeric_cols, block)
 
         # Histogram of first numeric column
-        plt.hist(df[numeric_cols[0]], bins=10, color="blue")
-        plt.title(f"Histogram of {numeric_cols[0]}")
-        results["histogram_chart"] = encode_chart()
+        with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+            ax.hist(df[numeric_cols[0]], bins=10, color="blue")
+            ax.set_title(f"Histogram of {numeric_cols[0]}")
+            results["histogram_chart"] = encode_chart(fig)
 
     # --- Categorical stats ---
     if len(cat_cols) > 0:
-        for col in cat_cols:
-            top_val = df[col].mode()[0] if not df[col].mode().empty else None
+        for col, (top_val, freq) in categorical_summary(df, cat_cols).items():
             results[f"{col}_mode"] = str(top_val)
-            freq = df[col].value_counts().to_dict()
-            results[f"{col}_frequencies"] = {str(k): int(v) for k, v in freq.items()}
+            results[f"{col}_frequencies"] = freq
 
         # Bar chart if cat + numeric
         if numeric_cols:
-            plt.bar(df[cat_cols[0]], df[numeric_cols[0]], color="green")
-            plt.xticks(rotation=45)
-            plt.title(f"{numeric_cols[0]} by {cat_cols[0]}")
-            results["bar_chart"] = encode_chart()
+            with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+                render.bar(ax, df[cat_cols[0]], df[numeric_cols[0]], color="green")
+                ax.tick_params(axis="x", labelrotation=45)
+                ax.set_title(f"{numeric_cols[0]} by {cat_cols[0]}")
+                results["bar_chart"] = encode_chart(fig)
 
     # --- Line chart if date column ---
     date_cols = [c for c in df.columns if "date" in c.lower() or "time" in c.lower()]
@@ -75,13 +69,14 @@ def process_question(csv_file: str, questions_file: str):
         df[date_cols[0]] = pd.to_datetime(df[date_cols[0]], errors="coerce")
         df_sorted = df.dropna(subset=[date_cols[0]]).sort_values(by=date_cols[0])
         if not df_sorted.empty:
-            plt.plot(df_sorted[date_cols[0]], df_sorted[numeric_cols[0]], color="red")
-            plt.title(f"{numeric_cols[0]} over {date_cols[0]}")
-            results["line_chart"] = encode_chart()
+            with render.figure(figsize=(6.4, 4.8)) as (fig, ax):
+                render.line(ax, df_sorted[date_cols[0]], df_sorted[numeric_cols[0]], color="red")
+                ax.set_title(f"{numeric_cols[0]} over {date_cols[0]}")
+                results["line_chart"] = encode_chart(fig)
 
     # --- LLM custom analysis ---
     try:
-        summary = df.describe(include="all").to_string()
+        summary = profile_csv(csv_file)
         prompt = f"""
 You are a data analyst.
 Dataset summary:
@@ -92,16 +87,14 @@ Questions:
 
 Answer strictly in JSON format.
 """
-        resp = client.chat.completions.create(
+        llm_ans = llm_gateway.chat(
             model="gpt-4.1-mini",
             messages=[
                 {"role": "system", "content": "You are a data analyst."},
                 {"role": "user", "content": prompt},
             ],
             temperature=0,
-        )
-
-        llm_ans = resp.choices[0].message.content.strip()
+        ).strip()
 
         # Try parsing JSON safely
         try:
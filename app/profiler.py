@@ -0,0 +1,199 @@
+import os
+import math
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from . import telemetry
+from .ingest import source_of, hash_source
+from .llm_cache import LRUCache
+from .sketches import Moments
+
+# Compact dataset profiles for LLM prompts: schema, per-column statistics and a small
+# stratified sample, trimmed to a token budget. Prompt size grows with the number of
+# columns, not rows. CSVs are read once in chunks; profiles are cached per file hash.
+
+PROFILE_TOKEN_BUDGET = int(os.getenv("PROFILE_TOKEN_BUDGET", "1500"))
+PROFILE_CHUNK_ROWS = int(os.getenv("PROFILE_CHUNK_ROWS", "100000"))
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", "10"))
+TOP_VALUES = 5
+MAX_TRACKED_VALUES = 1000  # per column; beyond this, rare values are pruned (approximate counts)
+STRATA_MAX = 20
+
+def _fmt(value, spread=0.0):
+    """value with enough significant digits that differences of about `spread` still show (6 at least)."""
+    digits = 6
+    if spread > 0 and value and math.isfinite(value):
+        digits = min(17, max(6, math.ceil(math.log10(abs(value) / spread)) + 3))
+    return f"{value:.{digits}g}"
+
+
+_cache = LRUCache(int(os.getenv("PROFILE_CACHE_SIZE", "256")), float(os.getenv("PROFILE_CACHE_TTL", "86400")))
+
+
+class _ColumnStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.numeric = True
+        self.dtype = None
+        # Welford/Chan moments: total_sq / n - mean ** 2 cancels to 0 for large values (timestamps)
+        self.moments = Moments(1)
+        self.values = Counter()
+
+    def update(self, s):
+        self.count += len(s)
+        self.nulls += int(s.isna().sum())
+        if self.dtype is None:
+            self.dtype = str(s.dtype)
+        if self.numeric and pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            self.moments.update(s.astype(float).to_numpy().reshape(-1, 1))
+            return
+        if self.numeric and self.count > len(s):
+            # Column turned out non-numeric in a later chunk
+            self.dtype = str(s.dtype)
+        self.numeric = False
+        self.values.update(s.dropna().astype(str).value_counts().to_dict())
+        if len(self.values) > MAX_TRACKED_VALUES:
+            self.values = Counter(dict(self.values.most_common(MAX_TRACKED_VALUES // 2)))
+
+    def describe(self, top=TOP_VALUES):
+        non_null = self.count - self.nulls
+        text = f"- {self.name} ({self.dtype}): non-null {non_null}/{self.count}"
+        if self.numeric:
+            m = self.moments
+            if m.n[0]:
+                lo, hi, mean = float(m.min[0]), float(m.max[0]), float(m.mean[0])
+                std = float(m.variance(ddof=0)[0]) ** 0.5
+                spread = hi - lo
+                text += (f", min {_fmt(lo, spread)}, max {_fmt(hi, spread)}, mean {_fmt(mean, spread)}, "
+                         f"std {std:.4g}")
+        else:
+            distinct = len(self.values)
+            text += f", distinct {'~' if distinct >= MAX_TRACKED_VALUES // 2 else ''}{distinct}"
+            if top:
+                common = ", ".join(f"{v[:40]!r}:{c}" for v, c in self.values.most_common(top))
+                text += f", top {common}"
+        return text
+
+
+class _StratifiedSample:
+    """
+    Bottom-k sample per stratum of one low-cardinality column (or one uniform sample):
+    every row gets a random priority and the k lowest per stratum are kept, chunk by chunk.
+    """
+
+    PRIORITY = "__profile_priority__"
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.column = None
+        self.kept = None
+        self.rng = np.random.default_rng(seed)
+
+    def choose_column(self, chunk):
+        for col in chunk.columns:
+            s = chunk[col]
+            if not pd.api.types.is_numeric_dtype(s) and 1 < s.nunique(dropna=True) <= STRATA_MAX:
+                self.column = col
+                return
+
+    def update(self, chunk):
+        c = chunk.assign(**{self.PRIORITY: self.rng.random(len(chunk))}).sort_values(self.PRIORITY)
+        if self.kept is not None:
+            c = pd.concat([self.kept, c]).sort_values(self.PRIORITY)
+        if self.column is not None:
+            c = c.groupby(c[self.column].astype(str), sort=False).head(self.size)
+        else:
+            c = c.head(self.size)
+        self.kept = c
+
+    def rows(self, limit):
+        """Up to `limit` rows, taking the best-ranked row of every stratum first."""
+        if self.kept is None or limit <= 0:
+            return None
+        kept = self.kept
+        if self.column is not None:
+            rank = kept.groupby(kept[self.column].astype(str), sort=False).cumcount()
+            kept = kept.assign(_rank=rank.values).sort_values(["_rank", self.PRIORITY]).drop(columns="_rank")
+        return kept.head(limit).drop(columns=self.PRIORITY)
+
+
+def _render(name, rows, columns, stats, sample, token_budget):
+    """Build the profile text, shrinking sample and detail until it fits the budget."""
+    char_budget = token_budget * 4
+    for sample_rows, top, max_cols in [
+        (PROFILE_SAMPLE_ROWS, TOP_VALUES, None),
+        (PROFILE_SAMPLE_ROWS // 2, 3, None),
+        (3, 1, None),
+        (2, 0, None),
+        (0, 0, None),
+        (0, 0, 50),
+        (0, 0, 10),
+    ]:
+        shown = stats if max_cols is None else stats[:max_cols]
+        lines = [f"Dataset {name}: {rows} rows x {len(columns)} columns"]
+        lines += [c.describe(top) for c in shown]
+        if len(shown) < len(stats):
+            lines.append(f"- ... {len(stats) - len(shown)} more columns")
+        picked = sample.rows(sample_rows)
+        if picked is not None and len(picked):
+            strat = f" (stratified by {sample.column})" if sample.column is not None else ""
+            lines.append(f"Sample rows{strat}:")
+            lines.append(picked.to_csv(index=False).strip())
+        text = "\n".join(lines)
+        if len(text) <= char_budget:
+            return text
+    return text[:char_budget]
+
+
+def _profile_chunks(name, chunks, token_budget):
+    stats = None
+    columns = None
+    sample = _StratifiedSample(PROFILE_SAMPLE_ROWS)
+    rows = 0
+    for chunk in chunks:
+        if stats is None:
+            columns = [str(c) for c in chunk.columns]
+            stats = [_ColumnStats(c) for c in columns]
+            sample.choose_column(chunk)
+        rows += len(chunk)
+        for st, col in zip(stats, chunk.columns):
+            st.update(chunk[col])
+        sample.update(chunk)
+    if stats is None:
+        return f"Dataset {name}: empty"
+    return _render(name, rows, columns, stats, sample, token_budget)
+
+
+@telemetry.traced("profile")
+def profile_csv(f, name=None, token_budget=None):
+    """
+    Profile a CSV attachment (IngestedFile, UploadFile-like, path or file object) in one chunked pass.
+    Cached per content hash.
+    """
+    token_budget = token_budget or PROFILE_TOKEN_BUDGET
+    source = source_of(f) if hasattr(f, "file") else f
+    name = name or getattr(f, "filename", None) or os.path.basename(str(source))
+    file_hash = getattr(f, "sha256", None) or hash_source(source)
+    key = f"{file_hash}:{name}:{token_budget}"
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    chunks = pd.read_csv(source, chunksize=PROFILE_CHUNK_ROWS)
+    text = _profile_chunks(name, chunks, token_budget)
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    _cache.set(key, text)
+    return text
+
+
+def profile_frame(df, name="data", token_budget=None):
+    """Profile an in-memory DataFrame, walking it in row slices."""
+    token_budget = token_budget or PROFILE_TOKEN_BUDGET
+    chunks = (df.iloc[i:i + PROFILE_CHUNK_ROWS] for i in range(0, max(len(df), 1), PROFILE_CHUNK_ROWS))
+    return _profile_chunks(name, chunks, token_budget)
@@ -0,0 +1,648 @@
+import os
+import re
+import json
+import tempfile
+import threading
+from collections import deque
+
+from . import lazy_imports, llm_gateway, telemetry
+from .ingest import source_of
+
+duckdb = lazy_imports.module("duckdb")
+
+# DuckDB-backed engine over request attachments. Every file is registered as a view over a
+# direct file scan (read_csv_auto / read_parquet / read_json_auto), so nothing is loaded
+# into pandas; DuckDB runs the SQL multi-threaded and spills to disk past its memory limit.
+# Excel sheets are converted to Parquet next to the upload once and scanned the same way.
+# With several attachments the engine is a relational workspace: unique columns of each view
+# are inferred as keys, columns of other views that reference them (matching name and type,
+# values found in the key) as relationships, and a question whose columns span views is
+# answered over a join view. Joins only follow child -> unique key, so they never multiply rows,
+# and since the join is a view, DuckDB pushes filters and projections down into the file scans.
+# Attachments that fail to register are kept in `errors` so callers never answer without them
+# unknowingly; file types DuckDB cannot scan at all are skipped.
+
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", str(os.cpu_count() or 1)))
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "2GB")
+DUCKDB_TEMP_DIR = os.getenv("DUCKDB_TEMP_DIR") or os.path.join(tempfile.gettempdir(), "duckdb-spill")
+
+READERS = {
+    ".csv": "read_csv_auto",
+    ".tsv": "read_csv_auto",
+    ".txt": "read_csv_auto",
+    ".parquet": "read_parquet",
+    ".pq": "read_parquet",
+    ".json": "read_json_auto",
+    ".ndjson": "read_json_auto",
+    ".jsonl": "read_json_auto",
+}
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm", ".xls")
+# Extensions treated as tables when several attachments are registered together (.txt is questions)
+TABULAR_EXTENSIONS = tuple(ext for ext in READERS if ext != ".txt") + EXCEL_EXTENSIONS
+
+# Key inference looks at this many candidate columns per view (id-like names first)
+KEY_MAX_COLUMNS = int(os.getenv("KEY_MAX_COLUMNS", "16"))
+# Share of a column's distinct values (sampled) that must exist in the key it references
+RELATION_MIN_COVERAGE = float(os.getenv("RELATION_MIN_COVERAGE", "0.8"))
+RELATION_SAMPLE = 1000
+# Same-name columns this generic are only related through the table name (orders.customer_id -> customers.id)
+GENERIC_KEYS = {"id", "key", "code", "index", "name", "no", "number"}
+
+FORBIDDEN_SQL = re.compile(
+    r"\b(attach|detach|copy|export|import|install|load|pragma|set|create|insert|update|delete|drop|alter|call)\b"
+    r"|read_csv|read_parquet|read_json|read_text|read_blob|parquet_\w+|\w+_scan\b|glob\s*\(",
+    re.IGNORECASE,
+)
+# DuckDB reads a quoted name such as '/tmp/x.csv' as a file (a "replacement scan"), wherever it stands
+FILE_LITERAL_RE = re.compile(r"""(['"])[^'"]*\.(csv|tsv|txt|parquet|json|jsonl|ndjson|xlsx?)(\.gz|\.zst)?\1""", re.IGNORECASE)
+TABLE_REF_RE = re.compile(r"""\b(?:from|join)\s+("(?:[^"]|"")+"|'[^']*'|[\w.]+)(\s*\()?""", re.IGNORECASE)
+CTE_NAME_RE = re.compile(r"""("(?:[^"]|"")+"|\w+)\s+as\s*(?:not\s+)?(?:materialized\s*)?\(""", re.IGNORECASE)
+# Table functions generated SQL may use; anything else in FROM could read files
+SAFE_TABLE_FUNCTIONS = {"range", "generate_series", "unnest"}
+# Functions whose arguments use FROM without naming a table: extract(year FROM d), trim(x FROM s)
+FROM_SYNTAX_FUNCTIONS = {"extract", "trim", "substring", "overlay", "position"}
+
+AGGREGATES = [
+    (re.compile(r"\b(average|mean|avg)\b"), "avg"),
+    (re.compile(r"\bmedian\b"), "median"),
+    (re.compile(r"\b(sum|total)\b"), "sum"),
+    (re.compile(r"\b(minimum|min|lowest|smallest)\b"), "min"),
+    (re.compile(r"\b(maximum|max|highest|largest)\b"), "max"),
+    (re.compile(r"\b(number of distinct|distinct|unique)\b"), "count_distinct"),
+]
+COMPARISONS = [
+    (r">=|at least|greater than or equal to", ">="),
+    (r"<=|at most|less than or equal to", "<="),
+    (r">|greater than|more than|above|over", ">"),
+    (r"<|less than|below|under", "<"),
+    (r"!=|not equal to", "!="),
+    (r"=|equals|equal to", "="),
+]
+
+
+WHICH_RE = re.compile(r"\b(which|what)\b.*\b(highest|largest|most|maximum|max|top|lowest|smallest|least|minimum|min)\b")
+LOW_WORDS = ("lowest", "smallest", "least", "minimum", "min")
+
+
+class NotHandled(Exception):
+    """No deterministic template matched the question."""
+
+
+def quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _unquote(name):
+    if len(name) >= 2 and name[0] == name[-1] and name[0] in "\"'":
+        return name[1:-1].replace(name[0] * 2, name[0])
+    return name
+
+
+def _enclosing_call(sql, pos):
+    """Lower-cased name of the function whose parentheses enclose pos ("" at top level or in a subquery)."""
+    depth = 0
+    for i in range(pos - 1, -1, -1):
+        if sql[i] == ")":
+            depth += 1
+        elif sql[i] == "(":
+            if depth == 0:
+                m = re.search(r"(\w+)\s*$", sql[:i])
+                return m.group(1).lower() if m else ""
+            depth -= 1
+    return ""
+
+
+def quote_literal(value):
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _view_name(filename, taken):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    name = re.sub(r"\W+", "_", stem).strip("_").lower() or "data"
+    if name[0].isdigit():
+        name = "t_" + name
+    base, n = name, 1
+    while name in taken:
+        n += 1
+        name = f"{base}_{n}"
+    return name
+
+
+def is_tabular(filename):
+    return os.path.splitext(str(filename))[1].lower() in TABULAR_EXTENSIONS
+
+
+def _norm(name):
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def _singular(name):
+    word = _norm(name)
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _type_family(col_type):
+    col_type = col_type.upper()
+    if "INT" in col_type and "INTERVAL" not in col_type:
+        return "int"
+    if "VARCHAR" in col_type or "UUID" in col_type:
+        return "text"
+    return None  # floats, dates, booleans and nested types are not used as keys
+
+
+def _excel_sheets(path, filename):
+    """[(sheet, parquet path)] for a workbook; each sheet is written once to Parquet beside the upload."""
+    import pandas as pd
+
+    stem = re.sub(r"\W+", "_", os.path.splitext(os.path.basename(filename))[0])
+    sheets = []
+    for sheet, df in pd.read_excel(path, sheet_name=None).items():
+        sheet_stem = re.sub(r"\W+", "_", str(sheet))
+        target = os.path.join(os.path.dirname(path), f"{stem}.{sheet_stem}.parquet")
+        if not os.path.exists(target):
+            df.columns = [str(c) for c in df.columns]
+            for col in df.columns[df.dtypes == object]:
+                # Mixed-type cells would not convert to an Arrow column
+                df[col] = df[col].map(lambda v: None if pd.isna(v) else v if isinstance(v, str) else str(v))
+            df.to_parquet(target, index=False)
+        sheets.append((str(sheet), target))
+    return sheets
+
+
+class Relationship:
+    """child.column references parent.key (unique in parent): a join that never duplicates child rows."""
+
+    def __init__(self, child, column, parent, key, coverage):
+        self.child = child
+        self.column = column
+        self.parent = parent
+        self.key = key
+        self.coverage = coverage
+
+    def other(self, view):
+        return self.parent if view == self.child else self.child
+
+    def __str__(self):
+        return f"{self.child}.{self.column} -> {self.parent}.{self.key}"
+
+
+def to_python(value):
+    """numpy/DuckDB scalar as a plain Python value (dates and timestamps as ISO strings)."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class QueryEngine:
+    """Per-request DuckDB connection with one view per attachment."""
+
+    def __init__(self, files=()):
+        """Register every scannable attachment; failures end up in self.errors, not in exceptions."""
+        os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+        self.con = duckdb.connect(config={
+            "threads": DUCKDB_THREADS,
+            "memory_limit": DUCKDB_MEMORY_LIMIT,
+            "temp_directory": DUCKDB_TEMP_DIR,
+        })
+        self.views = {}  # view name -> list of (column, type)
+        self.joins = {}  # join view name -> the views it joins
+        self.keys = {}  # view -> inferred unique columns (filled with the relationships)
+        self._relationships = None
+        self._relations_lock = threading.Lock()
+        self._local = threading.local()
+        self.errors = {}  # attachment name -> why it has no view
+        for f in files:
+            filename = getattr(f, "filename", f)
+            ext = os.path.splitext(str(filename))[1].lower()
+            if ext not in READERS and ext not in EXCEL_EXTENSIONS:
+                continue
+            try:
+                self.register(f)
+            except Exception as e:
+                print(f"[{telemetry.request_id()}] Could not register {filename} in DuckDB: {e}")
+                self.errors[str(filename)] = str(e)
+
+    def register(self, f, name=None):
+        """Register an attachment (IngestedFile or path) as a view; returns the view name."""
+        path = f if isinstance(f, str) else source_of(f)
+        if not isinstance(path, str):
+            raise ValueError("DuckDB needs a file path")
+        filename = getattr(f, "filename", path)
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in EXCEL_EXTENSIONS:
+            return self._register_excel(path, filename, name)
+        reader = READERS.get(ext)
+        if reader is None:
+            raise ValueError(f"Unsupported file type: {filename}")
+        return self._create_view(name or _view_name(filename, self.views), reader, path)
+
+    def _create_view(self, name, reader, path):
+        self.con.execute(f"CREATE OR REPLACE VIEW {quote_ident(name)} AS SELECT * FROM {reader}({quote_literal(path)})")
+        self.views[name] = [(row[0], row[1]) for row in self.con.execute(f"DESCRIBE {quote_ident(name)}").fetchall()]
+        return name
+
+    def _register_excel(self, path, filename, name=None):
+        """One view per sheet (workbook name, plus the sheet name when there are several); returns the first."""
+        sheets = _excel_sheets(path, filename)
+        names = []
+        for sheet, parquet in sheets:
+            label = filename if len(sheets) == 1 else f"{os.path.splitext(filename)[0]}_{sheet}"
+            view = name if name and not names else _view_name(label, self.views)
+            names.append(self._create_view(view, "read_parquet", parquet))
+        if not names:
+            raise ValueError(f"No sheets in {filename}")
+        return names[0]
+
+    def error_text(self):
+        """'Could not load ...' message naming the attachments that failed to register ("" if none)."""
+        if not self.errors:
+            return ""
+        return "Could not load " + "; ".join(f"{name} ({reason})" for name, reason in self.errors.items())
+
+    def sources(self):
+        """The views registered for attachments (not join views), in registration order."""
+        return [v for v in list(self.views) if v not in self.joins]
+
+    def is_join(self, view):
+        return view in self.joins
+
+    def schema_text(self, sample_rows=3):
+        parts = []
+        for name in self.sources():
+            cols = self.views[name]
+            sample = self._cursor().execute(f"SELECT * FROM {quote_ident(name)} LIMIT {int(sample_rows)}").fetchall()
+            col_text = ", ".join(f"{c} {t}" for c, t in cols)
+            parts.append(f"View {name}({col_text})\nSample rows: {sample}")
+        relations = self.relationship_text()
+        if relations:
+            parts.append(relations)
+        return "\n".join(parts)
+
+    def _cursor(self):
+        # A DuckDB connection must not be shared between threads; cursors share its catalog
+        cur = getattr(self._local, "cursor", None)
+        if cur is None:
+            cur = self._local.cursor = self.con.cursor()
+        return cur
+
+    def query(self, sql):
+        with telemetry.span("duckdb"):
+            return self._cursor().execute(sql).fetchdf()
+
+    def scalar(self, sql):
+        with telemetry.span("duckdb"):
+            row = self._cursor().execute(sql).fetchone()
+        return to_python(row[0]) if row else None
+
+    # --- column matching -------------------------------------------------
+
+    @staticmethod
+    def _mentions(ql, cols):
+        """Columns mentioned in the (lowercased) question, in mention order."""
+        found = []
+        for col, _ in cols:
+            for variant in {col.lower(), col.lower().replace("_", " ")}:
+                m = re.search(r"(?<!\w)" + re.escape(variant) + r"(?!\w)", ql)
+                if m:
+                    found.append((m.start(), col))
+                    break
+        return [c for _, c in sorted(found)]
+
+    def find_columns(self, question):
+        """
+        (view, [columns]) for the view with most columns mentioned in the question, in mention order.
+        When the mentioned columns span related views, the view is a join of them.
+        """
+        ql = question.lower()
+        best = (None, [])
+        mentions = {}
+        for view in self.sources():
+            found = mentions[view] = self._mentions(ql, self.views[view])
+            if len(found) > len(best[1]):
+                best = (view, found)
+        if best[0] is not None and len(mentions) > 1:
+            own = {c for c, _ in self.views[best[0]]}
+            needed = [v for v, found in mentions.items() if v != best[0] and any(c not in own for c in found)]
+            if needed:
+                join = self.join_view([best[0]] + needed)
+                if join is None:
+                    # Leave out the views that cannot be joined (e.g. a same-named column in an unrelated file)
+                    related = [v for v in needed if self._join_tree([best[0], v])]
+                    join = self.join_view([best[0]] + related) if related else None
+                if join is not None:
+                    return join, self._mentions(ql, self.views[join])
+        return best
+
+    def is_numeric(self, view, col):
+        col_type = dict(self.views[view]).get(col, "")
+        return any(t in col_type.upper() for t in ("INT", "DOUBLE", "FLOAT", "DECIMAL", "REAL", "NUMERIC"))
+
+    def fetch_columns(self, view, cols):
+        """Just the requested columns as a pandas DataFrame (e.g. for plotting)."""
+        col_sql = ", ".join(quote_ident(c) for c in cols)
+        return self.query(f"SELECT {col_sql} FROM {quote_ident(view)}")
+
+    # --- keys and relationships ------------------------------------------
+
+    def _infer_keys(self, view):
+        """Columns of view whose values are all present and distinct."""
+        cols = [c for c, t in self.views[view] if _type_family(t)]
+        # id-like names first (stable sort), then cap the number of counted columns
+        cols.sort(key=lambda c: not re.search(r"(^|_)(id|key|code)$|id$", c.lower()))
+        cols = cols[:KEY_MAX_COLUMNS]
+        if not cols:
+            return []
+        counts = ", ".join(f"count(DISTINCT {quote_ident(c)}), count({quote_ident(c)})" for c in cols)
+        row = self._cursor().execute(f"SELECT count(*), {counts} FROM {quote_ident(view)}").fetchone()
+        total = row[0]
+        return [c for i, c in enumerate(cols) if total and row[1 + 2 * i] == total and row[2 + 2 * i] == total]
+
+    def _coverage(self, child, column, parent, key):
+        """Share of (up to RELATION_SAMPLE) distinct child.column values found in parent.key."""
+        row = self._cursor().execute(
+            f"SELECT count(*), count(p.k) FROM "
+            f"(SELECT DISTINCT {quote_ident(column)} AS v FROM {quote_ident(child)} "
+            f"WHERE {quote_ident(column)} IS NOT NULL LIMIT {RELATION_SAMPLE}) s "
+            f"LEFT JOIN (SELECT {quote_ident(key)} AS k FROM {quote_ident(parent)}) p ON s.v = p.k"
+        ).fetchone()
+        return row[1] / row[0] if row and row[0] else 0.0
+
+    @staticmethod
+    def _references(column, parent, key):
+        col, k = _norm(column), _norm(key)
+        # The view name or its last word, singular: customer_id -> customers.id or crm_customers.id
+        if col in {_singular(parent) + k, _singular(parent.split("_")[-1]) + k}:
+            return True
+        return col == k and k not in GENERIC_KEYS
+
+    def relationships(self):
+        """Relationships between the attachment views, inferred on first use (a scan per view)."""
+        with self._relations_lock:
+            if self._relationships is None:
+                self._relationships = self._infer_relationships()
+            return self._relationships
+
+    @telemetry.traced("relations")
+    def _infer_relationships(self):
+        sources = self.sources()
+        if len(sources) < 2:
+            return []
+        for view in sources:
+            try:
+                self.keys[view] = self._infer_keys(view)
+            except Exception as e:
+                print(f"Key inference failed for {view}: {e}")
+                self.keys[view] = []
+        found, pairs = [], set()
+        for parent in sources:
+            parent_types = dict(self.views[parent])
+            for key in self.keys[parent]:
+                for child in sources:
+                    if child == parent:
+                        continue
+                    for column, col_type in self.views[child]:
+                        if not self._references(column, parent, key):
+                            continue
+                        if _type_family(col_type) != _type_family(parent_types[key]):
+                            continue
+                        pair = frozenset([(child, column), (parent, key)])
+                        if pair in pairs:
+                            continue  # one-to-one: already related the other way round
+                        try:
+                            coverage = self._coverage(child, column, parent, key)
+                        except Exception as e:
+                            print(f"Relationship check {child}.{column} -> {parent}.{key} failed: {e}")
+                            continue
+                        if coverage >= RELATION_MIN_COVERAGE:
+                            pairs.add(pair)
+                            found.append(Relationship(child, column, parent, key, coverage))
+        return found
+
+    def relationship_text(self):
+        relations = self.relationships()
+        if not relations:
+            return ""
+        return "Relationships (join on these; each key is unique in its view):\n" + "\n".join(str(r) for r in relations)
+
+    def _join_tree(self, views):
+        """Relationships connecting every view in views (BFS paths from the first), or None."""
+        links = {}
+        for r in self.relationships():
+            links.setdefault(r.child, []).append(r)
+            links.setdefault(r.parent, []).append(r)
+        start = views[0]
+        via = {start: None}
+        queue = deque([start])
+        while queue:
+            view = queue.popleft()
+            for r in links.get(view, []):
+                nxt = r.other(view)
+                if nxt not in via:
+                    via[nxt] = r
+                    queue.append(nxt)
+        if any(v not in via for v in views):
+            return None
+        edges = []
+        for view in views[1:]:
+            while via[view] is not None and via[view] not in edges:
+                edges.append(via[view])
+                view = via[view].other(view)
+        return edges
+
+    def join_view(self, views):
+        """Name of a view joining views along their relationships (created once), or None if unrelated."""
+        edges = self._join_tree(views)
+        if not edges:
+            return None
+        members = {r.child for r in edges} | {r.parent for r in edges}
+        with self._relations_lock:
+            for name, joined in self.joins.items():
+                if set(joined) == members:
+                    return name
+            # Start from a view that is never the parent side, so the joins follow child -> key
+            parents = {r.parent for r in edges}
+            root = next((v for v in views if v not in parents), None) or next(v for v in members if v not in parents)
+            aliases = {root: "t0"}
+            order, skip, clauses = [root], set(), []
+            pending = list(edges)
+            while pending:
+                for r in pending:
+                    if r.child in aliases or r.parent in aliases:
+                        known = r.child if r.child in aliases else r.parent
+                        new = r.other(known)
+                        aliases[new] = f"t{len(aliases)}"
+                        order.append(new)
+                        near, far = (r.column, r.key) if known == r.child else (r.key, r.column)
+                        clauses.append(f" LEFT JOIN {quote_ident(new)} AS {aliases[new]} "
+                                       f"ON {aliases[known]}.{quote_ident(near)} = {aliases[new]}.{quote_ident(far)}")
+                        skip.add((new, far))  # same values as the column it joined on
+                        pending.remove(r)
+                        break
+                else:
+                    break
+            select, taken = [], set()
+            for view in order:
+                for col, _ in self.views[view]:
+                    if (view, col) in skip:
+                        continue
+                    out = col if col not in taken else f"{view}_{col}"
+                    taken.add(out)
+                    select.append(f"{aliases[view]}.{quote_ident(col)} AS {quote_ident(out)}")
+            name = _view_name("_".join(["join"] + order), self.views)
+            sql = f"SELECT {', '.join(select)} FROM {quote_ident(root)} AS t0" + "".join(clauses)
+            cur = self._cursor()
+            cur.execute(f"CREATE OR REPLACE VIEW {quote_ident(name)} AS {sql}")
+            self.views[name] = [(row[0], row[1]) for row in cur.execute(f"DESCRIBE {quote_ident(name)}").fetchall()]
+            self.joins[name] = order
+            return name
+
+    # --- deterministic templates ----------------------------------------
+
+    def _where(self, question, view, cols):
+        """WHERE clause for '<column> <comparison> <value>' phrases."""
+        ql = question.lower()
+        for col in cols:
+            for pattern, op in COMPARISONS:
+                m = re.search(
+                    re.escape(col.lower()) + r"\s*(?:is\s+)?(?:" + pattern + r")\s*['\"]?([\w.\-]+)['\"]?", ql
+                )
+                if m:
+                    raw = m.group(1)
+                    try:
+                        value = float(raw) if "." in raw else int(raw)
+                    except ValueError:
+                        value = raw
+                    if not self.is_numeric(view, col):
+                        # Compare strings case-insensitively
+                        return col, f"lower(CAST({quote_ident(col)} AS VARCHAR)) {op} {quote_literal(str(value).lower())}"
+                    return col, f"{quote_ident(col)} {op} {quote_literal(value)}"
+        return None, ""
+
+    def run_template(self, question):
+        ql = question.lower()
+        view, cols = self.find_columns(question)
+        if view is None:
+            raise NotHandled("no known columns mentioned")
+        table = quote_ident(view)
+        filter_col, where = self._where(question, view, cols)
+        where_sql = f" WHERE {where}" if where else ""
+        value_cols = [c for c in cols if c != filter_col]
+
+        if "correlation" in ql and len(value_cols) >= 2:
+            a, b = value_cols[:2]
+            return self.scalar(f"SELECT corr({quote_ident(a)}, {quote_ident(b)}) FROM {table}{where_sql}")
+
+        if re.search(r"\bhow many\b|\bcount\b|\bnumber of (rows|records)\b", ql) and not value_cols:
+            return self.scalar(f"SELECT count(*) FROM {table}{where_sql}")
+
+        numeric = [c for c in value_cols if self.is_numeric(view, c)]
+        labels = [c for c in value_cols if c not in numeric]
+        m = WHICH_RE.search(ql)
+        if m and labels and numeric:
+            # "Which region has the highest sales": the group with the largest total (or average)
+            func = "avg" if re.search(r"\b(average|mean|avg)\b", ql) else "sum"
+            order = "ASC" if any(re.search(rf"\b{w}\b", ql) for w in LOW_WORDS) else "DESC"
+            return self.scalar(
+                f"SELECT {quote_ident(labels[0])} FROM {table}{where_sql} "
+                f"GROUP BY 1 ORDER BY {func}({quote_ident(numeric[0])}) {order} NULLS LAST LIMIT 1"
+            )
+
+        for pattern, func in AGGREGATES:
+            if pattern.search(ql) and value_cols:
+                # Only count(DISTINCT) applies to text columns; max(region) would be alphabetical
+                targets = value_cols if func == "count_distinct" else numeric
+                if not targets:
+                    raise NotHandled(f"no numeric column to {func}")
+                target = targets[0]
+                group = None
+                m = re.search(r"\b(?:by|per|for each)\s+", ql)
+                if m:
+                    # Group by the first column mentioned after "by"/"per"
+                    group = next((c for c in value_cols if c != target and ql.find(c.lower(), m.end()) >= 0), None)
+                expr = (f"count(DISTINCT {quote_ident(target)})" if func == "count_distinct"
+                        else f"{func}({quote_ident(target)})")
+                if group:
+                    df = self.query(
+                        f"SELECT {quote_ident(group)} AS key, {expr} AS value FROM {table}{where_sql} "
+                        f"GROUP BY 1 ORDER BY 2 DESC"
+                    )
+                    return {str(k): to_python(v) for k, v in zip(df["key"], df["value"])}
+                return self.scalar(f"SELECT {expr} FROM {table}{where_sql}")
+
+        if where and re.search(r"\bhow many\b|\bcount\b", ql):
+            return self.scalar(f"SELECT count(*) FROM {table}{where_sql}")
+        raise NotHandled(question)
+
+    # --- LLM-generated SQL ----------------------------------------------
+
+    def run_llm_sql(self, question):
+        prompt = f"""
+You write DuckDB SQL. These views are available:
+{self.schema_text()}
+
+Write ONE read-only SELECT query (no DDL, no file functions) that answers:
+{question}
+
+Return ONLY the SQL, no explanation.
+"""
+        sql = llm_gateway.chat([{"role": "user", "content": prompt}], model="gpt-4o-mini", temperature=0)
+        sql = sql.strip().strip("`").strip()
+        if sql.lower().startswith("sql"):
+            sql = sql[3:].strip()
+        sql = sql.rstrip(";").strip()
+        self.check_sql(sql)
+        df = self.query(sql)
+        if df.shape == (1, 1):
+            return to_python(df.iat[0, 0])
+        if df.shape[1] == 1:
+            return [to_python(v) for v in df.iloc[:, 0]]
+        return json.loads(df.to_json(orient="records", date_format="iso"))
+
+    def check_sql(self, sql):
+        """
+        Raise ValueError unless sql is one SELECT over the registered views (and its own CTEs).
+        Table references must name a view, so a quoted path cannot be read as a file.
+        """
+        if not re.match(r"^(select|with)\b", sql, re.IGNORECASE) or ";" in sql or FORBIDDEN_SQL.search(sql):
+            raise ValueError(f"Rejected generated SQL: {sql[:200]}")
+        if FILE_LITERAL_RE.search(sql):
+            raise ValueError(f"Rejected generated SQL (file reference): {sql[:200]}")
+        known = {v.lower() for v in self.views}
+        known.update(_unquote(m.group(1)).lower() for m in CTE_NAME_RE.finditer(sql))
+        for m in TABLE_REF_RE.finditer(sql):
+            if _enclosing_call(sql, m.start()) in FROM_SYNTAX_FUNCTIONS:
+                continue
+            ref, call = m.group(1), m.group(2)
+            if call:
+                if ref.lower() not in SAFE_TABLE_FUNCTIONS:
+                    raise ValueError(f"Rejected generated SQL (table function {ref}): {sql[:200]}")
+                continue
+            name = _unquote(ref).lower()
+            if name.startswith("main."):
+                name = name[len("main."):]
+            if ref.startswith("'") or name not in known:
+                raise ValueError(f"Rejected generated SQL (unknown table {ref}): {sql[:200]}")
+
+    def answer(self, question):
+        """Deterministic SQL template when one matches, otherwise LLM-written SQL."""
+        try:
+            return self.run_template(question)
+        except NotHandled:
+            return self.run_llm_sql(question)
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,288 @@
+import io
+import os
+import base64
+import threading
+from contextlib import contextmanager
+
+from . import deadline, lazy_imports, telemetry
+
+np = lazy_imports.module("numpy")
+pd = lazy_imports.module("pandas")
+Image = lazy_imports.module("PIL.Image")
+
+# Headless backend for every matplotlib import in the process (pyplot included), set before
+# matplotlib is first loaded; matplotlib itself is only imported when a chart is drawn
+os.environ["MPLBACKEND"] = "Agg"
+matplotlib = lazy_imports.module("matplotlib")
+mpl_figure = lazy_imports.module("matplotlib.figure")
+backend_agg = lazy_imports.module("matplotlib.backends.backend_agg")
+
+# Chart rendering service: each figure is rasterized exactly once, then the byte budget is met
+# by re-encoding that raster (optimized/quantized PNG, WEBP quality search, binary search over
+# scale) instead of re-drawing the figure at lower DPIs. Figures are reused per thread.
+
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", "100000"))
+MIN_SCALE = 0.2
+WEBP_QUALITIES = (20, 95)
+# Above this many points, scatter/line/bar charts are drawn from aggregates instead of raw rows
+PLOT_ROW_THRESHOLD = int(os.getenv("PLOT_ROW_THRESHOLD", "50000"))
+DENSITY_BINS = int(os.getenv("DENSITY_BINS", "300"))
+LINE_MAX_POINTS = int(os.getenv("LINE_MAX_POINTS", "4000"))
+BAR_MAX_CATEGORIES = int(os.getenv("BAR_MAX_CATEGORIES", "50"))
+
+SUBPLOT_PARAMS = ("left", "right", "bottom", "top", "wspace", "hspace")
+
+_local = threading.local()
+
+
+@contextmanager
+def figure(figsize=(6, 4), dpi=100):
+    """
+    Yield a cleared (fig, ax) pair reused across calls on this thread.
+    Uses the object-oriented API only, so it is safe to use from worker threads (unlike pyplot).
+    """
+    cache = _local.__dict__.setdefault("figures", {})
+    key = (tuple(figsize), dpi)
+    entry = cache.get(key)
+    if entry is None:
+        fig = mpl_figure.Figure(figsize=figsize, dpi=dpi)
+        backend_agg.FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+    else:
+        # ax.clear() keeps some state (e.g. tick label rotation), so rebuild the axes;
+        # the figure and its Agg canvas are still reused
+        fig = entry[0]
+        fig.clf()
+        # Undo margins left by a previous tight_layout()
+        fig.subplots_adjust(**{k: matplotlib.rcParams[f"figure.subplot.{k}"] for k in SUBPLOT_PARAMS})
+        ax = fig.add_subplot(111)
+    cache[key] = (fig, ax)
+    yield fig, ax
+
+
+# --- large-data drawing ------------------------------------------------------
+# Each helper draws raw marks for small inputs and a fixed-size aggregate above
+# PLOT_ROW_THRESHOLD, so draw time and image size stop growing with the row count.
+
+def _span(v):
+    lo, hi = float(v.min()), float(v.max())
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    return lo, hi
+
+
+def density(ax, x, y, bins=None, cmap="Blues"):
+    """Bin points into a 2D histogram and draw it as one raster (log-scaled counts, empty cells transparent)."""
+    bins = bins or DENSITY_BINS
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    ok = np.isfinite(x) & np.isfinite(y)
+    x, y = x[ok], y[ok]
+    if not len(x):
+        return None
+    (x0, x1), (y0, y1) = _span(x), _span(y)
+    counts, _, _ = np.histogram2d(x, y, bins=bins, range=[[x0, x1], [y0, y1]])
+    shade = np.ma.masked_equal(np.log1p(counts.T), 0)
+    # vmin below zero keeps single-point cells clearly visible
+    return ax.imshow(shade, origin="lower", extent=(x0, x1, y0, y1), aspect="auto",
+                     interpolation="nearest", cmap=cmap, vmin=-0.3 * shade.max(), vmax=shade.max())
+
+
+def scatter(ax, x, y, threshold=None, **kw):
+    """ax.scatter for small inputs, a density raster above the row threshold."""
+    threshold = threshold or PLOT_ROW_THRESHOLD
+    if len(x) > threshold:
+        return density(ax, x, y)
+    return ax.scatter(x, y, **kw)
+
+
+def bar(ax, categories, values, threshold=None, max_categories=None, **kw):
+    """
+    ax.bar for small inputs. Above the row threshold (or with too many categories to draw),
+    bars are reduced to one per category: overlapping bars only ever show their envelope,
+    so the largest positive and the most negative value per category give the same picture.
+    Only the max_categories categories with the tallest bars are kept, in first-seen order.
+    """
+    threshold = threshold or PLOT_ROW_THRESHOLD
+    max_categories = max_categories or BAR_MAX_CATEGORIES
+    frame = pd.DataFrame({"cat": np.asarray(categories), "v": pd.to_numeric(np.asarray(values), errors="coerce")})
+    if len(frame) <= threshold and frame["cat"].nunique() <= max_categories:
+        return ax.bar(categories, values, **kw)
+    grouped = frame.dropna().groupby("cat", sort=False)["v"]
+    top = grouped.max().clip(lower=0)
+    bottom = grouped.min().clip(upper=0)
+    if len(top) > max_categories:
+        keep = (top - bottom).nlargest(max_categories).index
+        mask = top.index.isin(keep)
+        top, bottom = top[mask], bottom[mask]
+    labels = top.index.to_numpy() if pd.api.types.is_numeric_dtype(top.index) else [str(c) for c in top.index]
+    if (bottom < 0).any():
+        ax.bar(labels, bottom.to_numpy(), **kw)
+    return ax.bar(labels, top.to_numpy(), **kw)
+
+
+def decimate(x, y, max_points=None):
+    """Min/max per bucket so a line keeps its visual envelope with at most ~max_points vertices."""
+    max_points = max_points or LINE_MAX_POINTS
+    n = len(x)
+    if n <= max_points:
+        return x, y
+    x = np.asarray(x)
+    y = np.asarray(y, dtype="float64")
+    buckets = max_points // 2
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    idx = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        seg = y[lo:hi]
+        if not len(seg) or np.isnan(seg).all():
+            continue
+        a, b = lo + int(np.nanargmin(seg)), lo + int(np.nanargmax(seg))
+        idx.extend((a, b) if a <= b else (b, a))
+    idx = np.asarray(idx, dtype=int)
+    return x[idx], y[idx]
+
+
+def line(ax, x, y, max_points=None, **kw):
+    """ax.plot on a min/max-decimated copy of long series."""
+    x, y = decimate(x, y, max_points)
+    return ax.plot(x, y, **kw)
+
+
+@telemetry.traced("render")
+def rasterize(fig, dpi=None, tight=True):
+    """Draw the figure once and return it as an RGBA PIL image."""
+    buf = io.BytesIO()
+    # compress_level=0: the PNG is only a transport for the raster here, encoding comes later
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight" if tight else None,
+                pil_kwargs={"compress_level": 0})
+    buf.seek(0)
+    img = Image.open(buf)
+    img.load()
+    return img
+
+
+def _encode(img, fmt, quality=None):
+    buf = io.BytesIO()
+    if fmt == "png":
+        img.save(buf, format="PNG", optimize=True)
+    elif fmt == "png8":
+        img.convert("RGB").quantize(colors=256, method=Image.Quantize.MEDIANCUT).save(buf, format="PNG", optimize=True)
+    else:
+        img.convert("RGB").save(buf, format="WEBP", quality=quality or 80, method=4)
+    return buf.getvalue()
+
+
+def _mime(fmt):
+    return "image/webp" if fmt == "webp" else "image/png"
+
+
+def raw_budget(max_bytes, mime):
+    """Largest raw payload whose data URI still fits in max_bytes."""
+    prefix = len(f"data:{mime};base64,")
+    return max(0, (max_bytes - prefix) // 4 * 3)
+
+
+def _webp_search(img, budget):
+    """Highest WEBP quality that fits the budget (binary search), or None."""
+    lo, hi = WEBP_QUALITIES
+    best = None
+    while lo <= hi:
+        q = (lo + hi) // 2
+        data = _encode(img, "webp", q)
+        if len(data) <= budget:
+            best = data
+            lo = q + 1
+        else:
+            hi = q - 1
+    return best
+
+
+def _resize(img, scale):
+    w, h = img.size
+    return img.resize((max(1, int(w * scale)), max(1, int(h * scale))), Image.LANCZOS)
+
+
+@telemetry.traced("encode_image")
+def encode_image(img, max_bytes=MAX_IMAGE_BYTES, formats=("png", "webp")):
+    """
+    Encode a raster so that its data URI is at most max_bytes.
+    Returns (mime, bytes); falls back to the smallest attempt if nothing fits.
+    """
+    allow_webp = "webp" in formats
+    png_budget = raw_budget(max_bytes, "image/png")
+    webp_budget = raw_budget(max_bytes, "image/webp")
+    attempts = []
+
+    # 1. Full-size lossless PNG, then 256-colour PNG (plots have few colours)
+    for fmt in ("png", "png8"):
+        data = _encode(img, fmt)
+        if len(data) <= png_budget:
+            return "image/png", data
+        attempts.append(("image/png", data))
+
+    # Short on time: skip the quality search and bisect the scale coarsely
+    hurry = deadline.low()
+    if hurry:
+        deadline.degrade("render")
+
+    # 2. WEBP quality search at full size
+    if allow_webp and not hurry:
+        data = _webp_search(img, webp_budget)
+        if data is not None:
+            return "image/webp", data
+
+    # 3. Binary search for the largest scale that fits with the cheapest encoder
+    fmt = "webp" if allow_webp else "png8"
+    budget = webp_budget if allow_webp else png_budget
+    lo, hi = MIN_SCALE, 1.0
+    best = None
+    for _ in range(3 if hurry else 7):
+        mid = (lo + hi) / 2
+        data = _encode(_resize(img, mid), fmt, 60)
+        if len(data) <= budget:
+            best = data
+            lo = mid
+        else:
+            hi = mid
+            attempts.append((_mime(fmt), data))
+    if best is not None:
+        return _mime(fmt), best
+    return min(attempts, key=lambda a: len(a[1]))
+
+
+def to_data_uri(mime, data):
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+class EncodedImage:
+    """
+    Encoded image bytes kept as-is until serialization: str() gives the data URI (or the bare
+    base64 text with bare=True), and app/streaming.py base64-encodes them chunk by chunk.
+    """
+
+    __slots__ = ("mime", "data", "bare")
+
+    def __init__(self, mime, data, bare=False):
+        self.mime = mime
+        self.data = data
+        self.bare = bare
+
+    def prefix(self):
+        return "" if self.bare else f"data:{self.mime};base64,"
+
+    def __str__(self):
+        return self.prefix() + base64.b64encode(self.data).decode("ascii")
+
+
+def figure_to_image(fig, max_bytes=MAX_IMAGE_BYTES, formats=("png", "webp"), dpi=None, tight=True, bare=False):
+    """Render fig once and return an EncodedImage within max_bytes (at reduced DPI when time is short)."""
+    if deadline.low():
+        deadline.degrade("render")
+        dpi = min(dpi or fig.dpi, deadline.LOW_DPI)
+    mime, data = encode_image(rasterize(fig, dpi=dpi, tight=tight), max_bytes, formats)
+    return EncodedImage(mime, data, bare=bare)
+
+
+def figure_to_data_uri(fig, max_bytes=MAX_IMAGE_BYTES, formats=("png", "webp"), dpi=None, tight=True):
+    """Render fig once and return a data URI within max_bytes (at reduced DPI when time is short)."""
+    return str(figure_to_image(fig, max_bytes, formats, dpi, tight))
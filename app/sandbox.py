@@ -0,0 +1,256 @@
+import os
+import re
+import ast
+import sys
+import json
+import math
+import time
+import atexit
+import signal
+import shutil
+import socket
+import select
+import tempfile
+import threading
+import subprocess
+
+from . import dataset_store, deadline, ingest, telemetry
+
+# Runs short LLM-written pandas programs over the full uploaded data in a separate process.
+# Two layers: an AST check rejects programs that import outside a whitelist, touch dunder or
+# private attributes, call eval/exec/open-like builtins or use pandas' file readers/writers; the
+# child process (app/sandbox_runner.py) then runs under CPU-time, address-space and file-size
+# rlimits with a wall-clock timeout, an empty environment and an empty working directory.
+# Frames are handed over as Feather files; uploaded frames reuse the dataset store's spill tier.
+# Starting Python and importing pandas costs ~0.5 s of CPU, so programs run in children forked from
+# a long-lived server process that imported the libraries once (restarted if it dies).
+# Validation alone cannot stop file access, so each child also isolates itself before running the
+# program (sandbox_runner._isolate): private mount/network namespaces with /proc, home, upload and
+# cache directories hidden, and an unprivileged uid. The server must run as root for that; without
+# it programs are refused unless SANDBOX_ISOLATION=0 (local development only: the program can then
+# read whatever the app can, including /proc/<app pid>/environ).
+
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", "20"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "20"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "2048"))
+SANDBOX_MAX_OUTPUT = int(os.getenv("SANDBOX_MAX_OUTPUT", str(4 << 20)))
+SANDBOX_START_TIMEOUT = float(os.getenv("SANDBOX_START_TIMEOUT", "60"))
+SANDBOX_ISOLATION = os.getenv("SANDBOX_ISOLATION", "1") != "0"
+SANDBOX_UID = int(os.getenv("SANDBOX_UID", "65534"))  # nobody
+MAX_CODE_CHARS = 8000
+
+ALLOWED_MODULES = ("pandas", "numpy", "math", "statistics", "re", "datetime", "collections", "itertools",
+                   "matplotlib", "scipy")
+FORBIDDEN_NAMES = {
+    "open", "exec", "eval", "compile", "__import__", "globals", "locals", "vars", "getattr", "setattr",
+    "delattr", "input", "breakpoint", "help", "exit", "quit", "memoryview", "type", "object", "super",
+}
+# pandas/numpy entry points that read or write files, pickle or shell out
+FORBIDDEN_ATTRS = re.compile(r"^(read_\w+|to_(csv|parquet|feather|pickle|excel|hdf|sql|json|html|xml|stata|orc|latex|clipboard)"
+                             r"|load|save|savez\w*|savetxt|loadtxt|genfromtxt|fromfile|tofile|memmap|system|popen|savefig)$")
+
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_runner.py")
+
+_server = None  # (Popen, socket path, server directory)
+_server_lock = threading.Lock()
+
+
+class UnsafeCode(Exception):
+    """The program failed static validation and was not run."""
+
+
+class SandboxError(Exception):
+    """The program ran but failed, timed out or exceeded a limit."""
+
+
+class SandboxUnavailable(SandboxError):
+    """The child could not isolate itself (e.g. the server is not root); no program can run."""
+
+
+def validate(code):
+    """Parse code and reject anything outside the sandbox whitelist; returns the AST."""
+    if len(code) > MAX_CODE_CHARS:
+        raise UnsafeCode("program too long")
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise UnsafeCode(f"syntax error: {e}") from e
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module or ""] if node.level == 0 else [""]
+        else:
+            names = None
+        if names is not None:
+            for name in names:
+                if name.split(".")[0] not in ALLOWED_MODULES:
+                    raise UnsafeCode(f"import of {name!r} is not allowed")
+        elif isinstance(node, ast.Name) and (node.id in FORBIDDEN_NAMES or node.id.startswith("__")):
+            raise UnsafeCode(f"use of {node.id!r} is not allowed")
+        elif isinstance(node, ast.Attribute):
+            if node.attr.startswith("_") or FORBIDDEN_ATTRS.match(node.attr):
+                raise UnsafeCode(f"attribute {node.attr!r} is not allowed")
+        elif isinstance(node, (ast.Global, ast.Nonlocal, ast.AsyncFunctionDef, ast.Await)):
+            raise UnsafeCode(f"{type(node).__name__} is not allowed")
+    return tree
+
+
+def _feather_frame(df):
+    """Feather needs string column names and a default index."""
+    out = df.reset_index(drop=True)
+    out.columns = [str(c) for c in out.columns]
+    return out
+
+
+def _stage(frames, workdir):
+    """Feather path per frame; uploads with a content key are written once and shared across runs."""
+    paths = []
+    for i, df in enumerate(frames):
+        key = df.attrs.get("content_key")
+        path = None
+        if key and not df.attrs.get("sampled"):
+            path = dataset_store.get_store().feather_path(key, df)
+        if path is None:
+            path = os.path.join(workdir, f"input{i}.feather")
+            _feather_frame(df).to_feather(path)
+        paths.append(path)
+    return paths
+
+
+def _clean(value):
+    """NaN/inf (allowed in the child's JSON) become None so the API response stays valid JSON."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _clean(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clean(v) for v in value]
+    return value
+
+
+def _hidden_paths():
+    """Directories the program must not see: other requests' uploads, caches and the app's secrets."""
+    project = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # source and .env
+    paths = ["/proc", "/root", "/home", project, tempfile.gettempdir(), dataset_store.DATASET_SPILL_DIR]
+    if ingest.UPLOAD_DIR:
+        paths.append(ingest.UPLOAD_DIR)
+    # A directory holding the Python installation stays visible (the libraries import lazily)
+    python = [os.path.abspath(p) + os.sep for p in (sys.prefix, sys.base_prefix)]
+    return [p for p in dict.fromkeys(os.path.abspath(p) for p in paths)
+            if not any(py.startswith(p.rstrip(os.sep) + os.sep) for py in python)]
+
+
+def _env():
+    # Nothing from the server's environment (API keys) reaches the program
+    return {"PATH": os.defpath, "OPENBLAS_NUM_THREADS": "1", "OMP_NUM_THREADS": "1", "MKL_NUM_THREADS": "1",
+            "MPLBACKEND": "Agg", "MPLCONFIGDIR": tempfile.gettempdir()}
+
+
+def _start_server():
+    home = tempfile.mkdtemp(prefix="sandbox-")
+    path = os.path.join(home, "server.sock")
+    proc = subprocess.Popen(
+        [sys.executable, "-I", RUNNER, path], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL, cwd=home, env=_env(),
+    )
+    ready, _, _ = select.select([proc.stdout], [], [], SANDBOX_START_TIMEOUT)
+    if not ready or proc.stdout.readline().strip() != b"ready":
+        proc.kill()
+        shutil.rmtree(home, ignore_errors=True)
+        raise SandboxError("sandbox server did not start")
+    return proc, path, home
+
+
+def _get_server():
+    global _server
+    with _server_lock:
+        if _server is None or _server[0].poll() is not None:
+            if _server is not None:
+                shutil.rmtree(_server[2], ignore_errors=True)
+            _server = _start_server()
+        return _server
+
+
+def prewarm():
+    """Start the sandbox server now instead of on the first program."""
+    _get_server()
+
+
+@atexit.register
+def shutdown():
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server[0].kill()
+            shutil.rmtree(_server[2], ignore_errors=True)
+            _server = None
+
+
+def _exchange(job, timeout):
+    """Send job to a fresh forked child and return its reply line; the child is killed on timeout."""
+    _, path, _ = _get_server()
+    end = time.monotonic() + timeout
+    pid = None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        conn.connect(path)
+        stream = conn.makefile("rwb")
+        try:
+            pid = int(stream.readline())
+            stream.write(json.dumps(job).encode() + b"\n")
+            stream.flush()
+            conn.settimeout(max(end - time.monotonic(), 0.01))
+            reply = stream.readline(SANDBOX_MAX_OUTPUT + 1)
+        except (socket.timeout, TimeoutError, ValueError, OSError) as e:
+            if pid is not None:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            if isinstance(e, (socket.timeout, TimeoutError)):
+                raise SandboxError(f"program timed out after {timeout:.1f}s")
+            raise SandboxError(f"sandbox connection failed: {e}")
+    if len(reply) > SANDBOX_MAX_OUTPUT:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        raise SandboxError("program output too large")
+    if not reply:
+        # The child died before replying: CPU or file-size limit (SIGXCPU, SIGXFSZ) or a crash
+        raise SandboxError("program was killed (resource limit exceeded)")
+    return json.loads(reply)
+
+
+@telemetry.traced("sandbox")
+def run(code, frames, names=None, params=None, timeout=None):
+    """
+    Validate and run code over frames (list of DataFrames, `dfs`/`df` in the program) in a
+    limited child process. Returns the JSON-compatible value the program assigned to `result`.
+    """
+    validate(code)
+    deadline.check("sandbox")
+    timeout = deadline.clamp(SANDBOX_TIMEOUT if timeout is None else timeout)
+    workdir = tempfile.mkdtemp(prefix="sandbox-job-")
+    try:
+        job = {
+            "code": code,
+            "inputs": _stage(frames, workdir),
+            "names": list(names or []),
+            "params": list(params or []),
+            "modules": list(ALLOWED_MODULES),
+            "memory_mb": SANDBOX_MEMORY_MB,
+            "cpu_seconds": max(1, min(SANDBOX_CPU_SECONDS, math.ceil(timeout))),
+            "isolate": SANDBOX_ISOLATION,
+            "uid": SANDBOX_UID,
+            "hide": _hidden_paths(),
+        }
+        reply = _exchange(job, timeout)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if not reply.get("ok"):
+        if reply.get("isolation"):
+            raise SandboxUnavailable(reply["error"])
+        raise SandboxError(reply.get("error", "program failed"))
+    return _clean(reply.get("result"))
@@ -0,0 +1,215 @@
+import io
+import os
+import sys
+import json
+import base64
+import ctypes
+import signal
+import socket
+import builtins
+import resource
+import selectors
+
+# Fork server for app/sandbox.py; runs as `python -I sandbox_runner.py <socket path>`.
+# It imports pandas/numpy/matplotlib once, then forks one child per connection on the Unix socket,
+# so a program starts in milliseconds with the libraries already loaded and nothing left over from
+# earlier programs. Per connection the child sends its pid (so the caller can kill it), reads one
+# job as a JSON line, applies the limits before any user code exists in the process, runs the
+# program with a whitelisted __import__ and replies with one JSON line {"ok": ..., "result"/"error": ...}.
+# The server exits when its stdin closes (the app went away).
+# The AST check and the import whitelist do not stop file access (pandas, numpy and matplotlib all
+# open files), so after loading its inputs the child isolates itself: new mount, network and IPC
+# namespaces, empty read-only tmpfs over /proc (no view of the app's environment or memory), the
+# home directories and the upload/cache directories, then a switch to an unprivileged uid with
+# no_new_privs set. If that fails the program is not run.
+
+SAFE_BUILTINS = (
+    "abs", "all", "any", "bool", "dict", "divmod", "enumerate", "filter", "float", "format", "frozenset",
+    "int", "isinstance", "len", "list", "map", "max", "min", "next", "pow", "print", "range", "repr",
+    "reversed", "round", "set", "slice", "sorted", "str", "sum", "tuple", "zip", "ValueError",
+    "KeyError", "IndexError", "TypeError", "ZeroDivisionError", "Exception",
+)
+
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY, MS_NOSUID, MS_NODEV, MS_NOEXEC = 0x1, 0x2, 0x4, 0x8
+MS_REC = 0x4000
+MS_PRIVATE = 1 << 18
+PR_SET_NO_NEW_PRIVS = 38
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+class IsolationError(Exception):
+    """The child could not isolate itself; the program must not run."""
+
+
+def _check(ret, what):
+    if ret != 0:
+        err = ctypes.get_errno()
+        raise IsolationError(f"{what}: {os.strerror(err)}")
+
+
+def _isolate(uid, hide):
+    """Private namespaces, hidden paths and an unprivileged uid (needs root in the server)."""
+    _check(_libc.unshare(CLONE_NEWNS | CLONE_NEWNET | CLONE_NEWIPC), "unshare")
+    _check(_libc.mount(b"none", b"/", None, MS_REC | MS_PRIVATE, None), "private mounts")
+    for path in hide:
+        if os.path.isdir(path):
+            _check(_libc.mount(b"tmpfs", path.encode(), b"tmpfs", MS_RDONLY | MS_NOSUID | MS_NODEV | MS_NOEXEC,
+                               b"size=4k,mode=555"), f"hide {path}")
+    os.chdir("/")
+    try:
+        os.setgroups([])
+        os.setgid(uid)
+        os.setuid(uid)
+    except OSError as e:
+        raise IsolationError(f"cannot switch to uid {uid}: {e}")
+    _check(_libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "no_new_privs")
+    if os.getuid() == 0 or os.geteuid() == 0:
+        raise IsolationError("still running as root")
+
+
+def _preload_fonts():
+    """Open the default fonts again: matplotlib clears its font cache in forked children."""
+    from matplotlib import font_manager
+
+    for style, weight in (("normal", "normal"), ("normal", "bold"), ("italic", "normal")):
+        prop = font_manager.FontProperties(style=style, weight=weight)
+        font_manager.get_font(font_manager.findfont(prop))
+
+
+def _limit(memory_mb, cpu_seconds):
+    resource.setrlimit(resource.RLIMIT_AS, (memory_mb << 20, memory_mb << 20))
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    # No file may grow: writes to disk fail instead of filling it
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+
+
+def _importer(allowed):
+    real = __import__
+
+    def guarded(name, globals=None, locals=None, fromlist=(), level=0):
+        if level != 0 or name.split(".")[0] not in allowed:
+            raise ImportError(f"import of {name!r} is not allowed")
+        return real(name, globals, locals, fromlist, level)
+    return guarded
+
+
+def to_data_uri(fig, max_bytes=100_000):
+    """PNG data URI of a matplotlib figure, shrinking the resolution until it fits max_bytes."""
+    import matplotlib.pyplot as plt
+
+    for dpi in (100, 80, 60, 45, 30):
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+        if buf.tell() <= max_bytes:
+            break
+    plt.close(fig)
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def _jsonable(value):
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict(orient="records")
+    if isinstance(value, pd.Series):
+        return {str(k): v for k, v in value.to_dict().items()}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return str(value)
+    if value is pd.NaT:
+        return None
+    raise TypeError(f"result contains a {type(value).__name__}")
+
+
+def _run_job(job, libs):
+    np, pd, plt = libs
+    _limit(job["memory_mb"], job["cpu_seconds"])
+    dfs = [pd.read_feather(path) for path in job["inputs"]]
+    if job["isolate"]:
+        _preload_fonts()
+        _isolate(job["uid"], job["hide"])
+    safe = {name: getattr(builtins, name) for name in SAFE_BUILTINS}
+    safe["__import__"] = _importer(set(job["modules"]))
+    namespace = {
+        "__builtins__": safe, "pd": pd, "np": np, "plt": plt, "to_data_uri": to_data_uri,
+        "dfs": dfs, "df": dfs[0] if dfs else None, "names": job["names"], "params": job["params"],
+    }
+    sys.stdout = io.StringIO()  # prints from the program go nowhere
+    exec(compile(job["code"], "<plan>", "exec"), namespace)
+    if "result" not in namespace:
+        raise NameError("the program did not set `result`")
+    return json.dumps({"ok": True, "result": namespace["result"]}, default=_jsonable)
+
+
+def _handle(conn, libs):
+    stream = conn.makefile("rwb")
+    stream.write(f"{os.getpid()}\n".encode())
+    stream.flush()
+    try:
+        text = _run_job(json.loads(stream.readline()), libs)
+    except MemoryError:
+        text = json.dumps({"ok": False, "error": "memory limit exceeded"})
+    except IsolationError as e:
+        text = json.dumps({"ok": False, "error": f"sandbox isolation failed: {e}", "isolation": True})
+    except Exception as e:
+        text = json.dumps({"ok": False, "error": f"{type(e).__name__}: {e}"[:2000]})
+    stream.write(text.encode() + b"\n")
+    stream.flush()
+
+
+def serve(path):
+    import numpy as np
+    import pandas as pd
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    # Draw and save one figure so every lazily imported plotting module (and the font cache) is
+    # loaded before children lose access to the filesystem
+    fig, ax = plt.subplots()
+    ax.plot([0, 1], [0, 1])
+    ax.set_title("warm-up")
+    to_data_uri(fig)
+
+    # Started with a minimal environment already; clear anything else before forking children
+    for name in list(os.environ):
+        if name not in ("PATH", "MPLBACKEND", "MPLCONFIGDIR") and not name.endswith("_NUM_THREADS"):
+            del os.environ[name]
+    libs = (np, pd, plt)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(64)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # children are reaped automatically
+    sel = selectors.DefaultSelector()
+    sel.register(server, selectors.EVENT_READ)
+    sel.register(sys.stdin, selectors.EVENT_READ)
+    sys.stdout.write("ready\n")
+    sys.stdout.flush()
+    while True:
+        for key, _ in sel.select():
+            if key.fileobj is sys.stdin:
+                if not sys.stdin.readline():
+                    return
+                continue
+            conn, _ = server.accept()
+            if os.fork() == 0:
+                sel.close()
+                server.close()
+                try:
+                    _handle(conn, libs)
+                finally:
+                    os._exit(0)
+            conn.close()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1])
@@ -0,0 +1,233 @@
+import warnings
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# Mergeable streaming sketches for out-of-core statistics. Each one is updated chunk by chunk,
+# keeps memory independent of the row count and can be merged with another sketch of the same
+# kind (e.g. built on a different worker or file part).
+#   Moments     - count / sum / mean / variance (Welford-Chan) / min / max per column
+#   CoMoments   - pairwise-complete co-moment sums for the Pearson correlation matrix
+#   TDigest     - median and other quantiles of one column
+#   MisraGries  - top-k frequent values of one column (exact while distinct values <= k)
+
+TDIGEST_COMPRESSION = 200
+MISRA_GRIES_K = 10000
+
+
+class Moments:
+    """Per-column running moments of a 2-D float block (NaN = missing)."""
+
+    def __init__(self, ncols):
+        self.n = np.zeros(ncols)
+        self.sum = np.zeros(ncols)
+        self.mean = np.zeros(ncols)
+        self.m2 = np.zeros(ncols)
+        self.min = np.full(ncols, np.inf)
+        self.max = np.full(ncols, -np.inf)
+
+    def update(self, block):
+        valid = ~np.isnan(block)
+        other = Moments(block.shape[1])
+        with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+            warnings.simplefilter("ignore", RuntimeWarning)
+            other.n = valid.sum(axis=0).astype("float64")
+            other.sum = np.nansum(block, axis=0)
+            other.mean = np.where(other.n > 0, other.sum / other.n, 0.0)
+            other.m2 = np.nansum((block - other.mean) ** 2, axis=0)
+            other.min = np.fmin(other.min, np.nanmin(block, axis=0))
+            other.max = np.fmax(other.max, np.nanmax(block, axis=0))
+        return self.merge(other)
+
+    def merge(self, other):
+        n = self.n + other.n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = other.mean - self.mean
+            frac = np.where(n > 0, other.n / n, 0.0)
+            self.mean = self.mean + delta * frac
+            self.m2 = self.m2 + other.m2 + delta * delta * self.n * frac
+        self.n = n
+        self.sum = self.sum + other.sum
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        return self
+
+    def variance(self, ddof=1):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.n > ddof, self.m2 / (self.n - ddof), np.nan)
+
+    def result(self):
+        """(sum, mean, min, max) arrays with NaN for empty columns."""
+        empty = self.n == 0
+        mean = np.where(empty, np.nan, self.mean)
+        mins = np.where(empty, np.nan, self.min)
+        maxs = np.where(empty, np.nan, self.max)
+        return self.sum, mean, mins, maxs
+
+
+class CoMoments:
+    """
+    Pairwise-complete co-moment sums (like DataFrame.corr's handling of missing values).
+    Values are shifted by the first chunk's means to keep the sums well conditioned.
+    """
+
+    def __init__(self, ncols):
+        self.shift = None
+        self.n = np.zeros((ncols, ncols))
+        self.sx = np.zeros((ncols, ncols))   # sum of x_i over rows where x_j is also present
+        self.sxx = np.zeros((ncols, ncols))
+        self.sxy = np.zeros((ncols, ncols))
+
+    def update(self, block):
+        valid = ~np.isnan(block)
+        if self.shift is None:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                self.shift = np.nan_to_num(np.nanmean(block, axis=0))
+        x = np.where(valid, block - self.shift, 0.0)
+        m = valid.astype("float64")
+        self.n += m.T @ m
+        self.sx += x.T @ m
+        self.sxx += (x * x).T @ m
+        self.sxy += x.T @ x
+        return self
+
+    def merge(self, other):
+        if other.shift is None:
+            return self
+        if self.shift is None:
+            self.shift = other.shift.copy()
+        # Re-express the other sums around our shift: x_self = x_other + d
+        d = other.shift - self.shift
+        di, dj = d[:, None], d[None, :]
+        sx = other.sx + di * other.n
+        sxx = other.sxx + 2 * di * other.sx + di * di * other.n
+        sxy = other.sxy + dj * other.sx + di * other.sx.T + di * dj * other.n
+        self.n += other.n
+        self.sx += sx
+        self.sxx += sxx
+        self.sxy += sxy
+        return self
+
+    def corr(self):
+        n, sx, sxx, sxy = self.n, self.sx, self.sxx, self.sxy
+        with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+            warnings.simplefilter("ignore", RuntimeWarning)
+            cov = n * sxy - sx * sx.T
+            var_i = n * sxx - sx * sx
+            corr = cov / np.sqrt(var_i * var_i.T)
+        corr[n < 2] = np.nan
+        np.fill_diagonal(corr, np.where(np.diag(var_i) > 0, 1.0, np.nan))
+        return np.clip(corr, -1.0, 1.0)
+
+
+class TDigest:
+    """
+    Merging t-digest (k1 scale function). Updates sort the chunk together with the current
+    centroids and re-cluster them in one vectorized pass; extremes are tracked exactly.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def update(self, values):
+        v = np.asarray(values, dtype="float64")
+        v = v[np.isfinite(v)]
+        if len(v):
+            self.min = min(self.min, float(v.min()))
+            self.max = max(self.max, float(v.max()))
+            self._compress(np.concatenate([self.means, v]), np.concatenate([self.weights, np.ones(len(v))]))
+        return self
+
+    def merge(self, other):
+        if len(other.weights):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        cum = np.cumsum(weights)
+        q_mid = (cum - weights / 2) / total
+        # k1 scale: small clusters at the tails, large ones around the median
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q_mid - 1, -1, 1))
+        group = np.floor(k)
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        w = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / w
+        self.weights = w
+
+    def quantile(self, q):
+        if not len(self.weights):
+            return float("nan")
+        if len(self.weights) == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        centers = (np.cumsum(self.weights) - self.weights / 2) / total
+        xs = np.r_[0.0, centers, 1.0]
+        ys = np.r_[self.min, self.means, self.max]
+        return float(np.interp(q, xs, ys))
+
+    def cdf(self, x):
+        """Approximate fraction of values <= x (vectorized over x)."""
+        if not len(self.weights):
+            return np.full(np.shape(x), np.nan)
+        total = self.weights.sum()
+        centers = (np.cumsum(self.weights) - self.weights / 2) / total
+        return np.interp(x, np.r_[self.min, self.means, self.max], np.r_[0.0, centers, 1.0])
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+class MisraGries:
+    """
+    Frequent values with at most k counters. Counts are exact while the column has <= k
+    distinct values (`exact` stays True); after pruning they are lower bounds, off by at most n/(k+1).
+    Counters keep first-appearance order, so ties list like value_counts().
+    """
+
+    def __init__(self, k=MISRA_GRIES_K):
+        self.k = k
+        self.counts = Counter()
+        self.total = 0
+        self.exact = True
+
+    def update(self, s):
+        codes, uniques = pd.factorize(s, sort=False)
+        valid = codes[codes >= 0]
+        if len(uniques):
+            counts = np.bincount(valid, minlength=len(uniques))
+            self.counts.update(dict(zip(uniques, counts.tolist())))
+        self.total += len(valid)
+        self._prune()
+        return self
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.exact = self.exact and other.exact
+        self._prune()
+        return self
+
+    def _prune(self):
+        if len(self.counts) <= self.k:
+            return
+        cut = sorted(self.counts.values(), reverse=True)[self.k]
+        self.counts = Counter({v: c - cut for v, c in self.counts.items() if c > cut})
+        self.exact = False
+
+    def most_common(self, n=None):
+        return self.counts.most_common(n)
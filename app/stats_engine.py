@@ -0,0 +1,245 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .sketches import Moments, CoMoments, TDigest, MisraGries, MISRA_GRIES_K
+
+# Vectorized summary statistics for analyze_csv_generic.
+# Numeric columns are copied once into a 2-D float block and every aggregate is a single
+# axis-0 reduction over it; categorical columns are counted with factorize + bincount.
+
+STATS_TOP_K = int(os.getenv("STATS_TOP_K", "0")) or None  # truncate frequency tables (0 = keep all)
+STATS_CHUNK_ROWS = int(os.getenv("STATS_CHUNK_ROWS", "500000"))
+
+
+def numeric_block(df, cols):
+    """Numeric columns as one float64 array (NaN for missing)."""
+    return df[cols].to_numpy(dtype="float64", na_value=np.nan)
+
+
+def numeric_summary(df, cols, block=None):
+    """{col: {"sum", "mean", "median", "min", "max"}} computed column-wise on one block."""
+    if not cols:
+        return {}
+    if block is None:
+        block = numeric_block(df, cols)
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        counts = np.count_nonzero(~np.isnan(block), axis=0)
+        sums = np.nansum(block, axis=0)
+        means = sums / counts
+        medians = np.nanmedian(block, axis=0)
+        mins = np.nanmin(block, axis=0)
+        maxs = np.nanmax(block, axis=0)
+    return {
+        col: {"sum": float(sums[i]), "mean": float(means[i]), "median": float(medians[i]),
+              "min": float(mins[i]), "max": float(maxs[i])}
+        for i, col in enumerate(cols)
+    }
+
+
+def pairwise_corr(block):
+    """
+    Pearson correlation matrix with pairwise-complete observations (like DataFrame.corr),
+    computed from masked co-moment sums with a handful of matrix products.
+    """
+    return CoMoments(block.shape[1]).update(block).corr()
+
+
+def correlation_matrix(df, cols, block=None):
+    """Pearson correlations as {c1: {c2: r}}, matching DataFrame.corr()."""
+    if not cols:
+        return {}
+    if block is None:
+        block = numeric_block(df, cols)
+    if np.isnan(block).any():
+        corr = pairwise_corr(block)
+    else:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = np.atleast_2d(np.corrcoef(block, rowvar=False))
+    return {c1: {c2: float(corr[i, j]) for j, c2 in enumerate(cols)} for i, c1 in enumerate(cols)}
+
+
+def _pick_mode(uniques, counts):
+    """Most frequent value; ties resolve to the smallest value like Series.mode()."""
+    best = counts.max()
+    tied = [uniques[i] for i in np.flatnonzero(counts == best)]
+    try:
+        return sorted(tied)[0]
+    except TypeError:
+        return tied[0]
+
+
+def value_frequencies(s, top_k=None):
+    """(mode, {value: count}) for one column via factorize + bincount, most frequent first."""
+    codes, uniques = pd.factorize(s, sort=False)
+    valid = codes[codes >= 0]
+    if len(uniques) == 0:
+        return None, {}
+    counts = np.bincount(valid, minlength=len(uniques))
+    # Stable sort keeps first-appearance order among ties, like value_counts()
+    order = np.argsort(-counts, kind="stable")
+    if top_k:
+        order = order[:top_k]
+    uniques = np.asarray(uniques, dtype=object)
+    freq = {str(uniques[i]): int(counts[i]) for i in order}
+    return _pick_mode(uniques, counts), freq
+
+
+def categorical_summary(df, cols, top_k=STATS_TOP_K):
+    """{col: (mode, frequencies)} for the given columns."""
+    return {col: value_frequencies(df[col], top_k) for col in cols}
+
+
+class LinearFit:
+    """
+    Least-squares line y = slope * x + intercept from streaming sufficient statistics
+    (count, means and centred co-moments, merged per chunk), so no full-size design matrix is built.
+    Non-finite pairs are skipped.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = self.mean_y = 0.0
+        self.sxx = self.sxy = self.syy = 0.0
+
+    def update(self, x, y):
+        x = np.asarray(x, dtype="float64")
+        y = np.asarray(y, dtype="float64")
+        ok = np.isfinite(x) & np.isfinite(y)
+        x, y = x[ok], y[ok]
+        n = len(x)
+        if not n:
+            return self
+        mx, my = x.mean(), y.mean()
+        dx, dy = x - mx, y - my
+        # Chan et al. pairwise merge of the chunk's moments into the running ones
+        total = self.n + n
+        delta_x, delta_y = mx - self.mean_x, my - self.mean_y
+        w = self.n * n / total
+        self.sxx += float(dx @ dx) + delta_x * delta_x * w
+        self.syy += float(dy @ dy) + delta_y * delta_y * w
+        self.sxy += float(dx @ dy) + delta_x * delta_y * w
+        self.mean_x += delta_x * n / total
+        self.mean_y += delta_y * n / total
+        self.n = total
+        return self
+
+    @property
+    def slope(self):
+        return self.sxy / self.sxx if self.sxx > 0 else float("nan")
+
+    @property
+    def intercept(self):
+        return self.mean_y - self.slope * self.mean_x
+
+    @property
+    def r(self):
+        denom = (self.sxx * self.syy) ** 0.5
+        return self.sxy / denom if denom > 0 else float("nan")
+
+
+def linear_fit(x, y, chunk_rows=STATS_CHUNK_ROWS):
+    """LinearFit over two equal-length arrays, walked in chunks."""
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    fit = LinearFit()
+    for start in range(0, len(x), chunk_rows):
+        fit.update(x[start:start + chunk_rows], y[start:start + chunk_rows])
+    return fit
+
+
+class ChunkedSummary:
+    """
+    Summary statistics over a stream of DataFrame chunks for files bigger than RAM, built from
+    mergeable sketches so memory does not grow with the row count: sum/mean/min/max are exact,
+    the median comes from a t-digest, correlations from co-moment sums and frequencies from
+    Misra-Gries counters (exact while a column has at most MISRA_GRIES_K distinct values).
+    """
+
+    def __init__(self, top_k=MISRA_GRIES_K):
+        self.numeric_cols = None
+        self.cat_cols = None
+        self.top_k = top_k
+        self.rows = 0
+        self.moments = self.comoments = None
+        self.digests = []
+        self.freqs = {}
+
+    def update(self, chunk):
+        if self.numeric_cols is None:
+            self.numeric_cols = chunk.select_dtypes(include="number").columns.tolist()
+            self.cat_cols = chunk.select_dtypes(exclude="number").columns.tolist()
+            n = len(self.numeric_cols)
+            self.moments = Moments(n)
+            self.comoments = CoMoments(n)
+            self.digests = [TDigest() for _ in range(n)]
+            self.freqs = {c: MisraGries(self.top_k) for c in self.cat_cols}
+        self.rows += len(chunk)
+        if self.numeric_cols:
+            block = pd.DataFrame(
+                {c: pd.to_numeric(chunk[c], errors="coerce") for c in self.numeric_cols}
+            ).to_numpy(dtype="float64", na_value=np.nan)
+            self.moments.update(block)
+            self.comoments.update(block)
+            for i, digest in enumerate(self.digests):
+                digest.update(block[:, i])
+        for col in self.cat_cols:
+            self.freqs[col].update(chunk[col])
+        return self
+
+    def merge(self, other):
+        """Combine with a summary of another part of the same file."""
+        if other.numeric_cols is None:
+            return self
+        if self.numeric_cols is None:
+            self.__dict__.update(other.__dict__)
+            return self
+        self.rows += other.rows
+        self.moments.merge(other.moments)
+        self.comoments.merge(other.comoments)
+        for mine, theirs in zip(self.digests, other.digests):
+            mine.merge(theirs)
+        for col, mg in other.freqs.items():
+            self.freqs[col].merge(mg)
+        return self
+
+    def numeric(self):
+        if not self.numeric_cols:
+            return {}
+        sums, means, mins, maxs = self.moments.result()
+        medians = [d.median() for d in self.digests]
+        return {
+            col: {"sum": float(sums[i]), "mean": float(means[i]), "median": float(medians[i]),
+                  "min": float(mins[i]), "max": float(maxs[i])}
+            for i, col in enumerate(self.numeric_cols)
+        }
+
+    def correlations(self):
+        cols = self.numeric_cols or []
+        if not cols:
+            return {}
+        corr = self.comoments.corr()
+        return {c1: {c2: float(corr[i, j]) for j, c2 in enumerate(cols)} for i, c1 in enumerate(cols)}
+
+    def categorical(self, top_k=STATS_TOP_K):
+        out = {}
+        for col, mg in self.freqs.items():
+            if not mg.counts:
+                out[col] = (None, {})
+                continue
+            items = mg.most_common(top_k)
+            uniques = np.asarray(list(mg.counts.keys()), dtype=object)
+            counts = np.asarray(list(mg.counts.values()))
+            out[col] = (_pick_mode(uniques, counts), {str(k): int(v) for k, v in items})
+        return out
+
+
+def summarize_csv_chunked(source, chunksize=STATS_CHUNK_ROWS, **read_kwargs):
+    """Run ChunkedSummary over a CSV without loading it whole."""
+    summary = ChunkedSummary()
+    for chunk in pd.read_csv(source, chunksize=chunksize, **read_kwargs):
+        summary.update(chunk)
+    return summary
@@ -0,0 +1,201 @@
+import json
+import math
+import base64
+import time
+import asyncio
+import concurrent.futures
+
+from starlette.responses import Response, StreamingResponse
+
+from . import lazy_imports
+from .render import EncodedImage
+
+try:
+    import orjson
+except ImportError:  # optional: the standard library encoder is used instead
+    orjson = None
+
+# Streaming JSON writer for API responses. Instead of building the whole body with json.dumps
+# (the result dict, then the JSON text, then its bytes: several copies of every base64 chart),
+# the response is written piece by piece:
+#   - plain sub-trees are serialized in one call (orjson when installed);
+#   - render.EncodedImage values are base64-encoded in CHUNK_BYTES slices straight into the body;
+#   - Future values (work still running, e.g. charts) are awaited, and in objects the keys whose
+#     values are ready are written first, the rest in the order they finish.
+# Values that fail or are still pending after the timeout are written as null. Small pieces are
+# coalesced into sends of up to CHUNK_BYTES; whatever is buffered goes out before waiting on a future.
+
+CHUNK_BYTES = 48 * 1024  # multiple of 3, so chunks base64-encode without padding
+
+FUTURES = (concurrent.futures.Future, asyncio.Future)
+# Only needed for values the encoders do not know, which exist only once numpy/pandas are loaded
+np = lazy_imports.module("numpy")
+pd = lazy_imports.module("pandas")
+FLUSH = b""  # yielded by iter_json before it waits, so buffered bytes reach the client first
+
+
+def _default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return str(value)
+    if isinstance(value, EncodedImage):
+        return str(value)
+    if value is pd.NaT:
+        return None
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _finite(value):
+    """NaN/inf -> None for the standard library encoder (orjson already writes them as null)."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+
+def dumps(value):
+    """value as compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_finite(value), default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _safe_dumps(value):
+    try:
+        return dumps(value)
+    except (TypeError, ValueError) as e:
+        # Headers are already sent; write null rather than breaking the body
+        print(f"Streamed value not serializable: {e}")
+        return b"null"
+
+
+def _plain(value):
+    """True if value holds no images or futures (serialized in one call)."""
+    if isinstance(value, (EncodedImage,) + FUTURES):
+        return False
+    if isinstance(value, dict):
+        return all(_plain(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return all(_plain(v) for v in value)
+    return True
+
+
+def _pending(value):
+    return isinstance(value, FUTURES) and not value.done()
+
+
+async def _resolve(future, deadline):
+    """Result of a (thread or asyncio) future, or None if it failed or missed the deadline."""
+    try:
+        if isinstance(future, concurrent.futures.Future):
+            future = asyncio.wrap_future(future)
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        return await asyncio.wait_for(future, timeout)
+    except Exception as e:
+        print(f"Streamed value dropped: {type(e).__name__}: {e}")
+        return None
+
+
+async def iter_json(value, deadline=None):
+    """Yield the JSON encoding of value in pieces; deadline is a time.monotonic() value for futures."""
+    if isinstance(value, FUTURES):
+        if not value.done():
+            yield FLUSH
+        value = await _resolve(value, deadline)
+    if _plain(value):
+        yield _safe_dumps(value)
+    elif isinstance(value, EncodedImage):
+        yield b'"' + value.prefix().encode("ascii")
+        data = memoryview(value.data)
+        for start in range(0, len(data), CHUNK_BYTES):
+            yield base64.b64encode(data[start:start + CHUNK_BYTES])
+        yield b'"'
+    elif isinstance(value, dict):
+        yield b"{"
+        first = True
+        ready = [(k, v) for k, v in value.items() if not _pending(v)]
+        waiting = {asyncio.ensure_future(_resolve(v, deadline)): k for k, v in value.items() if _pending(v)}
+        for key, item in ready:
+            yield (b"" if first else b",") + dumps(str(key)) + b":"
+            first = False
+            async for piece in iter_json(item, deadline):
+                yield piece
+        while waiting:
+            yield FLUSH
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield (b"" if first else b",") + dumps(str(waiting.pop(task))) + b":"
+                first = False
+                async for piece in iter_json(task.result(), deadline):
+                    yield piece
+        yield b"}"
+    else:
+        yield b"["
+        for i, item in enumerate(value):
+            if i:
+                yield b","
+            async for piece in iter_json(item, deadline):
+                yield piece
+        yield b"]"
+
+
+async def coalesce(pieces, size=CHUNK_BYTES):
+    """Join small pieces into chunks of about `size` bytes; FLUSH sends what is buffered."""
+    buffer, buffered = [], 0
+    async for piece in pieces:
+        if piece:
+            buffer.append(piece)
+            buffered += len(piece)
+        if buffer and (buffered >= size or not piece):
+            yield b"".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+class StreamingJSONResponse(StreamingResponse):
+    """JSON response written incrementally from a result that may hold EncodedImages and futures."""
+
+    media_type = "application/json"
+
+    def __init__(self, content, status_code=200, headers=None, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        super().__init__(coalesce(iter_json(content, deadline)), status_code=status_code, headers=headers,
+                         media_type=self.media_type)
+
+
+def json_response(content, status_code=200, headers=None, timeout=None):
+    """
+    Response for an API result: one orjson/json call for plain results (serialization errors
+    surface before anything is sent), a StreamingJSONResponse when it holds images or futures.
+    timeout bounds the wait for futures, in seconds.
+    """
+    if _plain(content):
+        return Response(dumps(content), status_code=status_code, headers=headers, media_type="application/json")
+    return StreamingJSONResponse(content, status_code=status_code, headers=headers, timeout=timeout)
+
+
+def resolve(value, timeout=None):
+    """
+    Plain JSON-compatible copy of value for callers that need the whole result in memory:
+    futures are waited for (None on failure/timeout) and images become base64 strings.
+    """
+    if isinstance(value, concurrent.futures.Future):
+        try:
+            value = value.result(timeout)
+        except Exception as e:
+            print(f"Deferred value dropped: {type(e).__name__}: {e}")
+            return None
+    if isinstance(value, EncodedImage):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: resolve(v, timeout) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [resolve(v, timeout) for v in value]
+    return value
@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+import importlib.util
+import warnings
+from io import StringIO
+
+import pandas as pd
+from . import fetcher, lazy_imports, telemetry
+from .llm_cache import LRUCache
+
+lxml_html = lazy_imports.module("lxml.html")
+etree = lazy_imports.module("lxml.etree")
+
+# HTML table extraction. A page is parsed once with lxml; every <table> is converted to a
+# typed DataFrame (clean column names, money/number strings turned into numbers) and the
+# set is cached as Parquet under the URL + content hash, together with a small schema index
+# (columns, row count, caption, CSS classes per table). Callers ask for tables by column
+# hints or CSS class and only the matching tables are loaded.
+
+TABLE_CACHE_DIR = os.getenv("TABLE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "data-agent-table-cache")
+TABLE_INDEX_SIZE = int(os.getenv("TABLE_INDEX_SIZE", "256"))
+
+FOOTNOTE_RE = re.compile(r"\[[^\]]*\]")
+NUMBER_RE = re.compile(r"^[-+]?\d+(\.\d+)?$")
+NUMBER_STRIP_RE = re.compile(r"[\s,$€£¥]|^[A-Z]{0,3}\$")
+
+_index = LRUCache(TABLE_INDEX_SIZE, float("inf"))  # url -> (content hash, schema index)
+
+
+def _parquet_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+# --- typing ------------------------------------------------------------------
+
+def _clean_label(label):
+    if isinstance(label, tuple):
+        parts = []
+        for p in label:
+            p = str(p).strip()
+            if p and not p.startswith("Unnamed:") and p not in parts:
+                parts.append(p)
+        label = " ".join(parts)
+    return FOOTNOTE_RE.sub("", str(label)).strip()
+
+
+def _unique(labels):
+    seen = {}
+    out = []
+    for label in labels:
+        label = label or "column"
+        n = seen.get(label, 0)
+        seen[label] = n + 1
+        out.append(label if n == 0 else f"{label}_{n}")
+    return out
+
+
+def _to_number(s):
+    """Numeric version of a text column, or None unless every non-empty cell is a number."""
+    text = s.astype("string").str.replace(FOOTNOTE_RE, "", regex=True).str.strip()
+    text = text.mask(text.isin(["", "—", "–", "-", "N/A", "n/a"]))
+    cleaned = text.str.replace(NUMBER_STRIP_RE, "", regex=True)
+    present = cleaned.dropna()
+    if present.empty or not present.str.match(NUMBER_RE).all():
+        return None
+    num = pd.to_numeric(cleaned, errors="coerce")
+    if num.notna().all() and (num % 1 == 0).all():
+        return num.astype("int64")
+    return num.astype("float64")
+
+
+def type_table(df):
+    """Flatten/clean headers and convert number-like text columns (money, counts, ranks)."""
+    df = df.copy()
+    df.columns = _unique([_clean_label(c) for c in df.columns])
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == object:
+            num = _to_number(s)
+            if num is not None:
+                df[col] = num
+            else:
+                # Parquet needs one type per column
+                df[col] = s.where(s.isna(), s.astype(str).str.replace(FOOTNOTE_RE, "", regex=True).str.strip())
+    return df
+
+
+# --- extraction --------------------------------------------------------------
+
+def _caption(table):
+    cap = table.find("caption")
+    return cap.text_content().strip() if cap is not None else ""
+
+
+@telemetry.traced("html_parse")
+def parse_tables(html):
+    """[(schema, DataFrame)] for every table on the page, in document order."""
+    doc = lxml_html.fromstring(html.encode("utf-8") if isinstance(html, str) else html)
+    out = []
+    for i, table in enumerate(doc.iter("table")):
+        fragment = etree.tostring(table, encoding="unicode", method="html")
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                df = pd.read_html(StringIO(fragment), flavor="lxml")[0]
+        except (ValueError, IndexError):
+            continue  # layout table without rows
+        df = type_table(df)
+        schema = {
+            "position": i,
+            "columns": list(df.columns),
+            "rows": len(df),
+            "caption": _caption(table),
+            "classes": (table.get("class") or "").split(),
+        }
+        out.append((schema, df))
+    return out
+
+
+def extract_tables(html, hints=None, css_class=None):
+    """Typed tables from an HTML string, filtered by column hints / CSS class (no caching)."""
+    return [df for schema, df in parse_tables(html) if matches(schema, hints, css_class)]
+
+
+def matches(schema, hints=None, css_class=None):
+    """True when the table has css_class (if given) and a column containing any hint (if given)."""
+    if css_class and css_class not in schema.get("classes", []):
+        return False
+    if not hints:
+        return True
+    cols = [c.lower() for c in schema["columns"]]
+    return any(h.lower() in c for h in hints for c in cols)
+
+
+# --- cache -------------------------------------------------------------------
+
+def _page_dir(url, content_hash):
+    return os.path.join(TABLE_CACHE_DIR, hashlib.sha256(url.encode("utf-8")).hexdigest()[:32], content_hash[:32])
+
+
+def _load_index(page_dir):
+    try:
+        with open(os.path.join(page_dir, "index.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _store(page_dir, parsed):
+    os.makedirs(page_dir, exist_ok=True)
+    index = []
+    for n, (schema, df) in enumerate(parsed):
+        entry = dict(schema, file=f"table_{n}.parquet")
+        try:
+            df.to_parquet(os.path.join(page_dir, entry["file"]), index=False)
+        except Exception as e:
+            print(f"Could not cache table {n}: {e}")
+            entry["file"] = None
+        index.append(entry)
+    tmp = os.path.join(page_dir, "index.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, os.path.join(page_dir, "index.json"))
+    return index
+
+
+def _keyed(df, content_hash, n):
+    # Lets consumers memoize per table version (like dataset_store does for uploads)
+    df.attrs["content_key"] = f"{content_hash}-table{n}"
+    return df
+
+
+@telemetry.traced("html_tables")
+def get_tables(url, hints=None, css_class=None, page=None):
+    """
+    Typed tables for a URL that match the hints / CSS class, in page order.
+    The page comes from the fetch cache (or `page`, a FetchResult); tables are parsed once per
+    distinct page content and read back from Parquet afterwards.
+    """
+    page = page or fetcher.fetch(url)
+    content_hash = hashlib.sha256(page.content).hexdigest()
+    page_dir = _page_dir(url, content_hash)
+    index = _load_index(page_dir) if _parquet_available() else None
+    if index is None:
+        parsed = parse_tables(page.text)
+        if _parquet_available():
+            index = _store(page_dir, parsed)
+        else:
+            index = [dict(schema, file=None) for schema, _ in parsed]
+        _index.set(url, (content_hash, index))
+        return [_keyed(df, content_hash, n) for n, (schema, df) in enumerate(parsed)
+                if matches(schema, hints, css_class)]
+    _index.set(url, (content_hash, index))
+    picked = [(n, entry) for n, entry in enumerate(index) if matches(entry, hints, css_class)]
+    if any(entry["file"] is None for _, entry in picked):
+        # Some table could not be stored; parse the page again
+        return [_keyed(df, content_hash, n) for n, (schema, df) in enumerate(parse_tables(page.text))
+                if matches(schema, hints, css_class)]
+    return [_keyed(pd.read_parquet(os.path.join(page_dir, entry["file"])), content_hash, n) for n, entry in picked]
+
+
+def schema_index(url):
+    """Schema index (one dict per table) for the last version of url seen, or None."""
+    cached = _index.get(url)
+    return cached[1] if cached else None
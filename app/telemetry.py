@@ -0,0 +1,278 @@
+import os
+import time
+import uuid
+import asyncio
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Request tracing and Prometheus metrics (text exposition format, no client library needed).
+# A Trace is opened per HTTP request and carried in a context variable, which executor.submit
+# copies into worker threads. span("stage") times a block: the duration goes to the per-stage
+# latency histogram and to the current trace, which can be returned as a Server-Timing header.
+# Modules with their own counters (caches, LLM gateway) register collectors read at scrape time.
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "1") != "0"
+# Always send Server-Timing; otherwise only when the request carries X-Debug-Timing: 1
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "0") == "1"
+LATENCY_BUCKETS = tuple(
+    float(b) for b in os.getenv("LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,120").split(",")
+)
+METRIC_PREFIX = "data_agent_"
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{str(v)}"'.replace("\n", " ") for k, v in sorted(labels.items()))
+    return "{" + body + "}"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram keyed by label set."""
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = METRIC_PREFIX + name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # sorted label items -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(k, list(v)) for k, v in items]
+        for key, series in items:
+            labels = dict(key)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_label_str({**labels, 'le': f'{bound:g}'})} {count}")
+            lines.append(f"{self.name}_bucket{_label_str({**labels, 'le': '+Inf'})} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_label_str(labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by label set."""
+
+    def __init__(self, name, help):
+        self.name = METRIC_PREFIX + name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_label_str(dict(k))} {v}" for k, v in items)
+        return lines
+
+
+STAGE_SECONDS = Histogram("stage_seconds", "Time spent per processing stage")
+STAGE_ERRORS = Counter("stage_errors_total", "Stages that ended with an exception")
+REQUEST_SECONDS = Histogram("request_seconds", "HTTP request latency")
+REQUESTS = Counter("requests_total", "HTTP requests by route and status")
+ANSWER_PATHS = Counter("answer_paths_total", "Questions answered per path (deterministic engine or LLM)")
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+_collectors = []
+
+
+# --- traces ------------------------------------------------------------------
+
+class Trace:
+    """Spans of one request: (stage, start offset, duration) in seconds."""
+
+    def __init__(self, request_id=None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.notes = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, start, duration):
+        with self._lock:
+            self.spans.append((stage, start - self.started, duration))
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def note(self, key, value):
+        with self._lock:
+            self.notes.setdefault(key, []).append(value)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        """{stage: (total seconds, calls)} in first-seen order."""
+        out = {}
+        with self._lock:
+            for stage, _, duration in self.spans:
+                total, calls = out.get(stage, (0.0, 0))
+                out[stage] = (total + duration, calls + 1)
+        return out
+
+    def server_timing(self):
+        """Server-Timing header value: one entry per stage (summed), plus the total so far."""
+        parts = []
+        for stage, (total, calls) in self.summary().items():
+            desc = f';desc="x{calls}"' if calls > 1 else ""
+            parts.append(f"{stage};dur={total * 1000:.1f}{desc}")
+        for name, value in self.counters.items():
+            parts.append(f'{name};desc="{value}"')
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def start_trace(request_id=None):
+    """Open a trace in the current context; returns (trace, token for end_trace)."""
+    trace = Trace(request_id)
+    return trace, _current.set(trace)
+
+
+def end_trace(token):
+    _current.reset(token)
+
+
+def current_trace():
+    return _current.get()
+
+
+def request_id():
+    trace = _current.get()
+    return trace.request_id if trace else "-"
+
+
+def count(name, amount=1):
+    """Add to a per-request counter of the current trace (e.g. LLM tokens); no-op outside requests."""
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, amount)
+
+
+def note(key, value):
+    """Attach a value to the current trace under key (e.g. the answer path of each question)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.note(key, value)
+
+
+@contextmanager
+def span(stage):
+    """Time a block as `stage` (latency histogram + current trace)."""
+    if not TELEMETRY_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=stage)
+        trace = _current.get()
+        if trace is not None:
+            trace.add(stage, start, duration)
+
+
+def traced(stage):
+    """Decorator form of span() for plain and async functions."""
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# --- HTTP --------------------------------------------------------------------
+
+def request_started():
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += 1
+
+
+def request_finished(route, method, status, seconds):
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight -= 1
+    REQUEST_SECONDS.observe(seconds, route=route, method=method)
+    REQUESTS.inc(route=route, method=method, status=status)
+
+
+def in_flight():
+    return _in_flight
+
+
+# --- exposition --------------------------------------------------------------
+
+def add_collector(func):
+    """
+    Register func() -> iterable of (name, type, help, labels dict, value), read on every scrape.
+    type is "gauge" or "counter"; names get the metric prefix.
+    """
+    _collectors.append(func)
+    return func
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in (REQUEST_SECONDS, REQUESTS, STAGE_SECONDS, STAGE_ERRORS, ANSWER_PATHS):
+        lines.extend(metric.render())
+    lines.append(f"# HELP {METRIC_PREFIX}http_in_flight Requests currently being served")
+    lines.append(f"# TYPE {METRIC_PREFIX}http_in_flight gauge")
+    lines.append(f"{METRIC_PREFIX}http_in_flight {_in_flight}")
+
+    declared = set()
+    for collector in _collectors:
+        try:
+            samples = list(collector())
+        except Exception as e:
+            print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+            continue
+        for name, kind, help, labels, value in samples:
+            full = METRIC_PREFIX + name
+            if full not in declared:
+                declared.add(full)
+                lines.append(f"# HELP {full} {help}")
+                lines.append(f"# TYPE {full} {kind}")
+            lines.append(f"{full}{_label_str(labels)} {float(value):g}")
+    return "\n".join(lines) + "\n"
@@ -1,14 +1,10 @@
 import re
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
 from io import BytesIO
-import base64
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 from PIL import Image
+from . import fetcher, tables, telemetry
+from .render import figure, figure_to_data_uri, scatter
+from .stats_engine import linear_fit
 
 url_regex = re.compile(r'https?://[^\s]+')
 
@@ -16,86 +12,49 @@ def find_urls(text):
     return re.findall(url_regex, text)
 
 def fetch_url_text(url, timeout=30):
-    r = requests.get(url, timeout=timeout, headers={"User-Agent": "data-analyst-agent/1.0"})
-    r.raise_for_status()
-    return r.text
+    """Page text via the pooled, disk-cached fetcher (repeat scrapes are local reads)."""
+    return fetcher.fetch_text(url, timeout=timeout)
 
-def read_html_tables(url_or_html):
-    """Try to read HTML tables using pandas. url_or_html can be a URL or raw HTML."""
+def read_html_tables(url_or_html, hints=None):
+    """Typed tables from a URL or raw HTML (lxml, parsed once; URL results cached per page version)."""
     try:
         if url_or_html.strip().startswith('<'):
-            tables = pd.read_html(url_or_html)
-        else:
-            tables = pd.read_html(url_or_html)
-        return tables
+            return tables.extract_tables(url_or_html, hints=hints)
+        return tables.get_tables(url_or_html.strip(), hints=hints)
     except Exception:
         return []
 
 def series_corr(a, b):
     return float(np.corrcoef(a, b)[0,1])
 
+@telemetry.traced("scatter_regression")
 def make_scatter_with_regression(df, x_col, y_col, dotted_line=True, color_line='red', max_size_bytes=100000):
     """
     Returns a data URI `data:image/png;base64,...` for a scatterplot with a regression line.
-    Attempts to reduce image bytes to under max_size_bytes by lowering DPI and converting to webp if needed.
+    The figure is rendered once; the size budget is met by re-encoding (quantized PNG, WEBP, scaling).
     """
-    x = df[x_col].astype(float)
-    y = df[y_col].astype(float)
+    x = df[x_col].astype(float).to_numpy()
+    y = df[y_col].astype(float).to_numpy()
 
-    # Fit linear regression
-    coeffs = np.polyfit(x, y, 1)  # slope, intercept
-    slope, intercept = coeffs[0], coeffs[1]
+    # Fit linear regression from streaming sufficient statistics (no full-size design matrix)
+    fit = linear_fit(x, y)
+    slope, intercept = fit.slope, fit.intercept
 
-    fig, ax = plt.subplots(figsize=(6,4))
-    ax.scatter(x, y)
-    # regression line
-    xs = np.linspace(x.min(), x.max(), 200)
-    ys = slope * xs + intercept
-    linestyle = '--' if dotted_line else '-'
-    ax.plot(xs, ys, linestyle, linewidth=1.5)
-    ax.set_xlabel(str(x_col))
-    ax.set_ylabel(str(y_col))
-    ax.grid(True)
+    with figure(figsize=(6, 4), dpi=100) as (fig, ax):
+        # Large inputs are drawn as a density raster, so render time does not grow with rows
+        scatter(ax, x, y)
+        # regression line
+        xs = np.linspace(np.nanmin(x), np.nanmax(x), 200)
+        ys = slope * xs + intercept
+        linestyle = '--' if dotted_line else '-'
+        ax.plot(xs, ys, linestyle, color=color_line, linewidth=1.5)
+        ax.set_xlabel(str(x_col))
+        ax.set_ylabel(str(y_col))
+        ax.grid(True)
+        fig.tight_layout()
+        uri = figure_to_data_uri(fig, max_bytes=max_size_bytes, tight=False)
 
-    buf = BytesIO()
-    plt.tight_layout()
-    plt.savefig(buf, format='png', dpi=100)
-    plt.close(fig)
-    png_data = buf.getvalue()
-
-    # If too large, try reducing DPI and converting
-    if len(png_data) > max_size_bytes:
-        # Try reducing DPI
-        for dpi in [80, 60, 40, 20]:
-            buf = BytesIO()
-            fig, ax = plt.subplots(figsize=(6,4))
-            ax.scatter(x, y)
-            ax.plot(xs, ys, linestyle, linewidth=1.5)
-            ax.set_xlabel(str(x_col))
-            ax.set_ylabel(str(y_col))
-            ax.grid(True)
-            plt.tight_layout()
-            plt.savefig(buf, format='png', dpi=dpi)
-            plt.close(fig)
-            png_data = buf.getvalue()
-            if len(png_data) <= max_size_bytes:
-                break
-
-    # If still too large, convert to WEBP (Pillow)
-    if len(png_data) > max_size_bytes:
-        try:
-            im = Image.open(BytesIO(png_data)).convert('RGB')
-            wb = BytesIO()
-            im.save(wb, format='WEBP', quality=60)
-            webp_data = wb.getvalue()
-            if len(webp_data) < len(png_data):
-                data_b64 = base64.b64encode(webp_data).decode('ascii')
-                return f'data:image/webp;base64,{data_b64}', float(slope)
-        except Exception:
-            pass
-
-    data_b64 = base64.b64encode(png_data).decode('ascii')
-    return f'data:image/png;base64,{data_b64}', float(slope)
+    return uri, float(slope)
 
 def compress_png_bytes(png_bytes, max_size=100000):
     if len(png_bytes) <= max_size:
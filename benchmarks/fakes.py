@@ -0,0 +1,67 @@
+import json
+import re
+
+import requests
+from requests.adapters import BaseAdapter
+
+from app import llm_gateway, llm_cache, fetcher, dataset_store, graph_questions, code_plans
+
+# Local stand-ins for the network so benchmarks measure this service, not OpenAI or Wikipedia:
+# - the LLM gateway gets a FakeBackend with a configurable latency and JSON-shaped replies;
+# - the shared fetch session gets a transport adapter that serves synthetic pages for FAKE_SITE.
+# They patch the process they run in, so the HTTP mode starts its server in-process too.
+
+
+def _reply(messages):
+    prompt = messages[-1]["content"] if messages else ""
+    lower = prompt.lower()
+    if "json array" in lower:
+        return json.dumps(["fake answer"])
+    if "python programs" in lower:
+        # code_plans asks for a program that sets `result`
+        return "result = {'answer': int(len(df))}"
+    if "duckdb sql" in lower:
+        # query_engine asks for a single SELECT; point it at the first registered view
+        view = re.search(r"View (\w+)\(", prompt)
+        return f"SELECT COUNT(*) FROM {view.group(1) if view else 'data'}"
+    return json.dumps({"answer": "fake answer"})
+
+
+class FakeSiteAdapter(BaseAdapter):
+    """requests transport adapter answering GETs from an in-memory {url: html} map."""
+
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        response = requests.Response()
+        html = self.pages.get(request.url)
+        response.status_code = 200 if html is not None else 404
+        response._content = (html or "not found").encode("utf-8")
+        response.headers["Content-Type"] = "text/html; charset=utf-8"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def install(pages, site, llm_latency=0.0):
+    """Route LLM calls and `site` URLs to local fakes; returns the previous LLM backend."""
+    previous = llm_gateway.set_backend(llm_gateway.FakeBackend(responder=_reply, latency=llm_latency))
+    fetcher.get_session().mount(site.rstrip("/") + "/", FakeSiteAdapter(pages))
+    return previous
+
+
+def clear_caches():
+    """Drop every in-process cache so the next request runs cold."""
+    llm_cache.clear()
+    fetcher.clear()
+    dataset_store.get_store().clear()
+    graph_questions.clear()
+    code_plans.clear()
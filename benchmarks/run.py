@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+
+import numpy as np
+import httpx
+
+from . import synthetic, fakes
+
+# Load test for POST /api/. Synthetic inputs are generated per scenario and sent as multipart
+# uploads, either in-process through the ASGI interface (no sockets) or over HTTP to a uvicorn
+# server started in this process (so the LLM / scraping fakes apply to it). Each run reports
+# latency percentiles, throughput, peak RSS and mean per-stage timings from Server-Timing,
+# and can be saved as / compared with a baseline file.
+#
+#   python -m benchmarks.run                          # both modes, all scenarios
+#   python -m benchmarks.run --mode http -c 16 -n 200 --scenarios graph,csv
+#   python -m benchmarks.run --save-baseline          # record benchmarks/baseline.json
+#   python -m benchmarks.run --fail-on-regression     # exit 1 if slower than the baseline
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the /api/ endpoint with local fakes.")
+    p.add_argument("--mode", choices=["asgi", "http", "both"], default="both")
+    p.add_argument("--url", help="benchmark an already running server instead (fakes do not apply)")
+    p.add_argument("--scenarios", default=",".join(synthetic.QUESTIONS), help="comma-separated subset")
+    p.add_argument("-c", "--concurrency", type=int, default=8)
+    p.add_argument("-n", "--requests", type=int, default=50, help="measured requests per scenario")
+    p.add_argument("--warmup", type=int, default=2, help="unmeasured requests per scenario")
+    p.add_argument("--rows", type=int, default=10000, help="rows in the synthetic CSV")
+    p.add_argument("--nodes", type=int, default=1000)
+    p.add_argument("--edges", type=int, default=5000)
+    p.add_argument("--table-rows", type=int, default=200, help="rows in the fake scraped table")
+    p.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    p.add_argument("--cold", action="store_true", help="clear in-process caches before every request")
+    p.add_argument("--timeout", type=float, default=300)
+    p.add_argument("--output", help="write the results as JSON here")
+    p.add_argument("--baseline", default=BASELINE_PATH)
+    p.add_argument("--save-baseline", action="store_true")
+    p.add_argument("--fail-on-regression", action="store_true")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown vs baseline")
+    return p.parse_args(argv)
+
+
+# --- servers -----------------------------------------------------------------
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalServer:
+    """uvicorn serving the app on a free local port from a background thread."""
+
+    def __init__(self, app):
+        import uvicorn
+
+        self.port = _free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="bench-server", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.time() + 30
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("benchmark server did not start")
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+# --- measurement -------------------------------------------------------------
+
+def parse_server_timing(header):
+    """{stage: milliseconds} from a Server-Timing header (entries without dur are skipped)."""
+    stages = {}
+    for entry in (header or "").split(","):
+        parts = [p.strip() for p in entry.split(";")]
+        for p in parts[1:]:
+            if p.startswith("dur="):
+                stages[parts[0]] = stages.get(parts[0], 0.0) + float(p[4:])
+    return stages
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+async def _send(client, question, uploads, cold):
+    if cold:
+        fakes.clear_caches()
+    # The question goes in as a multipart field too, so requests without uploads stay multipart
+    parts = [("question", (None, question.encode("utf-8")))]
+    parts += [("files", (name, data, "text/csv")) for name, data in uploads]
+    start = time.perf_counter()
+    response = await client.post("/api/", files=parts, headers={"X-Debug-Timing": "1"})
+    latency = time.perf_counter() - start
+    ok = response.status_code == 200
+    if ok:
+        try:
+            body = response.json()
+            ok = not (isinstance(body, dict) and "error" in body)
+        except ValueError:
+            ok = False
+    return latency, ok, parse_server_timing(response.headers.get("server-timing"))
+
+
+async def run_scenario(client, question, uploads, args):
+    for _ in range(args.warmup):
+        await _send(client, question, uploads, args.cold)
+
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+    samples = []
+
+    async def worker():
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            samples.append(await _send(client, question, uploads, args.cold))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+    wall = time.perf_counter() - start
+
+    latencies = np.array([s[0] for s in samples]) * 1000
+    stages = {}
+    for _, _, timing in samples:
+        for stage, ms in timing.items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if not s[1]),
+        "rps": len(samples) / wall if wall else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages_ms": {k: float(np.mean(v)) for k, v in sorted(stages.items(), key=lambda kv: -np.mean(kv[1]))},
+    }
+
+
+async def run_mode(base_url, transport, scenarios, args):
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=args.timeout) as client:
+        for name, (question, files) in scenarios.items():
+            uploads = []
+            for filename, path in files:
+                with open(path, "rb") as f:
+                    uploads.append((filename, f.read()))
+            results[name] = await run_scenario(client, question, uploads, args)
+            print_result(name, results[name])
+    return results
+
+
+# --- reporting ---------------------------------------------------------------
+
+def print_result(name, r):
+    top = ", ".join(f"{k} {v:.1f}" for k, v in list(r["stages_ms"].items())[:6])
+    print(f"  {name:<8} p50 {r['p50_ms']:8.1f}  p95 {r['p95_ms']:8.1f}  p99 {r['p99_ms']:8.1f} ms  "
+          f"{r['rps']:7.1f} rps  errors {r['errors']}/{r['requests']}  rss {r['peak_rss_mb']:.0f} MB")
+    if top:
+        print(f"           stages (ms): {top}")
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing changes vs the baseline; the bool is True if anything regressed."""
+    lines = []
+    regressed = False
+    for key, r in results.items():
+        base = baseline.get("results", {}).get(key)
+        if not base:
+            continue
+        for metric, worse_if_higher in (("p50_ms", True), ("p95_ms", True), ("rps", False)):
+            old, new = base.get(metric), r.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            bad = change > tolerance if worse_if_higher else change < -tolerance
+            regressed |= bad
+            flag = "REGRESSION" if bad else ""
+            lines.append(f"  {key:<14} {metric:<7} {old:9.1f} -> {new:9.1f} ({change:+.0%}) {flag}")
+        old_rate = base.get("errors", 0) / max(base.get("requests", 1), 1)
+        new_rate = r["errors"] / max(r["requests"], 1)
+        if new_rate > old_rate:
+            regressed = True
+            lines.append(f"  {key:<14} errors  {old_rate:9.0%} -> {new_rate:9.0%} REGRESSION")
+    return lines, regressed
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    wanted = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    workdir = tempfile.mkdtemp(prefix="data-agent-bench-")
+    scenarios, pages = synthetic.build(workdir, rows=args.rows, nodes=args.nodes, edges=args.edges,
+                                       table_rows=args.table_rows)
+    scenarios = {k: v for k, v in scenarios.items() if k in wanted}
+
+    results = {}
+    if args.url:
+        print(f"Benchmarking {args.url} (remote: LLM and scraping are whatever that server uses)")
+        for name, r in asyncio.run(run_mode(args.url, None, scenarios, args)).items():
+            results[f"remote/{name}"] = r
+    else:
+        fakes.install(pages, synthetic.FAKE_SITE, llm_latency=args.llm_latency)
+        from app.main import app
+
+        modes = ["asgi", "http"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            print(f"[{mode}] concurrency {args.concurrency}, {args.requests} requests per scenario"
+                  f"{', cold caches' if args.cold else ''}")
+            if mode == "asgi":
+                out = asyncio.run(run_mode("http://bench", httpx.ASGITransport(app=app), scenarios, args))
+            else:
+                with LocalServer(app) as url:
+                    out = asyncio.run(run_mode(url, None, scenarios, args))
+            results.update({f"{mode}/{name}": r for name, r in out.items()})
+
+    report = {
+        "environment": environment(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    regressed = False
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment", {}).get("cpus") != os.cpu_count():
+            print("Note: the baseline was recorded on a machine with a different CPU count")
+        sizes = ("concurrency", "requests", "rows", "nodes", "edges", "table_rows", "llm_latency", "cold")
+        differs = [k for k in sizes if baseline.get("config", {}).get(k) != getattr(args, k)]
+        if differs:
+            print(f"Note: the baseline used different settings for {', '.join(differs)}")
+        lines, regressed = compare(results, baseline, args.tolerance)
+        if lines:
+            print(f"Compared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+            print("\n".join(lines))
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    return 1 if regressed and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Synthetic inputs for the benchmark scenarios: mixed-type CSVs, edge lists (always containing
+# Alice and Eve so the default graph schema has a path to find), HTML table pages for the fake
+# scraper and the question text sent with each request. Everything is seeded, so two runs with
+# the same sizes send identical bytes.
+
+FAKE_SITE = "http://bench.local"
+
+CATEGORIES = ["north", "south", "east", "west", "central"]
+
+
+def make_csv(path, rows, seed=0):
+    """Mixed numeric / categorical / date CSV of `rows` rows."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "date": pd.date_range("2020-01-01", periods=rows, freq="min").strftime("%Y-%m-%d %H:%M"),
+        "region": rng.choice(CATEGORIES, rows),
+        "customer": rng.integers(0, max(rows // 10, 1), rows).astype(str),
+        "sales": rng.gamma(2.0, 150.0, rows).round(2),
+        "units": rng.integers(1, 50, rows),
+        "discount": rng.uniform(0, 0.3, rows).round(3),
+    })
+    df.to_csv(path, index=False)
+    return path
+
+
+def make_edges(path, nodes, edges, seed=0):
+    """Undirected edge list over `nodes` named nodes with a guaranteed Alice-...-Eve path."""
+    rng = np.random.default_rng(seed)
+    names = np.array(["Alice", "Bob", "Carol", "Dave", "Eve"] + [f"user{i}" for i in range(max(nodes - 5, 0))])
+    pairs = rng.integers(0, len(names), size=(max(edges - 4, 0), 2))
+    src = np.concatenate([names[[0, 1, 2, 3]], names[pairs[:, 0]]])
+    dst = np.concatenate([names[[1, 2, 3, 4]], names[pairs[:, 1]]])
+    pd.DataFrame({"source": src, "target": dst}).to_csv(path, index=False)
+    return path
+
+
+def make_table_page(rows, seed=0):
+    """HTML page with one 'wikitable' of films (rank, title, worldwide gross, year, peak)."""
+    rng = np.random.default_rng(seed)
+    gross = np.sort(rng.uniform(5e8, 3e9, rows))[::-1]
+    body = "".join(
+        f"<tr><td>{i + 1}</td><td>Film {i}</td><td>${g:,.0f}</td><td>{rng.integers(1970, 2024)}</td>"
+        f"<td>{rng.integers(1, rows + 1)}</td></tr>"
+        for i, g in enumerate(gross)
+    )
+    return (
+        "<html><body><table class='wikitable'><caption>Highest-grossing films</caption>"
+        "<tr><th>Rank</th><th>Title</th><th>Worldwide gross</th><th>Year</th><th>Peak</th></tr>"
+        f"{body}</table></body></html>"
+    )
+
+
+QUESTIONS = {
+    "graph": (
+        "Use the undirected network in edges.csv. Return a JSON object with keys:\n"
+        "- `edge_count`: number\n- `highest_degree_node`: string\n- `average_degree`: number\n"
+        "- `density`: number\n- `shortest_path_alice_eve`: number\n"
+        "- `network_graph`: base64 PNG\n- `degree_histogram`: base64 PNG"
+    ),
+    "csv": "Analyze sales.csv. Which region has the highest total sales and what is the average discount?",
+    "multi": (
+        "Answer the following questions about sales.csv and respond with a JSON array of strings.\n"
+        "1. What is the total of sales?\n"
+        "2. What is the correlation between units and sales?\n"
+        "3. Draw a scatterplot of units and sales with a dotted red regression line."
+    ),
+    "duckdb": "Using duckdb, what is the average sales per region in sales.csv? Return a JSON object.",
+    "scrape": (
+        f"Scrape the wikipedia list of highest grossing films at {FAKE_SITE}/wiki/films and answer: "
+        "how many films grossed over $2 bn? Return a JSON object."
+    ),
+}
+
+
+def build(workdir, rows=10000, nodes=1000, edges=5000, table_rows=200, seed=0):
+    """
+    Write the inputs for every scenario into workdir.
+    Returns {scenario: (question, [(filename, path)])} and {url: html} for the fake scraper.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    sales = make_csv(os.path.join(workdir, "sales.csv"), rows, seed)
+    edge_file = make_edges(os.path.join(workdir, "edges.csv"), nodes, edges, seed)
+    scenarios = {
+        "graph": (QUESTIONS["graph"], [("edges.csv", edge_file)]),
+        "csv": (QUESTIONS["csv"], [("sales.csv", sales)]),
+        "multi": (QUESTIONS["multi"], [("sales.csv", sales)]),
+        "duckdb": (QUESTIONS["duckdb"], [("sales.csv", sales)]),
+        "scrape": (QUESTIONS["scrape"], []),
+    }
+    pages = {f"{FAKE_SITE}/wiki/films": make_table_page(table_rows, seed)}
+    return scenarios, pages
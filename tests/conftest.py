@@ -0,0 +1,14 @@
+import pytest
+
+from app import llm_cache, llm_gateway
+
+
+@pytest.fixture
+def fake_llm():
+    """Install a FakeBackend whose replies come from `backend.responder`; restores the previous backend."""
+    backend = llm_gateway.FakeBackend()
+    previous = llm_gateway.set_backend(backend)
+    llm_cache.clear()
+    yield backend
+    llm_gateway.set_backend(previous)
+    llm_cache.clear()
@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from app.dataset_store import DatasetStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DatasetStore(spill_dir=str(tmp_path))
+
+
+def test_failed_load_is_retried(store):
+    def broken():
+        raise ValueError("bad csv")
+
+    with pytest.raises(ValueError):
+        store.get_or_load("k", broken)
+    assert store._loading == {}
+    df = store.get_or_load("k", lambda: pd.DataFrame({"a": [1]}))
+    assert df["a"].tolist() == [1]
+
+
+def test_concurrent_callers_parse_once(store):
+    calls = []
+
+    def slow_loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return pd.DataFrame({"a": [1, 2]})
+
+    threads = [threading.Thread(target=store.get_or_load, args=("k", slow_loader)) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert store._loading == {}
+    stats = store.stats()
+    assert stats["misses"] == 1
+    assert stats["hits_memory"] == 15
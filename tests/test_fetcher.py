@@ -0,0 +1,104 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from app import fetcher
+
+PAGE = b"<html><table><tr><th>a</th></tr><tr><td>1</td></tr></table></html>"
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Serves PAGE with an ETag, answers a matching If-None-Match with 304 and logs every request."""
+
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StandIn.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(fetcher, "FETCH_CACHE_ENABLED", True)
+    monkeypatch.setattr(fetcher, "_cache", fetcher.DiskCache(str(tmp_path), 1 << 20))
+    # A session without the retry backoff keeps the error-path tests quick
+    session = requests.Session()
+    monkeypatch.setattr(fetcher, "_session", session)
+    fetcher.clear()
+    yield
+    fetcher.clear()
+    session.close()
+
+
+def url_of(httpd, path="/page"):
+    return f"http://127.0.0.1:{httpd.server_address[1]}{path}"
+
+
+def test_fresh_copy_is_served_without_a_request(server):
+    url = url_of(server)
+    assert fetcher.fetch(url).source == "network"
+    again = fetcher.fetch(url)
+    assert again.source == "fresh"
+    assert again.content == PAGE
+    assert len(StandIn.requests) == 1
+
+
+def test_stale_copy_is_revalidated_with_304(server):
+    url = url_of(server)
+    fetcher.fetch(url)
+    again = fetcher.fetch(url, ttl=0)
+    assert again.source == "revalidated"
+    assert again.text == PAGE.decode()
+    assert StandIn.requests[-1] == ("/page", '"v1"')
+    assert fetcher.stats()["revalidated"] == 1
+
+
+def test_stale_copy_is_served_when_the_server_is_down(server):
+    url = url_of(server)
+    fetcher.fetch(url)
+    server.shutdown()
+    server.server_close()
+    again = fetcher.fetch(url, ttl=0, timeout=2)
+    assert again.source == "stale"
+    assert again.content == PAGE
+
+
+def test_fetch_all_fetches_duplicates_once(server):
+    a, b = url_of(server, "/a"), url_of(server, "/b")
+    results = fetcher.fetch_all([a, b, a])
+    assert list(results) == [a, b]
+    assert all(r.content == PAGE for r in results.values())
+    assert sorted(path for path, _ in StandIn.requests) == ["/a", "/b"]
+
+
+def test_fetch_all_returns_errors_per_url(server):
+    good = url_of(server)
+    bad = "http://127.0.0.1:9/unreachable"
+    results = fetcher.fetch_all([good, bad], timeout=2)
+    assert results[good].content == PAGE
+    assert isinstance(results[bad], Exception)
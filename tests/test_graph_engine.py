@@ -0,0 +1,30 @@
+import threading
+
+from app import graph_engine, render
+
+
+def test_concurrent_renders_of_one_graph_draw_once(monkeypatch):
+    graph = graph_engine.Graph.from_edges(["a", "a", "b", "c"], ["b", "c", "c", "d"])
+    rendered = []
+    to_image = render.figure_to_image
+
+    def counting(fig, **kwargs):
+        rendered.append(1)
+        return to_image(fig, **kwargs)
+
+    monkeypatch.setattr(render, "figure_to_image", counting)
+    barrier = threading.Barrier(8)
+    images = []
+
+    def draw():
+        barrier.wait()
+        images.append(graph.draw_image())
+
+    threads = [threading.Thread(target=draw) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(rendered) == 1
+    assert len(graph._layouts) == 1
+    assert all(image is images[0] for image in images)
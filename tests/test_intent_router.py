@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from app import intent_router
+
+
+@pytest.fixture
+def sales():
+    return pd.DataFrame({
+        "region": ["north", "north", "south", "east"],
+        "sales": [10, 30, 25, 35],
+        "profit": [1, 2, 3, 4],
+    })
+
+
+def route(question, df):
+    return intent_router.route(question, {"sales.csv": df})
+
+
+def test_total_with_category_filter(sales):
+    r = route("What is the total sales in the north region?", sales)
+    assert r.confident and r.answer == 40
+
+
+def test_negated_category_value_is_excluded(sales):
+    r = route("What is the total sales for regions other than north?", sales)
+    assert r.confident and r.answer == 60
+
+
+def test_negated_numeric_filter(sales):
+    r = route("What is the average profit where sales is not 10?", sales)
+    assert r.confident and r.answer == 3.0
+
+
+def test_not_equal_to_filter(sales):
+    r = route("What is the average profit where sales is not equal to 10?", sales)
+    assert r.confident and r.answer == 3.0
+
+
+@pytest.mark.parametrize("question", [
+    "What is the sum of sales divided by sum of profit?",
+    "What is the ratio of sales to profit?",
+    "What is the total sales minus the total profit?",
+    "Give the maximum and minimum of sales.",
+])
+def test_arithmetic_between_aggregates_goes_to_llm(sales, question):
+    r = route(question, sales)
+    assert not r.confident
+    assert r.intent == "compound"
+
+
+def test_divided_by_is_not_a_grouping(sales):
+    r = route("What is the sum of sales divided by sum of profit?", sales)
+    assert not isinstance(r.answer, dict)
+
+
+@pytest.mark.parametrize("question", [
+    "What is the average profit where sales is not greater than 20?",
+    "What is the total profit where sales is between 10 and 30?",
+    "What is the total profit for customers with at least 3 orders?",
+    "What is the total sales excluding returns?",
+])
+def test_unparsed_filter_lowers_confidence(sales, question):
+    assert not route(question, sales).confident
+
+
+def test_group_by_still_routes(sales):
+    r = route("What is the total sales by region?", sales)
+    assert r.confident and r.answer == {"north": 40, "south": 25, "east": 35}
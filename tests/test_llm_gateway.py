@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from app import deadline, llm_gateway
+
+MESSAGES = [{"role": "user", "content": "How many rows?"}]
+
+
+@pytest.fixture
+def request_deadline():
+    """Open a request deadline of the given length; closed again after the test."""
+    tokens = []
+
+    def start(seconds):
+        dl, token = deadline.start(seconds)
+        tokens.append(token)
+        return dl
+
+    yield start
+    for token in reversed(tokens):
+        deadline.reset(token)
+
+
+def test_repeat_call_is_served_from_cache(fake_llm):
+    fake_llm.responder = lambda messages: "42"
+    assert llm_gateway.chat(MESSAGES) == "42"
+    assert llm_gateway.chat(MESSAGES) == "42"
+    assert fake_llm.calls == 1
+
+
+def test_transient_error_is_retried(fake_llm, monkeypatch):
+    monkeypatch.setattr(llm_gateway.random, "uniform", lambda a, b: 0.0)
+    replies = iter([llm_gateway.TransientLLMError("429"), "42"])
+
+    def flaky(messages):
+        reply = next(replies)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    fake_llm.responder = flaky
+    assert llm_gateway.chat(MESSAGES) == "42"
+    assert fake_llm.calls == 2
+
+
+def test_budget_is_clamped_to_the_request_deadline(request_deadline):
+    assert llm_gateway._budget(None) == llm_gateway.LLM_DEADLINE
+    request_deadline(10)
+    assert llm_gateway._budget(None) <= 10
+    assert llm_gateway._budget(60) <= 10
+    assert llm_gateway._budget(2) == 2
+
+
+def test_no_call_when_the_request_is_nearly_out_of_time(fake_llm, request_deadline):
+    request_deadline(deadline.LLM_MIN_SECONDS / 2)
+    with pytest.raises(llm_gateway.LLMError):
+        llm_gateway.chat(MESSAGES)
+    assert fake_llm.calls == 0
+
+
+def test_slow_backend_gives_up_at_the_request_deadline(fake_llm, request_deadline, monkeypatch):
+    monkeypatch.setattr(deadline, "LLM_MIN_SECONDS", 0.0)
+    fake_llm.latency = 5.0
+    request_deadline(0.3)
+    started = time.monotonic()
+    with pytest.raises(llm_gateway.LLMError):
+        llm_gateway.chat(MESSAGES)
+    assert time.monotonic() - started < 2.0
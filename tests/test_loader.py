@@ -0,0 +1,23 @@
+import numpy as np
+
+from app import dataset_store, intent_router, loader
+
+
+def test_large_integer_products_do_not_wrap(tmp_path):
+    path = tmp_path / "big.csv"
+    path.write_text("a,b\n70000,40000\n1,2\n")
+    df = loader.read_csv(str(path))
+    assert df["a"].dtype == np.int64
+    assert (df["a"] * df["b"]).iloc[0] == 2_800_000_000
+
+
+def test_float_totals_keep_full_precision(tmp_path):
+    rng = np.random.default_rng(0)
+    amounts = rng.integers(0, 2_000_000, 200_000) * 0.25 + 250_000.25
+    path = tmp_path / "amounts.csv"
+    path.write_text("amount\n" + "\n".join(repr(float(v)) for v in amounts) + "\n")
+    df = dataset_store.read_csv(str(path))
+    assert df["amount"].dtype == np.float64
+    route = intent_router.route("What is the total amount?", {"amounts.csv": df})
+    assert route.confident
+    assert route.answer == float(amounts.sum())
@@ -0,0 +1,15 @@
+import pandas as pd
+import pytest
+
+from app import planner
+
+
+def test_correlation_uses_whole_column_names():
+    df = pd.DataFrame({
+        "price": [5.0, 1.0, 4.0, 2.0],
+        "price_usd": [1.0, 2.0, 3.0, 4.0],
+        "qty": [2.0, 4.0, 6.0, 8.0],
+    })
+    question = "What is the correlation between price_usd and qty?"
+    ctx = planner.RequestContext(question, frames={"sales.csv": df})
+    assert planner.solve_pandas(question, ctx) == pytest.approx(1.0)
@@ -0,0 +1,24 @@
+import re
+
+from app.profiler import profile_csv
+
+
+def _stats(profile, column):
+    line = next(ln for ln in profile.splitlines() if ln.startswith(f"- {column} "))
+    return dict(re.findall(r"(min|max|mean|std) (\S+?)(?:,|$)", line))
+
+
+def test_large_values_keep_their_spread(tmp_path):
+    path = tmp_path / "events.csv"
+    path.write_text("ts,value\n" + "\n".join(f"{1_700_000_000_000 + i},{i % 7}" for i in range(1000)) + "\n")
+    stats = _stats(profile_csv(str(path)), "ts")
+    assert stats["min"] == "1700000000000"
+    assert stats["max"] == "1700000000999"
+    assert abs(float(stats["std"]) - 288.7) < 0.1
+
+
+def test_small_values_stay_short(tmp_path):
+    path = tmp_path / "prices.csv"
+    path.write_text("price\n1.5\n2.5\n3.25\n")
+    stats = _stats(profile_csv(str(path)), "price")
+    assert stats["min"] == "1.5" and stats["max"] == "3.25" and stats["mean"] == "2.41667"
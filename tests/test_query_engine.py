@@ -0,0 +1,64 @@
+import pytest
+
+from app import intent_router
+from app.query_engine import NotHandled, QueryEngine
+
+
+@pytest.fixture
+def engine(tmp_path):
+    (tmp_path / "sales.csv").write_text("region,sales\nnorth,10\nnorth,30\nsouth,25\neast,35\n")
+    (tmp_path / "other.csv").write_text("secret\nleaked\n")
+    with QueryEngine([str(tmp_path / "sales.csv")]) as e:
+        yield e
+
+
+def test_llm_sql_over_registered_view(engine, fake_llm):
+    fake_llm.responder = lambda messages: "SELECT sum(sales) FROM sales WHERE region <> 'north'"
+    assert engine.run_llm_sql("total sales outside the north") == 60
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM '{dir}/other.csv'",
+    'SELECT * FROM "{dir}/other.csv"',
+    "SELECT * FROM sales, '{dir}/other.csv'",
+    "SELECT * FROM sales JOIN '{dir}/other.csv' ON true",
+    "SELECT (SELECT count(*) FROM '{dir}/other.csv')",
+    "SELECT * FROM read_csv_auto('{dir}/other.csv')",
+    "SELECT * FROM parquet_metadata('{dir}/x.parquet')",
+    "SELECT * FROM unknown_table",
+])
+def test_llm_sql_cannot_read_other_files(engine, fake_llm, tmp_path, sql):
+    fake_llm.responder = lambda messages: sql.format(dir=tmp_path)
+    with pytest.raises(ValueError, match="Rejected"):
+        engine.run_llm_sql("show me everything")
+
+
+@pytest.mark.parametrize("sql", [
+    "WITH north AS (SELECT * FROM sales WHERE region = 'north') SELECT sum(sales) FROM north",
+    "SELECT count(*) FROM (SELECT region FROM sales GROUP BY region)",
+    'SELECT max(s.sales) FROM "sales" AS s',
+    "SELECT extract(year FROM DATE '2024-01-02') + count(*) FROM sales",
+])
+def test_check_sql_accepts_queries_over_views(engine, sql):
+    engine.check_sql(sql)
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("Which region has the highest sales?", "north"),
+    ("Which region has the lowest sales?", "south"),
+    ("Which region has the highest average sales?", "east"),
+    ("What is the highest sales?", 35),
+    ("What is the total sales by region?", {"north": 40, "east": 35, "south": 25}),
+])
+def test_templates(engine, question, answer):
+    assert engine.run_template(question) == answer
+
+
+def test_template_never_aggregates_text(engine):
+    with pytest.raises(NotHandled):
+        engine.run_template("What is the maximum region?")
+
+
+def test_router_serves_which_from_the_engine(engine):
+    route = intent_router.route("Which region has the highest sales?", engine=engine)
+    assert route.confident and route.answer == "north"